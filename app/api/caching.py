@@ -0,0 +1,67 @@
+import functools
+import hashlib
+
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import set_response_etag
+from django.utils.http import urlencode
+from rest_framework.response import Response
+
+from core.dataset import dataset_version
+from core.routers import reads_primary
+
+
+RESPONSE_CACHE_ALIAS = 'responses'
+
+
+def response_cache_key(request, version, primary=False):
+    """Return the cache key of a GET request at a dataset version
+
+    The query string is normalised by sorting the parameters, so the
+    order they are given in does not matter, while the order of the
+    values of a parameter, e.g. index=2&index=1, is kept. Responses read
+    from the primary are kept apart from those a replica may have
+    answered with rows from before the version.
+    """
+    query = urlencode(sorted(request.query_params.lists()), doseq=True)
+    request_key = '{}?{}|{}'.format(request.path, query, request.accepted_media_type)
+    return 'response:{}:{}{}'.format(
+        version, 'primary:' if primary else '', hashlib.sha1(request_key.encode()).hexdigest()
+    )
+
+
+def cached_response(get):
+    """Serve a GET handler from the response cache, keyed by the dataset version
+
+    Authentication, permissions and content negotiation have already run
+    when the handler is called. Rendered 200 JSON responses are stored
+    with their ETag, so a hit touches neither the view nor the database
+    and ConditionalGetMiddleware answers a matching If-None-Match with a
+    304. Bumping the dataset version makes every stored response stale;
+    the cache evicts them. Requests pinned to the primary, e.g. after a
+    write, are served from their own entries, filled from the primary.
+    Streaming and browsable API responses are passed through.
+    """
+    @functools.wraps(get)
+    def wrapper(view, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return get(view, request, *args, **kwargs)
+
+        cache = caches[RESPONSE_CACHE_ALIAS]
+        key = response_cache_key(request, dataset_version.get(), primary=reads_primary())
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type, etag = cached
+            response = HttpResponse(content, content_type=content_type)
+            response['ETag'] = etag
+            return response
+
+        response = get(view, request, *args, **kwargs)
+        if isinstance(response, Response) and response.status_code == 200:
+            def store(response):
+                set_response_etag(response)
+                cache.set(key, (response.content, response['Content-Type'], response['ETag']))
+            response.add_post_render_callback(store)
+        return response
+
+    return wrapper
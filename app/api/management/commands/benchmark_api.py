@@ -0,0 +1,206 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.urls import reverse
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from api.caching import RESPONSE_CACHE_ALIAS
+from api.renderers import FastJSONRenderer
+from api.serializers import PEOPLE_COLUMNS, PeopleSerializer, people_representation
+from core.models import People
+from user.authentication import CachedTokenAuthentication
+
+
+COMMON_FRIENDS_OPTIONS = {'eye_color': 'brown', 'has_died': False}
+SERIALIZE_SIZE = 10000
+BENCHMARK_EMAIL = 'benchmark@localhost'
+
+
+def http(client, method, url, data, cached=False, status=200, **extra):
+    """Return a callable running one API request and its response size
+
+    The response cache is cleared before each request unless cached.
+    """
+    def run():
+        if not cached:
+            caches[RESPONSE_CACHE_ALIAS].clear()
+        res = getattr(client, method)(url, data, format='json', **extra)
+        if res.status_code != status:
+            raise CommandError('{} answered {}'.format(url, res.status_code))
+        return '{} bytes'.format(len(res.content))
+    return run
+
+
+def most_friends():
+    """Return the 2 people with the most friends"""
+    return People.objects.annotate(friends_count=Count('friends')).order_by('-friends_count')[:2]
+
+
+def friends_pair(client, indexes):
+    return http(client, 'get', reverse('api:friends'), {'index1': indexes[0], 'index2': indexes[1]})
+
+
+def friends_pair_cached(client, indexes):
+    return http(client, 'get', reverse('api:friends'), {'index1': indexes[0], 'index2': indexes[1]}, cached=True)
+
+
+def friends_pair_not_modified(client, indexes):
+    data = {'index1': indexes[0], 'index2': indexes[1]}
+    etag = client.get(reverse('api:friends'), data)['ETag']
+    return http(client, 'get', reverse('api:friends'), data, cached=True, status=304, HTTP_IF_NONE_MATCH=etag)
+
+
+def friends_pair_names(client, indexes):
+    return http(client, 'get', reverse('api:friends'), {'index1': indexes[0], 'index2': indexes[1], 'fields': 'name'})
+
+
+def friends_group(client, indexes):
+    return http(client, 'get', reverse('api:friends'), {'indexes': ','.join(str(index) for index in indexes[:50])})
+
+
+def friends_path(client, indexes):
+    return http(client, 'get', reverse('api:friends-path'), {'index1': indexes[-1], 'index2': indexes[0]})
+
+
+def friends_suggestions(client, indexes):
+    return http(client, 'get', reverse('api:friends-suggestions'), {'index': indexes[-1], 'limit': 10})
+
+
+def fruits_group(client, indexes):
+    return http(client, 'get', reverse('api:fruits'), {'index': ','.join(str(index) for index in indexes)})
+
+
+def fruits_group_names(client, indexes):
+    return http(
+        client, 'get', reverse('api:fruits'),
+        {'index': ','.join(str(index) for index in indexes), 'fields': 'username'}
+    )
+
+
+def common_friends_sql(client, indexes):
+    people1, people2 = most_friends()
+
+    def run():
+        return '{} rows'.format(len(people1.get_common_friends(people2, **COMMON_FRIENDS_OPTIONS)))
+    return run
+
+
+def common_friends_in_list(client, indexes):
+    """The former implementation: two friend lists and an index__in query"""
+    people1, people2 = most_friends()
+
+    def run():
+        seta = set(people1.friends.values_list('index', flat=True))
+        setb = set(people2.friends.values_list('index', flat=True))
+        common = People.objects.filter(index__in=list(seta & setb)).filter(**COMMON_FRIENDS_OPTIONS)
+        return '{} rows'.format(len(common))
+    return run
+
+
+def authentication(authenticator):
+    """Return a scenario authenticating a request with a token of the benchmark user"""
+    def scenario(client, indexes):
+        user, _ = get_user_model().objects.get_or_create(email=BENCHMARK_EMAIL, defaults={'is_active': True})
+        token, _ = Token.objects.get_or_create(user=user)
+        request = Request(APIRequestFactory().get('/', HTTP_AUTHORIZATION='Token {}'.format(token.key)))
+
+        def run():
+            return authenticator().authenticate(request)[0].email
+        return run
+    return scenario
+
+
+def serialize_drf(client, indexes):
+    """Read and render 10k people with PeopleSerializer and JSONRenderer"""
+    def run():
+        people = People.objects.order_by('index')[:SERIALIZE_SIZE]
+        return '{} bytes'.format(len(JSONRenderer().render(PeopleSerializer(people, many=True).data)))
+    return run
+
+
+def serialize_values(client, indexes):
+    """Read and render 10k people from values_list rows with FastJSONRenderer"""
+    def run():
+        rows = People.objects.order_by('index').values_list(*PEOPLE_COLUMNS)[:SERIALIZE_SIZE]
+        return '{} bytes'.format(len(FastJSONRenderer().render([people_representation(row) for row in rows])))
+    return run
+
+
+SCENARIOS = {
+    'friends-2': friends_pair,
+    'friends-2-cached': friends_pair_cached,
+    'friends-2-names': friends_pair_names,
+    'friends-2-not-modified': friends_pair_not_modified,
+    'friends-50': friends_group,
+    'friends-path': friends_path,
+    'friends-suggestions': friends_suggestions,
+    'fruits-50': fruits_group,
+    'fruits-50-names': fruits_group_names,
+    'auth-token': authentication(TokenAuthentication),
+    'auth-cached-token': authentication(CachedTokenAuthentication),
+    'common-friends-sql': common_friends_sql,
+    'common-friends-in-list': common_friends_in_list,
+    'serialize-10k-drf': serialize_drf,
+    'serialize-10k-values': serialize_values,
+}
+
+
+class Command(BaseCommand):
+    """Django management command to measure API latency on the loaded dataset"""
+    help = 'Report the latency percentiles and query count of API scenarios'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'scenarios', nargs='*', metavar='scenario',
+            help='Scenarios to run, all of them by default: {}'.format(', '.join(sorted(SCENARIOS)))
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=100,
+            help='Number of timed runs per scenario'
+        )
+
+    def handle(self, *args, **options):
+        unknown = set(options['scenarios']) - set(SCENARIOS)
+        if unknown:
+            raise CommandError('Unknown scenarios: {}'.format(', '.join(sorted(unknown))))
+
+        indexes = list(People.objects.order_by('index').values_list('index', flat=True)[:50])
+        if len(indexes) < 50:
+            raise CommandError('At least 50 people are required, load a dataset first.')
+
+        client = APIClient(SERVER_NAME='localhost')
+        client.force_authenticate(get_user_model()(email=BENCHMARK_EMAIL))
+
+        for name in options['scenarios'] or sorted(SCENARIOS):
+            run = SCENARIOS[name](client, indexes)
+            run()
+            queries = []
+            with connection.execute_wrapper(lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)):
+                size = run()
+
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                run()
+                timings.append((time.perf_counter() - started) * 1000)
+
+            timings.sort()
+            self.stdout.write(
+                '{:<24} p50 {:8.2f} ms  p95 {:8.2f} ms  mean {:8.2f} ms  {} queries  {}'.format(
+                    name,
+                    timings[len(timings) // 2],
+                    timings[int(len(timings) * 0.95)],
+                    statistics.mean(timings),
+                    len(queries),
+                    size,
+                )
+            )
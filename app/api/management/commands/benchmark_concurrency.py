@@ -0,0 +1,106 @@
+import asyncio
+import statistics
+import time
+import uuid
+from urllib.parse import urlsplit
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from api.management.commands.benchmark_api import BENCHMARK_EMAIL
+
+
+async def fetch(host, port, target, headers):
+    """Send one GET over a new connection and return the response status"""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        request = ['GET {} HTTP/1.1'.format(target), 'Host: {}'.format(host), 'Connection: close']
+        request.extend('{}: {}'.format(name, value) for name, value in headers.items())
+        writer.write(('\r\n'.join(request) + '\r\n\r\n').encode('latin1'))
+        await writer.drain()
+        status_line = await reader.readline()
+        while await reader.read(1 << 16):
+            pass
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+async def client(host, port, target, headers, requests, cached, timings, errors):
+    """Run requests GETs one after the other, recording their latency"""
+    for _ in range(requests):
+        url = target if cached else '{}{}nocache={}'.format(target, '&' if '?' in target else '?', uuid.uuid4().hex)
+        started = time.perf_counter()
+        try:
+            status = await fetch(host, port, url, headers)
+        except (OSError, ValueError, IndexError):
+            status = None
+        if status == 200:
+            timings.append((time.perf_counter() - started) * 1000)
+        else:
+            errors.append(status)
+
+
+class Command(BaseCommand):
+    """Django management command to load a running deployment with concurrent clients"""
+    help = 'Report the throughput and latency percentiles of a deployment under concurrent clients'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of the deployment')
+        parser.add_argument(
+            '--path', default='/api/friends/?index1=0&index2=1',
+            help='Path and query string requested by every client'
+        )
+        parser.add_argument(
+            '--clients', type=int, nargs='+', default=[100, 500, 1000],
+            help='Numbers of concurrent clients to run, one after the other'
+        )
+        parser.add_argument('--requests', type=int, default=5, help='Number of requests per client')
+        parser.add_argument(
+            '--token', help='API token, by default the token of the benchmark user of the local database'
+        )
+        parser.add_argument(
+            '--cached', action='store_true',
+            help='Send identical requests, served from the response cache after the first one'
+        )
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme != 'http' or not url.hostname:
+            raise CommandError('Only http:// URLs are supported.')
+
+        token = options['token']
+        if token is None:
+            user, _ = get_user_model().objects.get_or_create(email=BENCHMARK_EMAIL)
+            token = Token.objects.get_or_create(user=user)[0].key
+        headers = {'Authorization': 'Token {}'.format(token)}
+        target = url.path.rstrip('/') + options['path']
+
+        for clients in options['clients']:
+            timings, errors = [], []
+            started = time.perf_counter()
+            asyncio.run(self.run(url.hostname, url.port or 80, target, headers, clients, options, timings, errors))
+            elapsed = time.perf_counter() - started
+
+            timings.sort()
+            if not timings:
+                raise CommandError('Every request failed, e.g. with {}.'.format(errors[0]))
+            self.stdout.write(
+                '{:>5} clients  {:8.1f} req/s  p50 {:8.2f} ms  p95 {:8.2f} ms  p99 {:8.2f} ms  '
+                'mean {:8.2f} ms  {} errors'.format(
+                    clients,
+                    len(timings) / elapsed,
+                    timings[len(timings) // 2],
+                    timings[int(len(timings) * 0.95)],
+                    timings[int(len(timings) * 0.99)],
+                    statistics.mean(timings),
+                    len(errors),
+                )
+            )
+
+    async def run(self, host, port, target, headers, clients, options, timings, errors):
+        await asyncio.gather(*(
+            client(host, port, target, headers, options['requests'], options['cached'], timings, errors)
+            for _ in range(clients)
+        ))
@@ -0,0 +1,9 @@
+from rest_framework.pagination import CursorPagination
+
+
+class EmployeesPagination(CursorPagination):
+    """Keyset pagination of employees on their unique index"""
+    ordering = 'index'
+    page_size = 100
+    page_size_query_param = 'limit'
+    max_page_size = 1000
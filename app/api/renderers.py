@@ -0,0 +1,36 @@
+import json
+
+import orjson
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer encoding compact responses with orjson
+
+    The output is byte-identical to JSONRenderer: compact separators,
+    UTF-8 text and escaped U+2028 and U+2029. Indented responses and
+    data orjson does not support, e.g. Decimal, go through JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (data is None or not self.compact or self.ensure_ascii
+                or self.get_indent(accepted_media_type, renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Renderer for newline delimited JSON, used for the errors of streamed exports"""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return json.dumps(data).encode('utf-8') + b'\n'
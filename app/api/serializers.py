@@ -1,5 +1,6 @@
 from rest_framework import serializers
 
+from core.dimensions import food_dimension
 from core.models import Company, Food, Tag, People
 
 
@@ -42,28 +43,144 @@ class PeopleSerializer(serializers.ModelSerializer):
 
 
 class FruitVegetableSerializer(serializers.ModelSerializer):
-    """Serializer for People object with fruits and vegetables"""
+    """Serializer for People object with fruits and vegetables
+
+    A 'fields' tuple in the context restricts the output to those fields.
+    A 'food_ids' {people pk: [food pk]} in the context is looked up in the
+    food dimension table instead of querying the foods of each people.
+    """
     username = serializers.CharField(source='name')
-    fruits = serializers.ReadOnlyField()
-    vegetables = serializers.ReadOnlyField()
+    fruits = serializers.SerializerMethodField()
+    vegetables = serializers.SerializerMethodField()
 
     class Meta:
         model = People
         fields = ('username', 'age', 'fruits', 'vegetables')
         read_only_fields = ('username', 'age', 'fruits', 'vegetables')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = self.context.get('fields')
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    def foods(self, obj):
+        """Return the (fruits, vegetables) of a people"""
+        food_ids = self.context.get('food_ids')
+        if food_ids is None:
+            foods = obj.foods.all()
+            return (
+                [food.name for food in foods if food.category == 'fruit'],
+                [food.name for food in foods if food.category == 'vegetable'],
+            )
+        return food_dimension.split(food_ids[obj.pk])
+
+    def to_representation(self, obj):
+        # Split the foods once for both the fruits and the vegetables field
+        self._foods = self.foods(obj) if {'fruits', 'vegetables'} & set(self.fields) else None
+        return super().to_representation(obj)
+
+    def get_fruits(self, obj):
+        return self._foods[0]
+
+    def get_vegetables(self, obj):
+        return self._foods[1]
+
+
+PEOPLE_FIELDS = ('name', 'age', 'address', 'phone')
+PEOPLE_FIELD_COLUMNS = {
+    'name': ('name',),
+    'age': ('age',),
+    'address': ('street_name', 'suburb', 'state', 'postcode'),
+    'phone': ('phone',),
+}
+
+
+def people_columns(fields=PEOPLE_FIELDS):
+    """Return the People columns read to represent fields, index first"""
+    return ('index',) + tuple(column for field in fields for column in PEOPLE_FIELD_COLUMNS[field])
+
+
+PEOPLE_COLUMNS = people_columns()
+
+
+def people_representation(row, fields=PEOPLE_FIELDS):
+    """Return the PeopleSerializer representation of a people_columns(fields) values_list row
+
+    Extra columns after those are ignored. Building the dict directly
+    skips the DRF field machinery of PeopleSerializer.
+    """
+    if fields is PEOPLE_FIELDS:
+        return {
+            "name": row[1],
+            "age": row[2],
+            "address": People.compose_address(row[3], row[4], row[5], row[6]),
+            "phone": row[7],
+        }
+
+    representation = dict()
+    position = 1
+    for field in fields:
+        if field == 'address':
+            representation[field] = People.compose_address(*row[position:position + 4])
+            position += 4
+        else:
+            representation[field] = row[position]
+            position += 1
+    return representation
+
+
+class PeopleRowsSerializer(serializers.BaseSerializer):
+    """Base serializer for people_columns rows, restricted to the 'fields' of the context"""
+
+    def people(self, row):
+        return people_representation(row, self.context.get('fields', PEOPLE_FIELDS))
+
+
+class CommonFriendsSerializer(PeopleRowsSerializer):
+    """Serializer for 2 People's common friend people_columns rows"""
+
+    def to_representation(self, objs_dict):
+        return {
+            "people1": self.people(objs_dict['people1']),
+            "people2": self.people(objs_dict['people2']),
+            "common_friends": [self.people(row) for row in objs_dict['common_friends']]
+        }
+
+
+class CommonFriendsGroupSerializer(PeopleRowsSerializer):
+    """Serializer for a group of people_columns rows and the friends they all share"""
+
+    def to_representation(self, objs_dict):
+        return {
+            "people": [self.people(row) for row in objs_dict['people']],
+            "common_friends": [self.people(row) for row in objs_dict['common_friends']]
+        }
+
+
+class FriendPathSerializer(PeopleRowsSerializer):
+    """Serializer for the people_columns rows on a friend chain"""
+
+    def to_representation(self, objs_dict):
+        return {
+            "degrees": len(objs_dict['path']) - 1,
+            "path": [self.people(row) for row in objs_dict['path']]
+        }
+
 
-class CommonFriendsSerializer(serializers.BaseSerializer):
-    """Serializer for 2 People's common friend People objects"""
+class FriendSuggestionsSerializer(PeopleRowsSerializer):
+    """Serializer for a people_columns row and the (row, mutual friends) people they may know"""
 
     def to_representation(self, objs_dict):
+        suggestions = []
+        for row, mutual_friends in objs_dict['suggestions']:
+            suggestion = self.people(row)
+            suggestion["mutual_friends"] = mutual_friends
+            suggestions.append(suggestion)
         return {
-            "people1": PeopleSerializer(objs_dict['people1']).data,
-            "people2": PeopleSerializer(objs_dict['people2']).data,
-            "common_friends": PeopleSerializer(
-                objs_dict['common_friends'],
-                many=True
-            ).data
+            "people": self.people(objs_dict['people']),
+            "suggestions": suggestions
         }
 
 
@@ -0,0 +1,112 @@
+import asyncio
+import json
+import threading
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import TransactionTestCase
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+
+from app.handlers import PooledASGIHandler
+from api.tests.test_employees_api import sample_company, sample_employee
+
+
+COMPANIES_URL = reverse('api:company-list')
+EMPLOYEES_URL = reverse('api:employees')
+
+
+async def asgi_get(application, path, query='', headers=()):
+    """Return the status, headers and body of a GET served by application"""
+    scope = {
+        'type': 'http', 'method': 'GET', 'path': path, 'query_string': query.encode(),
+        'headers': [(name.encode(), value.encode()) for name, value in (('host', 'testserver'),) + headers],
+    }
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b''}
+
+    async def send(message):
+        messages.append(message)
+
+    await application(scope, receive, send)
+    start = messages[0]
+    return start['status'], dict(start['headers']), b''.join(message.get('body', b'') for message in messages[1:])
+
+
+class PooledASGIHandlerTests(TransactionTestCase):
+    """Test the API served by the pooled ASGI handler"""
+
+    def setUp(self):
+        self.handler = PooledASGIHandler()
+        user = get_user_model().objects.create_user(email='testuser@gmail.com', password='testpass', name='Test')
+        self.headers = (('authorization', 'Token {}'.format(Token.objects.create(user=user).key)),)
+        company = sample_company(0, 'INTERLOO')
+        for index in range(3):
+            sample_employee(index, company)
+
+    def test_get(self):
+        """Test a view is served with its database queries run in the pool"""
+        status, headers, body = asyncio.run(asgi_get(self.handler, COMPANIES_URL, headers=self.headers))
+
+        self.assertEqual(status, 200)
+        self.assertEqual(headers[b'Content-Type'], b'application/json')
+        self.assertEqual(body, b'[{"index":0,"name":"INTERLOO"}]')
+
+    def test_streaming(self):
+        """Test a streamed response reading the database is sent in order"""
+        status, _, body = asyncio.run(asgi_get(
+            self.handler, EMPLOYEES_URL, 'company=0&stream=true', headers=self.headers
+        ))
+
+        self.assertEqual(status, 200)
+        self.assertEqual([row['index'] for row in json.loads(body)], [0, 1, 2])
+
+    def test_concurrent_requests(self):
+        """Test requests are served by several threads at once"""
+        barrier = threading.Barrier(2, timeout=5)
+
+        def get_response(request):
+            barrier.wait()
+            return HttpResponse(threading.current_thread().name)
+
+        async def get_both():
+            return await asyncio.gather(asgi_get(self.handler, '/a'), asgi_get(self.handler, '/b'))
+
+        with patch.object(self.handler, 'get_response', get_response):
+            responses = asyncio.run(get_both())
+
+        self.assertEqual([status for status, _, _ in responses], [200, 200])
+        self.assertNotEqual(responses[0][2], responses[1][2])
+
+    def test_streaming_threads(self):
+        """Test streamed responses are read in the stream threads, not the view threads"""
+        def get_response(request):
+            return StreamingHttpResponse(threading.current_thread().name for _ in range(1))
+
+        with patch.object(self.handler, 'get_response', get_response):
+            status, _, body = asyncio.run(asgi_get(self.handler, '/'))
+
+        self.assertEqual(status, 200)
+        self.assertTrue(body.startswith(b'asgi-stream'))
+
+    def test_streaming_error_aborts(self):
+        """Test a streamed response failing midway raises without ending the body"""
+        def rows():
+            yield 'first'
+            raise DatabaseError('connection lost')
+
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        response = StreamingHttpResponse(rows())
+        with self.assertRaises(DatabaseError):
+            asyncio.run(self.handler.send_streaming_response(response, send))
+
+        self.assertEqual([message.get('more_body') for message in messages[1:]], [True])
@@ -0,0 +1,129 @@
+import gzip
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.dataset import dataset_version
+from core.models import Company
+from api.caching import RESPONSE_CACHE_ALIAS
+from api.tests.test_employees_api import sample_company, sample_employee, sample_food
+
+
+COMPANIES_URL = reverse('api:company-list')
+EMPLOYEES_URL = reverse('api:employees')
+FRUITS_URL = reverse('api:fruits')
+
+
+class ResponseCacheTests(TestCase):
+    """Test GET responses are cached per dataset version"""
+
+    def setUp(self):
+        caches[RESPONSE_CACHE_ALIAS].clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='testuser@gmail.com',
+            password='testpass',
+            name='Test User'
+        )
+        self.client.force_authenticate(self.user)
+        self.company = sample_company(0, 'INTERLOO')
+        self.employees = [sample_employee(index, self.company) for index in range(30)]
+        self.employees[0].foods.add(sample_food('apple'))
+
+    def test_cached_response(self):
+        """Test a repeated GET is answered without queries"""
+        res = self.client.get(FRUITS_URL, {'index': '0,1', 'fields': 'username'})
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(FRUITS_URL, {'fields': 'username', 'index': '0,1'})
+
+        self.assertEqual(cached.status_code, status.HTTP_200_OK)
+        self.assertEqual(cached.content, res.content)
+        self.assertEqual(cached['Content-Type'], res['Content-Type'])
+        self.assertEqual(cached['ETag'], res['ETag'])
+
+    def test_query_string_values_order_is_kept(self):
+        """Test requests differing in the order of a parameter value are cached apart"""
+        res = self.client.get(FRUITS_URL, {'index': '0,1'})
+        reversed_res = self.client.get(FRUITS_URL, {'index': '1,0'})
+
+        self.assertEqual(res.json(), list(reversed(reversed_res.json())))
+
+    def test_conditional_get(self):
+        """Test a matching If-None-Match gets a 304 without queries"""
+        res = self.client.get(COMPANIES_URL)
+
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(COMPANIES_URL, HTTP_IF_NONE_MATCH=res['ETag'])
+
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(not_modified.content, b'')
+
+    def test_changes_invalidate(self):
+        """Test saving a company makes the cached responses stale"""
+        res = self.client.get(COMPANIES_URL)
+        version = dataset_version.get()
+
+        Company.objects.create(index=1, name='LINGOAGE')
+        changed = self.client.get(COMPANIES_URL, HTTP_IF_NONE_MATCH=res['ETag'])
+
+        self.assertGreater(dataset_version.get(), version)
+        self.assertEqual(changed.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(changed.json()), 2)
+        self.assertNotEqual(changed['ETag'], res['ETag'])
+
+    def test_bumped_again_on_commit(self):
+        """Test a change bumps the version again when its transaction commits, once"""
+        with transaction.atomic():
+            Company.objects.create(index=1, name='LINGOAGE')
+            Company.objects.create(index=2, name='PERMADYNE')
+
+        callbacks = [func for _, func in connection.run_on_commit]
+        self.assertEqual(callbacks.count(dataset_version.bump), 1)
+
+    def test_m2m_changes_invalidate(self):
+        """Test changing the foods of people makes the cached responses stale"""
+        self.client.get(FRUITS_URL, {'index': 0})
+
+        self.employees[0].foods.add(sample_food('carrot'))
+        res = self.client.get(FRUITS_URL, {'index': 0})
+
+        self.assertEqual(res.json()[0]['vegetables'], ['carrot'])
+
+    def test_errors_not_cached(self):
+        """Test error responses are computed every time"""
+        self.client.get(FRUITS_URL, {'index': 99})
+
+        with self.assertNumQueries(1):
+            res = self.client.get(FRUITS_URL, {'index': 99})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_streaming_not_cached(self):
+        """Test streamed employees are read from the database every time"""
+        first = self.client.get(EMPLOYEES_URL, {'company': 0, 'stream': 'true'})
+        content = b''.join(first.streaming_content)
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(EMPLOYEES_URL, {'company': 0, 'stream': 'true'})
+            self.assertEqual(b''.join(res.streaming_content), content)
+
+        self.assertTrue(ctx.captured_queries)
+
+    def test_gzip(self):
+        """Test large responses are compressed for clients accepting gzip"""
+        res = self.client.get(EMPLOYEES_URL, {'company': 0}, HTTP_ACCEPT_ENCODING='gzip')
+        cached = self.client.get(EMPLOYEES_URL, {'company': 0}, HTTP_ACCEPT_ENCODING='gzip')
+        plain = self.client.get(EMPLOYEES_URL, {'company': 0})
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(res.content), plain.content)
+        self.assertEqual(gzip.decompress(cached.content), plain.content)
+        self.assertTrue(res['ETag'].startswith('W/'))
@@ -1,17 +1,31 @@
+import json
+from unittest.mock import patch
+
 from faker import Faker
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
 
+from core.dimensions import company_dimension, food_dimension
+from core.graph import friend_graph
 from core.models import Food, Tag, People, Company
-from api.serializers import EmployeesSerializer
+from api.serializers import EmployeesSerializer, PeopleSerializer
+from api.views import stream_json_array
 
 EMPLOYEES_URL = reverse('api:employees')
 FRIENDS_URL = reverse('api:friends')
+FRIENDS_BATCH_URL = reverse('api:friends-batch')
+FRIENDS_PATH_URL = reverse('api:friends-path')
+FRIENDS_SUGGESTIONS_URL = reverse('api:friends-suggestions')
 FRUITS_URL = reverse('api:fruits')
+COMPANY_SEARCH_URL = reverse('api:company-search')
+EXPORT_PEOPLE_URL = reverse('api:export-people')
 fakegen = Faker()
 
 
@@ -74,12 +88,31 @@ class PublicEmployeeApiTests(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
+    def test_auth_required_friends_batch(self):
+        """Test that authorization is required to get common friends in batch"""
+        res = self.client.post(FRIENDS_BATCH_URL, {'pairs': [[0, 1]]}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
     def test_auth_required_fruits(self):
         """Test that authorization is required to get fruits and vegetables"""
         res = self.client.get(FRUITS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
+    def test_auth_required_export_people(self):
+        """Test that authorization is required to export people"""
+        res = self.client.get(EXPORT_PEOPLE_URL, HTTP_ACCEPT='application/x-ndjson')
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn('detail', json.loads(res.content))
+
+    def test_auth_required_company_search(self):
+        """Test that authorization is required to search companies"""
+        res = self.client.get(COMPANY_SEARCH_URL, {'q': 'lingo'})
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
 
 class PrivateEmployeeApiTests(TestCase):
     """Test authorized employee API access"""
@@ -131,11 +164,97 @@ class PrivateEmployeeApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data, serializer.data)
 
+    def test_retrieve_employee_list_paginated(self):
+        """Test to walk through the employees of a company a page at a time"""
+        for index in range(10, 15):
+            sample_employee(index=index, company=self.companies[0])
+
+        res = self.client.get(EMPLOYEES_URL, {'company': '0', 'limit': 3})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'], [
+            {'index': employee.index, 'name': employee.name} for employee in self.employees[:2]
+        ] + [{'index': 10, 'name': People.objects.get(index=10).name}])
+        self.assertIsNone(res.data['previous'])
+
+        # The company comes from the dimension table loaded by the first page
+        with self.assertNumQueries(1):
+            res = self.client.get(res.data['next'])
+        self.assertEqual([employee['index'] for employee in res.data['results']], [11, 12, 13])
+
+        res = self.client.get(res.data['next'])
+        self.assertEqual([employee['index'] for employee in res.data['results']], [14])
+        self.assertIsNone(res.data['next'])
+
+    def test_retrieve_employee_list_invalid_cursor(self):
+        """Test to retrieve a page of employees with a malformed cursor"""
+        res = self.client.get(EMPLOYEES_URL, {'company': '0', 'cursor': 'wrong'})
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_retrieve_employee_list_streamed(self):
+        """Test to stream all employees in a company"""
+        for index in range(10, 15):
+            sample_employee(index=index, company=self.companies[0])
+
+        res = self.client.get(EMPLOYEES_URL, {'company': '0', 'stream': 'true'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        self.assertEqual(res['Content-Type'], 'application/json')
+        employees = json.loads(b''.join(res.streaming_content))
+        self.assertEqual(
+            employees,
+            list(People.objects.filter(company=self.companies[0]).order_by('index').values('index', 'name'))
+        )
+        self.assertEqual(len(employees), 7)
+
+    def test_stream_json_array(self):
+        """Test rows are streamed as a valid JSON array in chunks"""
+        rows = [{'index': index} for index in range(5)]
+
+        self.assertEqual(list(stream_json_array([])), ['[', ']'])
+        self.assertEqual(json.loads(''.join(stream_json_array(rows, chunk_size=2))), rows)
+        self.assertEqual(len(list(stream_json_array(rows, chunk_size=2))), 5)
+
+    def test_retrieve_employee_list_by_exact_name(self):
+        """Test an exact company name wins over the names containing it"""
+        sample_company(index=10, name='INTERLOOP')
+
+        res = self.client.get(EMPLOYEES_URL, {'company': 'interloo'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, EmployeesSerializer([self.companies[0]], many=True).data)
+        res = self.client.get(EMPLOYEES_URL, {'company': 'interl'})
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_search_companies(self):
+        """Test to search companies by name, best matches first"""
+        sample_company(index=10, name='SUPERLINGO')
+        sample_company(index=11, name='LINGO')
+
+        res = self.client.get(COMPANY_SEARCH_URL, {'q': 'lingo', 'limit': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [{'index': 11, 'name': 'LINGO'}, {'index': 1, 'name': 'LINGOAGE'}])
+
+    def test_search_companies_invalid(self):
+        """Test the company search requires a query and a valid limit"""
+        for params in ({}, {'q': ' '}, {'q': 'lingo', 'limit': 0}, {'q': 'lingo', 'limit': 'a'}):
+            res = self.client.get(COMPANY_SEARCH_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_retrieve_employee_list_wrong_index(self):
         """Test to retrieve employee list in a company by non-existing index"""
         res = self.client.get(EMPLOYEES_URL, {'company': '1000'})
         self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
 
+    def test_retrieve_employee_list_new_company(self):
+        """Test to retrieve the employees of a company added without signals, e.g. by another process"""
+        company_dimension.table()
+        Company.objects.bulk_create([Company(index=1000, name='ZENTIA')])
+
+        res = self.client.get(EMPLOYEES_URL, {'company': '1000'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
     def test_retrieve_employee_list_wrong_name(self):
         """Test to retrieve employee list in a company by non-existing index"""
         res = self.client.get(EMPLOYEES_URL, {'company': 'wrong'})
@@ -175,6 +294,231 @@ class PrivateEmployeeApiTests(TestCase):
             res.data['common_friends'][0]['name']
         )
 
+    def test_retrieve_common_friends_byte_identical(self):
+        """Test the common friends response matches the PeopleSerializer rendering"""
+        res = self.client.get(FRIENDS_URL, {'index1': 0, 'index2': 1})
+
+        people = People.objects.in_bulk(field_name='index')
+        expected = JSONRenderer().render({
+            "people1": PeopleSerializer(people[0]).data,
+            "people2": PeopleSerializer(people[1]).data,
+            "common_friends": PeopleSerializer([people[2]], many=True).data
+        })
+        self.assertEqual(res.content, expected)
+
+    def test_retrieve_common_friends_single_query(self):
+        """Test common friends are hydrated with one query once the graph is built"""
+        self.client.get(FRIENDS_URL, {'index1': 1, 'index2': 0})
+
+        with self.assertNumQueries(1):
+            res = self.client.get(FRIENDS_URL, {'index1': 0, 'index2': 1})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['common_friends']), 1)
+
+    def test_retrieve_common_friends_group(self):
+        """Test to retrieve the friends a list of people all share"""
+        res = self.client.get(FRIENDS_URL, {'indexes': '0,1'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [person['name'] for person in res.data['people']],
+            [self.employees[0].name, self.employees[1].name]
+        )
+        self.assertEqual(
+            [person['name'] for person in res.data['common_friends']],
+            [self.employees[2].name]
+        )
+
+    def test_retrieve_common_friends_group_invalid(self):
+        """Test to retrieve common friends of a malformed or too short list"""
+        for indexes in ('0', '0,0', '0,a', ''):
+            res = self.client.get(FRIENDS_URL, {'indexes': indexes})
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(FRIENDS_URL, {'indexes': '0,1,100'})
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_retrieve_common_friends_filters(self):
+        """Test the common friends filters are configurable"""
+        age = self.employees[2].age
+        expected = {
+            (): 1,
+            (('eye_color', 'blue'),): 0,
+            (('eye_color', 'any'), ('has_died', 'any')): 1,
+            (('has_died', 'true'),): 0,
+            (('age_min', age), ('age_max', age)): 1,
+            (('age_min', age + 1),): 0,
+            (('gender', 'male'),): 0,
+            (('gender', 'female'),): 1,
+        }
+        for filters, count in expected.items():
+            res = self.client.get(FRIENDS_URL, dict(filters, index1=0, index2=1))
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(res.data['common_friends']), count, filters)
+
+    def test_retrieve_common_friends_invalid_filters(self):
+        """Test malformed common friends filters are rejected"""
+        for filters in ({'has_died': 'maybe'}, {'age_min': 'old'}):
+            res = self.client.get(FRIENDS_URL, dict(filters, index1=0, index2=1))
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_retrieve_common_friends_batch(self):
+        """Test the batch endpoint answers like the single pair endpoint"""
+        pairs = [[0, 1], [1, 0], [0, 2]]
+        res = self.client.post(FRIENDS_BATCH_URL, {'pairs': pairs}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        expected = [
+            self.client.get(FRIENDS_URL, {'index1': index1, 'index2': index2}).data
+            for index1, index2 in pairs
+        ]
+        self.assertEqual(res.data, expected)
+
+    def test_retrieve_common_friends_batch_filters(self):
+        """Test the batch endpoint applies the eye color and has died filters"""
+        res = self.client.post(
+            FRIENDS_BATCH_URL, {'pairs': [[0, 1]], 'eye_color': 'blue'}, format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data[0]['common_friends'], [])
+
+    def test_retrieve_common_friends_batch_constant_queries(self):
+        """Test the number of queries does not depend on the number of pairs"""
+        self.client.post(FRIENDS_BATCH_URL, {'pairs': [[0, 1]]}, format='json')
+
+        with self.assertNumQueries(1):
+            self.client.post(FRIENDS_BATCH_URL, {'pairs': [[0, 1]]}, format='json')
+        with self.assertNumQueries(1):
+            self.client.post(
+                FRIENDS_BATCH_URL, {'pairs': [[0, 1], [1, 2], [0, 2]] * 20}, format='json'
+            )
+
+    def test_retrieve_common_friends_batch_invalid(self):
+        """Test the batch endpoint rejects malformed pairs and filters"""
+        invalid = [
+            {},
+            {'pairs': []},
+            {'pairs': [[0]]},
+            {'pairs': [[0, 'a']]},
+            {'pairs': ['12']},
+            {'pairs': [['0', '1']]},
+            {'pairs': [[0, 1, 2]]},
+            {'pairs': [[0, True]]},
+            {'pairs': [{'0': 1, '1': 2}]},
+            {'pairs': [[1, 1]]},
+            {'pairs': [[0, 1]], 'has_died': 'no'},
+            [[0, 1]],
+            'pairs',
+        ]
+        for payload in invalid:
+            res = self.client.post(FRIENDS_BATCH_URL, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST, payload)
+
+    def test_retrieve_common_friends_batch_nonexist_people(self):
+        """Test the batch endpoint reports people that do not exist"""
+        res = self.client.post(FRIENDS_BATCH_URL, {'pairs': [[0, 1], [0, 100]]}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertIn('100', res.data['message'])
+
+    def test_retrieve_friend_path(self):
+        """Test to retrieve the shortest friend chain between 2 people"""
+        self.employees[2].friends.add(self.employees[1])
+
+        res = self.client.get(FRIENDS_PATH_URL, {'index1': 0, 'index2': 1})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['degrees'], 2)
+        self.assertEqual(
+            [person['name'] for person in res.data['path']],
+            [self.employees[0].name, self.employees[2].name, self.employees[1].name]
+        )
+
+    def test_retrieve_friend_path_not_found(self):
+        """Test to retrieve a friend chain that does not exist"""
+        res = self.client.get(FRIENDS_PATH_URL, {'index1': 0, 'index2': 1})
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+        res = self.client.get(FRIENDS_PATH_URL, {'index1': 0, 'index2': 100})
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_retrieve_friend_path_invalid_params(self):
+        """Test to retrieve a friend chain with invalid parameters"""
+        for params in ({'index1': 0}, {'index1': 0, 'index2': 'a'}, {'index1': 0, 'index2': 1, 'max_depth': 0}):
+            res = self.client.get(FRIENDS_PATH_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_retrieve_friend_suggestions(self):
+        """Test to retrieve the people someone may know"""
+        self.employees[2].friends.add(self.employees[0])
+
+        res = self.client.get(FRIENDS_SUGGESTIONS_URL, {'index': 0})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['people']['name'], self.employees[0].name)
+        self.assertEqual(len(res.data['suggestions']), 1)
+        self.assertEqual(res.data['suggestions'][0]['name'], self.employees[1].name)
+        self.assertEqual(res.data['suggestions'][0]['mutual_friends'], 1)
+
+        res = self.client.get(FRIENDS_SUGGESTIONS_URL, {'index': 0, 'eye_color': 'blue'})
+        self.assertEqual(res.data['suggestions'], [])
+
+    def test_retrieve_friend_suggestions_single_query(self):
+        """Test filtered suggestions are read in one query when the best ranked candidates match"""
+        friend = sample_employee(index=10, company=self.companies[0])
+        self.employees[0].friends.add(friend)
+        for index in range(11, 20):
+            employee = sample_employee(index=index, company=self.companies[0])
+            employee.friends.add(friend)
+            People.objects.filter(pk=employee.pk).update(eye_color='blue')
+        expected = [index for index, _ in friend_graph.suggestions(0) if index >= 11][:3]
+
+        with patch('api.views.MAX_SUGGESTION_CANDIDATES', 5), self.assertNumQueries(2):
+            res = self.client.get(FRIENDS_SUGGESTIONS_URL, {'index': 0, 'limit': 3, 'eye_color': 'blue'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [suggestion['name'] for suggestion in res.data['suggestions']],
+            [People.objects.get(index=index).name for index in expected]
+        )
+
+    def test_retrieve_friend_suggestions_beyond_first_candidates(self):
+        """Test the filters go down the ranking when the best ranked candidates do not match"""
+        friend = sample_employee(index=10, company=self.companies[0])
+        self.employees[0].friends.add(friend)
+        candidates = [sample_employee(index=index, company=self.companies[0]) for index in range(100, 1103)]
+        People.objects.filter(index__gte=1100).update(eye_color='blue')
+        FriendLink = People.friends.through
+        FriendLink.objects.bulk_create(
+            [FriendLink(from_people_id=candidate.pk, to_people_id=friend.pk) for candidate in candidates]
+        )
+        friend_graph.invalidate()
+        friend_graph.csr()
+
+        with self.assertNumQueries(4):
+            res = self.client.get(FRIENDS_SUGGESTIONS_URL, {'index': 0, 'limit': 2, 'eye_color': 'blue'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [suggestion['name'] for suggestion in res.data['suggestions']],
+            [People.objects.get(index=index).name for index in (1100, 1101)]
+        )
+
+        with patch('api.views.MAX_SUGGESTION_QUERIES', 2), self.assertNumQueries(3):
+            res = self.client.get(FRIENDS_SUGGESTIONS_URL, {'index': 0, 'limit': 2, 'eye_color': 'green'})
+        self.assertEqual(res.data['suggestions'], [])
+
+    def test_retrieve_friend_suggestions_invalid(self):
+        """Test to retrieve suggestions with invalid parameters"""
+        for params in ({}, {'index': 'a'}, {'index': 0, 'limit': 0}, {'index': 0, 'has_died': 'maybe'}):
+            res = self.client.get(FRIENDS_SUGGESTIONS_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(FRIENDS_SUGGESTIONS_URL, {'index': 100})
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_retrieve_fruits_vegetables_invalid_param(self):
         """Test to retrieve fruits or vegetables with invalid query param"""
         res = self.client.get(FRUITS_URL, {'name': 100})
@@ -194,3 +538,112 @@ class PrivateEmployeeApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertIn(self.foods[1].name, res.data[0]['fruits'])
         self.assertIn(self.foods[2].name, res.data[0]['vegetables'])
+
+    def test_retrieve_fruits_vegetables_bulk(self):
+        """Test to retrieve the fruits and vegetables of a list of people in order"""
+        res = self.client.get(FRUITS_URL, {'index': '2,0,1,0'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([person['username'] for person in res.data], [self.employees[i].name for i in (2, 0, 1)])
+        self.assertEqual(res.data[0]['fruits'], [])
+        self.assertEqual(sorted(res.data[1]['vegetables']), ['carrot', 'cucumber'])
+        self.assertEqual(res.data[2]['fruits'], ['apple'])
+        self.assertEqual(res.data[2]['vegetables'], ['carrot'])
+
+    def test_retrieve_fruits_vegetables_bulk_non_exist(self):
+        """Test the bulk fruits and vegetables list the people that do not exist"""
+        res = self.client.get(FRUITS_URL, {'index': '0,100,101'})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertIn('100, 101', res.data['message'])
+
+    def test_retrieve_fruits_vegetables_query_count(self):
+        """Test the number of queries does not depend on the number of people"""
+        banana = sample_food('banana')
+        for index in range(10, 60):
+            employee = sample_employee(index=index, company=self.companies[0])
+            employee.foods.add(banana, self.foods[0])
+        food_dimension.table()
+
+        with self.assertNumQueries(2):
+            self.client.get(FRUITS_URL, {'index': 1})
+        with self.assertNumQueries(2):
+            res = self.client.get(FRUITS_URL, {'index': ','.join(str(index) for index in range(10, 60))})
+
+        self.assertEqual(len(res.data), 50)
+        self.assertEqual(res.data[0]['fruits'], ['banana'])
+        self.assertEqual(res.data[0]['vegetables'], ['cucumber'])
+
+    def test_retrieve_fruits_vegetables_split_once(self):
+        """Test the foods of each people are split once for both fields"""
+        with patch.object(food_dimension, 'split', wraps=food_dimension.split) as split:
+            res = self.client.get(FRUITS_URL, {'index': '1,2'})
+
+        self.assertEqual(len(res.data), 2)
+        self.assertEqual(split.call_count, 2)
+
+    def test_export_people(self):
+        """Test to stream every people as NDJSON"""
+        res = self.client.get(EXPORT_PEOPLE_URL, HTTP_ACCEPT='application/x-ndjson')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        records = [json.loads(line) for line in b''.join(res.streaming_content).splitlines()]
+        self.assertEqual([record['name'] for record in records], [employee.name for employee in self.employees])
+        self.assertEqual(sorted(records[1]['favouriteFood']), ['apple', 'carrot'])
+        self.assertEqual(records[1]['friends'], [{'index': 2}])
+
+    def test_retrieve_common_friends_fields(self):
+        """Test ?fields= limits both the columns read and the people returned"""
+        self.client.get(FRIENDS_URL, {'index1': 0, 'index2': 1})
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(FRIENDS_URL, {'index1': 0, 'index2': 1, 'fields': 'phone,name'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(res.data['people1']), ['name', 'phone'])
+        self.assertEqual(res.data['common_friends'], [
+            {'name': self.employees[2].name, 'phone': self.employees[2].phone}
+        ])
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('street_name', queries[0]['sql'])
+        self.assertNotIn('about', queries[0]['sql'])
+
+        res = self.client.get(FRIENDS_URL, {'indexes': '0,1', 'fields': 'address'})
+        self.assertEqual(res.data['people'][0], {'address': People.objects.get(index=0).address})
+
+    def test_retrieve_friends_fields_everywhere(self):
+        """Test ?fields= applies to the batch, path and suggestions endpoints"""
+        self.employees[2].friends.add(self.employees[1], self.employees[0])
+
+        res = self.client.post(
+            '{}?fields=age'.format(FRIENDS_BATCH_URL), {'pairs': [[0, 1]]}, format='json'
+        )
+        self.assertEqual(res.data[0]['people1'], {'age': self.employees[0].age})
+
+        res = self.client.get(FRIENDS_PATH_URL, {'index1': 0, 'index2': 1, 'fields': 'name'})
+        self.assertEqual(res.data['path'][1], {'name': self.employees[2].name})
+
+        res = self.client.get(FRIENDS_SUGGESTIONS_URL, {'index': 0, 'fields': 'name'})
+        self.assertEqual(res.data['suggestions'], [{'name': self.employees[1].name, 'mutual_friends': 1}])
+
+    def test_retrieve_friends_unknown_fields(self):
+        """Test unknown or empty fields are rejected"""
+        for fields in ('about', 'name,about', '', ','):
+            res = self.client.get(FRIENDS_URL, {'index1': 0, 'index2': 1, 'fields': fields})
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        res = self.client.get(FRUITS_URL, {'index': 0, 'fields': 'name'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_retrieve_fruits_vegetables_fields(self):
+        """Test ?fields= on fruits skips the foods query when no food is requested"""
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(FRUITS_URL, {'index': '0,1', 'fields': 'username'})
+
+        self.assertEqual(res.data, [{'username': self.employees[0].name}, {'username': self.employees[1].name}])
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('about', queries[0]['sql'])
+
+        res = self.client.get(FRUITS_URL, {'index': 1, 'fields': 'fruits'})
+        self.assertEqual(res.data, [{'fruits': ['apple']}])
@@ -0,0 +1,209 @@
+import json
+import os
+import re
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
+from django.db.models import Max
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.dimensions import company_dimension, invalidate_dimensions
+from core.graph import friend_graph
+from core.models import Company, Food, Tag, People
+from core.search import company_search
+
+
+# Size of the seeded dataset, e.g. 1000000; the plans are only checked when it is set
+EXPLAIN_PEOPLE = int(os.environ.get('EXPLAIN_PEOPLE') or 0)
+PEOPLE_PER_COMPANY = 100
+
+# Requests answered from process-local tables, without a query, on backends other than PostgreSQL
+IN_MEMORY_REQUESTS = ('company-search',)
+# Tables read whole by design: the foods and tags are a few dozen rows
+SEQ_SCAN_ALLOWED = {Food._meta.db_table, Tag._meta.db_table}
+
+SQLITE_SCAN = re.compile(r'SCAN (?:TABLE )?(\w+)')
+
+SEED_SQL = (
+    """
+    WITH RECURSIVE seq(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM seq WHERE i < %(companies)s - 1)
+    INSERT INTO core_company ("index", name)
+    SELECT %(company_base)s + i, 'SEEDCO' || i FROM seq
+    """,
+    """
+    WITH RECURSIVE seq(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM seq WHERE i < %(people)s - 1)
+    INSERT INTO core_people (
+        pid, "index", guid, has_died, balance, age, eye_color, name, gender, company_id,
+        street_name, suburb, state, postcode, fingerprint
+    )
+    SELECT
+        'seed' || i, %(people_base)s + i, 'guid' || i, i %% 2 = 0, 0, i %% 80,
+        CASE i %% 3 WHEN 0 THEN 'brown' WHEN 1 THEN 'blue' ELSE 'green' END,
+        'Person ' || i, 'female', c.id, i || ' Sumner Place', 'Sperryville', 'American Samoa', 9819, ''
+    FROM seq JOIN core_company c ON c."index" = %(company_base)s + i / %(per_company)s
+    """,
+    """
+    INSERT INTO core_people_friends (from_people_id, to_people_id)
+    SELECT p.id, f.id FROM core_people p
+    JOIN core_people f ON f."index" IN (p."index" + 1, p."index" + 7)
+    WHERE p."index" >= %(people_base)s
+    """,
+    """
+    INSERT INTO core_people_foods (people_id, food_id)
+    SELECT p.id, f.id FROM core_people p, core_food f
+    WHERE p."index" >= %(people_base)s AND f.name IN ('apple', 'carrot')
+    """,
+    """
+    INSERT INTO core_people_tags (people_id, tag_id)
+    SELECT p.id, t.id FROM core_people p, core_tag t
+    WHERE p."index" >= %(people_base)s AND t.name = 'seed'
+    """,
+    'ANALYZE',
+)
+
+
+def sequential_scans(sql):
+    """Return the tables the plan of sql reads with a full scan"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            nodes = [plan[0]['Plan']]
+            tables = []
+            while nodes:
+                node = nodes.pop()
+                if node['Node Type'] == 'Seq Scan':
+                    tables.append(node['Relation Name'])
+                nodes.extend(node.get('Plans', ()))
+            return tables
+
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+        details = [detail for _, _, _, detail in cursor.fetchall()]
+        return sqlite_scans(details, sql, connection.introspection.table_names(cursor))
+
+
+def sqlite_scans(details, sql, tables):
+    """Return the tables among tables which the SQLite plan details of sql scan
+
+    SQLite before 3.36 prints 'SCAN TABLE core_people AS U0', later ones
+    'SCAN U0', so the aliases Django gives joined tables are mapped back.
+    Scans of subqueries, CTEs and constant rows are not of a table.
+    """
+    aliases = {alias: table for table, alias in re.findall(r'"(\w+)" (?:AS )?(\w+)', sql)}
+    scans = []
+    for detail in details:
+        match = SQLITE_SCAN.match(detail)
+        if match:
+            name = aliases.get(match.group(1), match.group(1))
+            if name in tables:
+                scans.append(name)
+    return scans
+
+
+class SqliteScansTests(SimpleTestCase):
+
+    def test_sqlite_scans(self):
+        """Test the scanned tables are found in the plans of every SQLite version, through aliases"""
+        sql = (
+            'SELECT "core_people"."name" FROM "core_people" INNER JOIN "core_people_friends" T3 '
+            'ON ("core_people"."id" = T3."to_people_id") WHERE T3."from_people_id" IN '
+            '(SELECT U0."id" FROM "core_people" U0)'
+        )
+        details = [
+            'SCAN TABLE core_people AS U0', 'SCAN T3', 'SCAN core_people USING INDEX sqlite_autoindex_core_people_1',
+            'SEARCH core_people USING INTEGER PRIMARY KEY (rowid=?)', 'SCAN CONSTANT ROW', 'SCAN SUBQUERY 1',
+        ]
+        tables = ['core_people', 'core_people_friends']
+
+        self.assertEqual(
+            sqlite_scans(details, sql, tables), ['core_people', 'core_people_friends', 'core_people']
+        )
+
+
+@skipUnless(EXPLAIN_PEOPLE, 'Set EXPLAIN_PEOPLE to the number of people to check the query plans on')
+class QueryPlanTests(TestCase):
+    """Test the API queries use indexes on a seeded dataset of EXPLAIN_PEOPLE people"""
+
+    @classmethod
+    def setUpTestData(cls):
+        for name in ('apple', 'carrot'):
+            Food.objects.get_or_create(name=name)
+        Tag.objects.get_or_create(name='seed')
+        cls.company_base = (Company.objects.aggregate(Max('index'))['index__max'] or 0) + 1
+        cls.people_base = (People.objects.aggregate(Max('index'))['index__max'] or 0) + 1
+        params = {
+            'companies': max(EXPLAIN_PEOPLE // PEOPLE_PER_COMPANY, 1),
+            'per_company': PEOPLE_PER_COMPANY,
+            'company_base': cls.company_base,
+            'people': EXPLAIN_PEOPLE,
+            'people_base': cls.people_base,
+        }
+        with connection.cursor() as cursor:
+            for sql in SEED_SQL:
+                cursor.execute(sql % params)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user('test@gmail.com', 'testpass'))
+        # The dimension tables, the friend graph and the company index are loaded once per process
+        invalidate_dimensions()
+        company_dimension.table()
+        friend_graph.invalidate()
+        friend_graph.csr()
+        company_search.invalidate()
+        company_search.index()
+
+    def person(self, offset):
+        """Return the index of a seeded person"""
+        return self.people_base + offset
+
+    def api_requests(self):
+        """Return the name, URL and parameters of the API requests to explain"""
+        people = [self.person(offset) for offset in range(0, 1000, 100)]
+        return (
+            ('employees', reverse('api:employees'), {'company': self.company_base + 3}),
+            ('employees-by-name', reverse('api:employees'), {'company': 'SEEDCO3'}),
+            ('employees-page', reverse('api:employees'), {'company': self.company_base + 3, 'limit': 20}),
+            ('fruits', reverse('api:fruits'), {'index': ','.join(map(str, people))}),
+            ('friends', reverse('api:friends'), {'index1': people[0], 'index2': self.person(6)}),
+            ('friends-group', reverse('api:friends'), {'indexes': ','.join(map(str, people[:3]))}),
+            ('friends-path', reverse('api:friends-path'), {'index1': people[0], 'index2': self.person(15)}),
+            ('friends-suggestions', reverse('api:friends-suggestions'), {'index': people[0]}),
+            ('company-search', reverse('api:company-search'), {'q': 'SEEDCO12'}),
+        )
+
+    def explain(self, url, params):
+        """Run a GET and return its queries, following the next page of paginated responses"""
+        caches['responses'].clear()
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(url, params)
+            self.assertEqual(res.status_code, 200, res.content)
+            if isinstance(res.data, dict) and res.data.get('next'):
+                caches['responses'].clear()
+                self.assertEqual(self.client.get(res.data['next']).status_code, 200)
+        return [query['sql'] for query in ctx.captured_queries]
+
+    def test_no_sequential_scans(self):
+        """Test no API query reads a large table with a sequential scan"""
+        for name, url, params in self.api_requests():
+            with self.subTest(name):
+                queries = self.explain(url, params)
+                if connection.vendor == 'postgresql' or name not in IN_MEMORY_REQUESTS:
+                    self.assertTrue(queries)
+                for sql in queries:
+                    scans = set(sequential_scans(sql)) - SEQ_SCAN_ALLOWED
+                    self.assertFalse(scans, 'Sequential scan of {} in {}'.format(', '.join(sorted(scans)), sql))
+
+    def test_employees_use_company_index(self):
+        """Test the employees of a company are read in index order from the composite index"""
+        plan = People.objects.filter(company_id=1).order_by('index').values('index', 'name').explain()
+
+        self.assertIn('core_people_company_index_idx', plan)
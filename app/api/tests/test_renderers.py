@@ -0,0 +1,47 @@
+from decimal import Decimal
+from unittest.mock import patch
+
+import orjson
+from django.test import TestCase
+from rest_framework.renderers import JSONRenderer
+
+from api import renderers
+from api.renderers import FastJSONRenderer
+from api.serializers import PEOPLE_COLUMNS, PeopleSerializer, people_representation
+from core.models import Company, People
+
+
+class FastJSONRendererTests(TestCase):
+
+    def setUp(self):
+        company = Company.objects.create(index=0, name='NETBOOK')
+        names = ['Carmella Lambert', 'Zoë "Z" Ångström', 'Line\u2028Separator', 'Tab\tand \\ slash /']
+        for index, name in enumerate(names):
+            People.objects.create(
+                pid='pid-{}'.format(index), index=index, guid='guid-{}'.format(index), name=name,
+                age=None if index == 1 else 20 + index, company=company, street_name='628 Sumner Place',
+                suburb='Sperryville', state='Ōtautahi', postcode=9819 + index, phone='+1 (910) 567-3630'
+            )
+
+    def test_people_representation_is_byte_identical(self):
+        """Test values rows render to the same bytes as PeopleSerializer"""
+        people = People.objects.order_by('index')
+        rows = people.values_list(*PEOPLE_COLUMNS)
+
+        expected = JSONRenderer().render(PeopleSerializer(people, many=True).data)
+        with patch.object(renderers, 'orjson', wraps=orjson) as fast:
+            self.assertEqual(FastJSONRenderer().render([people_representation(row) for row in rows]), expected)
+        fast.dumps.assert_called_once()
+        self.assertIn(b'\\u2028', expected)
+
+    def test_fallback_to_json_renderer(self):
+        """Test indented responses and unsupported types are rendered by JSONRenderer"""
+        renderer = FastJSONRenderer()
+        data = {'balance': Decimal('2418.59'), 'index': 1}
+
+        self.assertEqual(renderer.render(data), JSONRenderer().render(data))
+        self.assertEqual(
+            renderer.render({'index': 1}, 'application/json; indent=4'),
+            JSONRenderer().render({'index': 1}, 'application/json; indent=4')
+        )
+        self.assertIsNone(renderer.render(None) or None)
@@ -6,7 +6,13 @@ app_name = 'api'
 
 urlpatterns = [
     path('companies/', views.CompanyViewSet.as_view({'get': 'list'}), name='company-list'),
+    path('companies/search/', views.CompanySearchView.as_view(), name='company-search'),
     path('employees/', views.EmployeesView.as_view(), name='employees'),
+    path('export/people.ndjson', views.PeopleExportView.as_view(), name='export-people'),
     path('friends/', views.CommonFriendsView.as_view(), name='friends'),
+    path('friends/path/', views.FriendPathView.as_view(), name='friends-path'),
+    path('friends/suggestions/', views.FriendSuggestionsView.as_view(), name='friends-suggestions'),
+    path('friends/batch/', views.CommonFriendsBatchView.as_view(), name='friends-batch'),
     path('fruits/', views.FruitVegetalbeView.as_view(), name='fruits'),
+    path('metrics/db/', views.DatabasePoolView.as_view(), name='db-metrics'),
 ]
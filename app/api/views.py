@@ -1,79 +1,325 @@
+import json
+
+from django.db.models import BooleanField, Case, Q, Value, When
+from django.http import StreamingHttpResponse
 from rest_framework import generics, viewsets, mixins, status
-from rest_framework.authentication import TokenAuthentication
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
 
+from core.dimensions import company_dimension
+from core.export import export_people
+from core.graph import PathSearchTimeout, friend_graph
 from core.models import Company, People
+from core.pool import pool_stats
+from core.search import company_search
 from api import serializers
+from api.caching import cached_response
+from api.pagination import EmployeesPagination
+from api.renderers import FastJSONRenderer, NDJSONRenderer
+from user.authentication import CachedTokenAuthentication
+
+
+MAX_FRIEND_PAIRS = 1000
+MAX_FRIEND_GROUP = 100
+MAX_PATH_DEPTH = 10
+MAX_PATH_TIMEOUT_MS = 2000
+MAX_SUGGESTIONS = 100
+# Ranked suggestions the filters are applied to per query, and the most
+# queries a request runs before returning fewer than limit suggestions
+MAX_SUGGESTION_CANDIDATES = 500
+MAX_SUGGESTION_QUERIES = 20
+MAX_FRUITS_PEOPLE = 5000
+STREAM_CHUNK_SIZE = 2000
+MAX_COMPANY_MATCHES = 50
+BOOLEAN_PARAMS = {'true': True, 'false': False}
+FAST_RENDERER_CLASSES = (FastJSONRenderer, BrowsableAPIRenderer)
+
+
+def friend_filters(params, eye_color='brown', has_died=False):
+    """Return the People lookups selected by the common friends filters
+
+    eye_color defaults to brown and has_died to false, either can be set
+    to "any" to drop it; age_min, age_max and gender are optional. Raises
+    ValueError for malformed values.
+    """
+    filters = dict()
+
+    eye_color = params.get('eye_color', eye_color)
+    if not isinstance(eye_color, str):
+        raise ValueError('eye_color')
+    if eye_color != 'any':
+        filters['eye_color'] = eye_color
+
+    has_died = params.get('has_died', has_died)
+    if has_died != 'any':
+        if isinstance(has_died, str):
+            has_died = BOOLEAN_PARAMS.get(has_died.lower())
+        if not isinstance(has_died, bool):
+            raise ValueError('has_died')
+        filters['has_died'] = has_died
+
+    for param, lookup in (('age_min', 'age__gte'), ('age_max', 'age__lte')):
+        if param in params:
+            if isinstance(params[param], bool):
+                raise ValueError(param)
+            filters[lookup] = int(params[param])
+
+    if 'gender' in params:
+        if not isinstance(params['gender'], str):
+            raise ValueError('gender')
+        filters['gender'] = params['gender']
+
+    return filters
+
+
+def requested_fields(params, available):
+    """Return the fields of available selected by the fields query parameter
+
+    Every field by default, in the order of available. Returns None when
+    no field or an unknown field is requested.
+    """
+    param = params.get('fields')
+    if param is None:
+        return available
+    requested = {field for field in param.split(',') if field}
+    if not requested or not requested <= set(available):
+        return None
+    if requested == set(available):
+        return available
+    return tuple(field for field in available if field in requested)
+
+
+def unknown_fields_response(available):
+    """Return the 400 response listing the fields that can be requested"""
+    response = {"message": "fields should be a comma separated list of: {}".format(', '.join(available))}
+    return Response(response, status=status.HTTP_400_BAD_REQUEST)
+
+
+def common_friends_groups(groups, filters, columns=serializers.PEOPLE_COLUMNS):
+    """Return the people and filtered common friends of groups of indexes
+
+    Common friends come from the in-memory friend graph. Every person
+    involved is read as a row of columns with a single query that
+    also applies the filters, so the query count does not depend on the
+    number of groups. Also returns the sorted indexes of the requested
+    people that do not exist.
+    """
+    commons = [friend_graph.common_friends(*group) for group in groups]
+    requested = {index for group in groups for index in group}
+    candidates = {index for common in commons for index in common}
+    matching = Q(index__in=candidates, **filters)
+    people = {
+        row[0]: row for row in People.objects.filter(
+            Q(index__in=requested) | matching
+        ).values_list(
+            *columns,
+            Case(When(matching, then=Value(True)), default=Value(False), output_field=BooleanField())
+        )
+    }
+
+    missing = sorted(requested - set(people))
+    if missing:
+        return [], missing
+
+    results = [
+        (
+            [people[index] for index in group],
+            [people[index] for index in common if index in people and people[index][-1]]
+        )
+        for group, common in zip(groups, commons)
+    ]
+    return results, missing
+
+
+def stream_json_array(rows, chunk_size=STREAM_CHUNK_SIZE):
+    """Yield the JSON array of rows a chunk of rows at a time"""
+    yield '['
+    separator = ''
+    chunk = []
+    for row in rows:
+        chunk.append(json.dumps(row))
+        if len(chunk) == chunk_size:
+            yield separator + ','.join(chunk)
+            separator = ','
+            chunk = []
+    if chunk:
+        yield separator + ','.join(chunk)
+    yield ']'
+
+
+def missing_people_response(missing):
+    """Return the 404 response listing people that do not exist"""
+    response = {"message": "People do not exist: {}".format(', '.join(str(index) for index in missing))}
+    return Response(response, status=status.HTTP_404_NOT_FOUND)
+
+
+def is_index_pair(pair):
+    """Return whether pair is a list of two people indexes, e.g. [0, 1]"""
+    return (
+        isinstance(pair, (list, tuple)) and len(pair) == 2
+        and all(isinstance(index, int) and not isinstance(index, bool) for index in pair)
+    )
 
 
 class CompanyViewSet(viewsets.GenericViewSet, mixins.ListModelMixin):
     """Manage companies in the database"""
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
     queryset = Company.objects.all()
     serializer_class = serializers.CompanySerializer
 
+    def get_queryset(self):
+        """Return the companies from the dimension table"""
+        return company_dimension.all()
+
+    @cached_response
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+
+class CompanySearchView(generics.GenericAPIView):
+    """An APIView for company name search and autocomplete"""
+    authentication_classes = (CachedTokenAuthentication, )
+    permission_classes = (IsAuthenticated, )
+
+    @cached_response
+    def get(self, request):
+        """Get the companies whose name contains q, best matches first"""
+        query = request.query_params.get('q', '').strip()
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            limit = 0
+        if not query or not 1 <= limit <= MAX_COMPANY_MATCHES:
+            response = {"message": "Please enter q and a limit within 1 and {}.".format(MAX_COMPANY_MATCHES)}
+            return Response(response, status=status.HTTP_400_BAD_REQUEST)
+
+        companies = company_search.search(query, limit)
+        return Response(serializers.CompanySerializer(companies, many=True).data)
+
 
 class EmployeesView(generics.ListAPIView):
     """An APIView for listing all employees in a company"""
     serializer_class = serializers.EmployeesSerializer
-    authentication_classes = (TokenAuthentication, )
+    pagination_class = EmployeesPagination
+    authentication_classes = (CachedTokenAuthentication, )
     permission_classes = (IsAuthenticated, )
     queryset = Company.objects.all()
 
+    @cached_response
     def get(self, request):
-        """Get a list of employees in a company"""
+        """Get a list of employees in a company
+
+        The whole list by default, a page when cursor or limit is given,
+        or a JSON array streamed from a server-side cursor with stream=true.
+        """
         param = self.request.query_params.get('company')
         if not param:
             response = {"message": "Either company name or index required."}
             return Response(response, status=status.HTTP_400_BAD_REQUEST)
 
         if param.isnumeric():
-            self.queryset = self.queryset.filter(index__exact=int(param))
+            company = company_dimension.by_index(int(param))
         else:
-            self.queryset = self.queryset.filter(name__icontains=param)
+            company = company_search.resolve(param)
 
-        if self.queryset.count() != 1:
+        if company is None:
             response = {"message": "Please provide accurate company info."}
             return Response(response, status=status.HTTP_404_NOT_FOUND)
 
-        return super(EmployeesView, self).get(request)
+        employees = People.objects.filter(company_id=company.pk).values('index', 'name')
+        if self.request.query_params.get('stream', '').lower() == 'true':
+            rows = employees.order_by('index').iterator(chunk_size=STREAM_CHUNK_SIZE)
+            return StreamingHttpResponse(stream_json_array(rows), content_type='application/json')
+
+        if 'cursor' in self.request.query_params or 'limit' in self.request.query_params:
+            return self.get_paginated_response(self.paginate_queryset(employees))
+
+        return Response(self.get_serializer([company], many=True).data)
 
 
 class FruitVegetalbeView(generics.ListAPIView):
     """An APIView for listing fruit and vegetable individual likes"""
     serializer_class = serializers.FruitVegetableSerializer
-    authentication_classes = (TokenAuthentication, )
+    authentication_classes = (CachedTokenAuthentication, )
     permission_classes = (IsAuthenticated, )
     queryset = People.objects.all()
+    fields = ('username', 'age', 'fruits', 'vegetables')
+    field_columns = {'username': ('name',), 'age': ('age',), 'fruits': (), 'vegetables': ()}
+
+    def get_queryset(self):
+        """Read only the columns of the requested fields"""
+        fields = self.get_serializer_context()['fields']
+        return self.queryset.only('index', *(column for field in fields for column in self.field_columns[field]))
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = requested_fields(self.request.query_params, self.fields)
+        return context
+
+    @cached_response
     def get(self, request):
+        """Get the fruits and vegetables of one or a comma separated list of people"""
+        if requested_fields(request.query_params, self.fields) is None:
+            return unknown_fields_response(self.fields)
+
         param = self.request.query_params.get('index')
         if not param:
             response = {"message": "Please enter people index as query parameter."}
             return Response(response, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            self.queryset = self.queryset.filter(index__exact=int(param))
+            indexes = list(dict.fromkeys(int(index) for index in param.split(',')))
         except ValueError:
             response = {"message": "Invalid query parameter"}
             return Response(response, status=status.HTTP_400_BAD_REQUEST)
+        if len(indexes) > MAX_FRUITS_PEOPLE:
+            response = {"message": "At most {} people can be requested.".format(MAX_FRUITS_PEOPLE)}
+            return Response(response, status=status.HTTP_400_BAD_REQUEST)
 
-        if self.queryset.count() != 1:
-            response = {"message": "Records do not exist."}
-            return Response(response, status=status.HTTP_404_NOT_FOUND)
+        people = self.get_queryset().in_bulk(indexes, field_name='index')
+        if len(people) != len(indexes):
+            if len(indexes) == 1:
+                response = {"message": "Records do not exist."}
+                return Response(response, status=status.HTTP_404_NOT_FOUND)
+            return missing_people_response(sorted(set(indexes) - set(people)))
 
-        return super(FruitVegetalbeView, self).get(request)
+        context = self.get_serializer_context()
+        if 'fruits' in context['fields'] or 'vegetables' in context['fields']:
+            # Only the through rows are read, the food names come from the dimension table
+            context['food_ids'] = {person.pk: [] for person in people.values()}
+            for people_id, food_id in People.foods.through.objects.filter(
+                people_id__in=context['food_ids']
+            ).order_by('id').values_list('people_id', 'food_id'):
+                context['food_ids'][people_id].append(food_id)
+
+        serializer = self.get_serializer_class()([people[index] for index in indexes], many=True, context=context)
+        return Response(serializer.data)
 
 
 class CommonFriendsView(generics.ListAPIView):
-    """An APIView for listing 2 people in commond"""
-    authentication_classes = (TokenAuthentication, )
+    """An APIView for listing 2 or more people and their common friends"""
+    authentication_classes = (CachedTokenAuthentication, )
     permission_classes = (IsAuthenticated, )
+    renderer_classes = FAST_RENDERER_CLASSES
 
+    @cached_response
     def get(self, request):
-        """Get the details of 2 people and their common friends"""
+        """Get the details of 2 or more people and their common friends"""
+        try:
+            filters = friend_filters(request.query_params)
+        except (TypeError, ValueError):
+            response = {"message": "Incorrect filters provided."}
+            return Response(response, status=status.HTTP_400_BAD_REQUEST)
+
+        fields = requested_fields(request.query_params, serializers.PEOPLE_FIELDS)
+        if fields is None:
+            return unknown_fields_response(serializers.PEOPLE_FIELDS)
+
+        if 'indexes' in request.query_params:
+            return self.get_group(request.query_params['indexes'], filters, fields)
+
         index1 = request.query_params.get('index1')
         index2 = request.query_params.get('index2')
 
@@ -82,20 +328,194 @@ class CommonFriendsView(generics.ListAPIView):
             return Response(response, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            people1 = People.objects.get(index=int(index1))
-            people2 = People.objects.get(index=int(index2))
-        except People.DoesNotExist:
+            index1, index2 = int(index1), int(index2)
+        except ValueError:
+            response = {"message": "Incorrect query parameters provided."}
+            return Response(response, status=status.HTTP_400_BAD_REQUEST)
+
+        results, missing = common_friends_groups([(index1, index2)], filters, serializers.people_columns(fields))
+        if missing:
             response = {"message": "Incorrect query parameters provided."}
             return Response(response, status=status.HTTP_404_NOT_FOUND)
+
+        (people1, people2), common_friends = results[0]
+        objs_dict = {'people1': people1, 'people2': people2, 'common_friends': common_friends}
+        return Response(serializers.CommonFriendsSerializer(objs_dict, context={'fields': fields}).data)
+
+    def get_group(self, param, filters, fields):
+        """Get the details of a comma separated list of people and the friends they all share"""
+        try:
+            indexes = list(dict.fromkeys(int(index) for index in param.split(',')))
         except ValueError:
             response = {"message": "Incorrect query parameters provided."}
             return Response(response, status=status.HTTP_400_BAD_REQUEST)
+        if not 2 <= len(indexes) <= MAX_FRIEND_GROUP:
+            response = {"message": "Between 2 and {} people should be provided.".format(MAX_FRIEND_GROUP)}
+            return Response(response, status=status.HTTP_400_BAD_REQUEST)
+
+        results, missing = common_friends_groups([indexes], filters, serializers.people_columns(fields))
+        if missing:
+            return missing_people_response(missing)
+
+        people, common_friends = results[0]
+        objs_dict = {'people': people, 'common_friends': common_friends}
+        return Response(serializers.CommonFriendsGroupSerializer(objs_dict, context={'fields': fields}).data)
+
+
+class CommonFriendsBatchView(generics.GenericAPIView):
+    """An APIView for listing the common friends of many pairs of people"""
+    authentication_classes = (CachedTokenAuthentication, )
+    permission_classes = (IsAuthenticated, )
+    renderer_classes = FAST_RENDERER_CLASSES
+
+    def post(self, request):
+        """Get the details and common friends of every pair of people"""
+        pairs = request.data.get('pairs') if isinstance(request.data, dict) else None
+        if not isinstance(pairs, list) or not pairs:
+            response = {"message": "A list of pairs of people should be provided."}
+            return Response(response, status=status.HTTP_400_BAD_REQUEST)
+        if len(pairs) > MAX_FRIEND_PAIRS:
+            response = {"message": "At most {} pairs can be requested.".format(MAX_FRIEND_PAIRS)}
+            return Response(response, status=status.HTTP_400_BAD_REQUEST)
+
+        if not all(is_index_pair(pair) for pair in pairs):
+            response = {"message": "Incorrect pairs provided."}
+            return Response(response, status=status.HTTP_400_BAD_REQUEST)
+        pairs = [tuple(pair) for pair in pairs]
+        if any(index1 == index2 for index1, index2 in pairs):
+            response = {"message": "Two people should be provided."}
+            return Response(response, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            filters = friend_filters(request.data)
+        except (TypeError, ValueError):
+            response = {"message": "Incorrect filters provided."}
+            return Response(response, status=status.HTTP_400_BAD_REQUEST)
+        fields = requested_fields(request.query_params, serializers.PEOPLE_FIELDS)
+        if fields is None:
+            return unknown_fields_response(serializers.PEOPLE_FIELDS)
+
+        results, missing = common_friends_groups(pairs, filters, serializers.people_columns(fields))
+        if missing:
+            return missing_people_response(missing)
+
+        objs_dicts = [
+            {'people1': people1, 'people2': people2, 'common_friends': common_friends}
+            for (people1, people2), common_friends in results
+        ]
+        return Response(serializers.CommonFriendsSerializer(objs_dicts, many=True, context={'fields': fields}).data)
+
+
+class FriendPathView(generics.GenericAPIView):
+    """An APIView for the shortest friend chain between 2 people"""
+    authentication_classes = (CachedTokenAuthentication, )
+    permission_classes = (IsAuthenticated, )
+    renderer_classes = FAST_RENDERER_CLASSES
+
+    @cached_response
+    def get(self, request):
+        """Get the people on the shortest friend chain from index1 to index2"""
+        try:
+            index1 = int(request.query_params['index1'])
+            index2 = int(request.query_params['index2'])
+            max_depth = int(request.query_params.get('max_depth', 6))
+            timeout_ms = int(request.query_params.get('timeout_ms', 200))
+        except (KeyError, ValueError):
+            response = {"message": "Two people should be provided."}
+            return Response(response, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= max_depth <= MAX_PATH_DEPTH or not 1 <= timeout_ms <= MAX_PATH_TIMEOUT_MS:
+            response = {"message": "max_depth must be within 1 and {} and timeout_ms within 1 and {}.".format(
+                MAX_PATH_DEPTH, MAX_PATH_TIMEOUT_MS
+            )}
+            return Response(response, status=status.HTTP_400_BAD_REQUEST)
+        fields = requested_fields(request.query_params, serializers.PEOPLE_FIELDS)
+        if fields is None:
+            return unknown_fields_response(serializers.PEOPLE_FIELDS)
 
-        options = {'eye_color': 'brown', 'has_died': False}
-        objs_dict = {
-            'people1': people1,
-            'people2': people2,
-            'common_friends': people1.get_common_friends(people2, **options)
+        try:
+            path = friend_graph.shortest_path(index1, index2, max_depth, timeout_ms / 1000)
+        except PathSearchTimeout:
+            response = {"message": "The friend path search ran out of time."}
+            return Response(response, status=status.HTTP_504_GATEWAY_TIMEOUT)
+
+        people = {
+            row[0]: row for row in People.objects.filter(
+                index__in={index1, index2, *(path or [])}
+            ).values_list(*serializers.people_columns(fields))
         }
+        missing = sorted({index1, index2} - set(people))
+        if missing:
+            return missing_people_response(missing)
+        if path is None:
+            response = {"message": "No friend path within {} degrees.".format(max_depth)}
+            return Response(response, status=status.HTTP_404_NOT_FOUND)
 
-        return Response(serializers.CommonFriendsSerializer(objs_dict).data)
+        objs_dict = {'path': [people[index] for index in path]}
+        return Response(serializers.FriendPathSerializer(objs_dict, context={'fields': fields}).data)
+
+
+class FriendSuggestionsView(generics.GenericAPIView):
+    """An APIView for the people someone may know, by mutual friends"""
+    authentication_classes = (CachedTokenAuthentication, )
+    permission_classes = (IsAuthenticated, )
+    renderer_classes = FAST_RENDERER_CLASSES
+
+    @cached_response
+    def get(self, request):
+        """Get the top non-friends of a person ranked by mutual friends"""
+        try:
+            index = int(request.query_params['index'])
+            limit = int(request.query_params.get('limit', 10))
+            filters = friend_filters(request.query_params, eye_color='any', has_died='any')
+        except (KeyError, TypeError, ValueError):
+            response = {"message": "Please enter people index and valid filters as query parameters."}
+            return Response(response, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= limit <= MAX_SUGGESTIONS:
+            response = {"message": "limit must be within 1 and {}.".format(MAX_SUGGESTIONS)}
+            return Response(response, status=status.HTTP_400_BAD_REQUEST)
+        fields = requested_fields(request.query_params, serializers.PEOPLE_FIELDS)
+        if fields is None:
+            return unknown_fields_response(serializers.PEOPLE_FIELDS)
+
+        columns = serializers.people_columns(fields)
+        person = People.objects.filter(index=index).values_list(*columns).first()
+        if person is None:
+            return missing_people_response([index])
+
+        ranking = friend_graph.suggestions(index)
+        suggestions = []
+        end = min(len(ranking), MAX_SUGGESTION_CANDIDATES * MAX_SUGGESTION_QUERIES)
+        for start in range(0, end, MAX_SUGGESTION_CANDIDATES):
+            candidates = dict(ranking[start:start + MAX_SUGGESTION_CANDIDATES])
+            matches = {
+                row[0]: row for row in People.objects.filter(index__in=candidates, **filters).values_list(*columns)
+            }
+            suggestions.extend(
+                (matches[candidate], candidates[candidate]) for candidate in candidates if candidate in matches
+            )
+            if len(suggestions) >= limit:
+                break
+
+        objs_dict = {'people': person, 'suggestions': suggestions[:limit]}
+        return Response(serializers.FriendSuggestionsSerializer(objs_dict, context={'fields': fields}).data)
+
+
+class PeopleExportView(generics.GenericAPIView):
+    """An APIView streaming the whole people dataset as NDJSON"""
+    authentication_classes = (CachedTokenAuthentication, )
+    permission_classes = (IsAuthenticated, )
+    renderer_classes = (NDJSONRenderer, )
+
+    def get(self, request):
+        """Get every people as a people.json record per line, as load_paranuara reads them"""
+        return StreamingHttpResponse(export_people(), content_type=NDJSONRenderer.media_type)
+
+
+class DatabasePoolView(generics.GenericAPIView):
+    """An APIView reporting the database connection pools of the serving process"""
+    authentication_classes = (CachedTokenAuthentication, )
+    permission_classes = (IsAdminUser, )
+
+    def get(self, request):
+        """Get the checkout, connection and wait counters of each pool"""
+        return Response(pool_stats())
@@ -0,0 +1,135 @@
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.core import signals
+from django.core.exceptions import RequestAborted
+from django.core.handlers.asgi import ASGIHandler
+from django.db import close_old_connections
+from django.http import FileResponse
+from django.urls import set_script_prefix
+
+
+STREAM_BUFFER = 8
+
+
+class PooledASGIHandler(ASGIHandler):
+    """ASGIHandler running the synchronous views in a bounded thread pool
+
+    Django 3.0 hands get_response to asgiref's sync_to_async, which recent
+    asgiref releases make thread sensitive: every request of the process
+    then waits for one thread. Requests run instead in a pool of
+    ASGI_THREADS threads, each keeping its database connection like a
+    WSGI worker thread. Streaming responses are iterated in a pool of
+    their own, of ASGI_STREAM_THREADS threads, as the ORM refuses to run
+    in the event loop and slow downloads must not hold the view threads;
+    they are read at most STREAM_BUFFER chunks ahead of the client.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.executor = ThreadPoolExecutor(max_workers=settings.ASGI_THREADS, thread_name_prefix='asgi')
+        self.stream_executor = ThreadPoolExecutor(
+            max_workers=settings.ASGI_STREAM_THREADS, thread_name_prefix='asgi-stream'
+        )
+
+    async def run_in_pool(self, func, *args, executor=None):
+        """Run func(*args) in the thread pool, or executor, with the current context"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor or self.executor, contextvars.copy_context().run, func, *args)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            raise ValueError('Django can only handle ASGI/HTTP connections, not {}.'.format(scope['type']))
+        try:
+            body_file = await self.read_body(receive)
+        except RequestAborted:
+            return
+        set_script_prefix(self.get_script_prefix(scope))
+        request, error_response = self.create_request(scope, body_file)
+        if request is None:
+            await self.send_response(error_response, send)
+            return
+
+        response = await self.run_in_pool(self.handle_request, scope, request)
+        response._handler_class = self.__class__
+        if isinstance(response, FileResponse):
+            response.block_size = self.chunk_size
+        if response.streaming:
+            await self.send_streaming_response(response, send)
+        else:
+            await self.send_response(response, send)
+
+    def handle_request(self, scope, request):
+        """Return the response of request, in a pool thread"""
+        signals.request_started.send(sender=self.__class__, scope=scope)
+        response = self.get_response(request)
+        # A streaming response is read with the connection of a stream thread
+        close_old_connections()
+        return response
+
+    def iterate_response(self, response, loop, queue, cancelled):
+        """Put the parts of a streaming response on queue, in a stream thread
+
+        None marks the end of the parts unless the client went away.
+        """
+        try:
+            for part in response:
+                if cancelled.is_set():
+                    break
+                asyncio.run_coroutine_threadsafe(queue.put(part), loop).result()
+        finally:
+            response.close()
+            if not cancelled.is_set():
+                asyncio.run_coroutine_threadsafe(queue.put(None), loop).result()
+
+    async def send_streaming_response(self, response, send):
+        """Send a streaming response iterated in the stream thread pool
+
+        A response failing midway raises without ending the body, so the
+        server aborts the connection rather than leave the client with a
+        truncated body it takes for complete.
+        """
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': self.response_headers(response),
+        })
+        queue = asyncio.Queue(maxsize=STREAM_BUFFER)
+        cancelled = threading.Event()
+        iteration = asyncio.ensure_future(self.run_in_pool(
+            self.iterate_response, response, asyncio.get_running_loop(), queue, cancelled,
+            executor=self.stream_executor
+        ))
+        try:
+            while True:
+                part = await queue.get()
+                if part is None:
+                    break
+                for chunk, _ in self.chunk_bytes(part):
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        finally:
+            cancelled.set()
+            while not queue.empty():
+                queue.get_nowait()
+        await iteration
+        await send({'type': 'http.response.body'})
+
+    def response_headers(self, response):
+        """Return the ASGI headers of response, cookies included"""
+        headers = [
+            (header.encode('ascii'), value.encode('latin1'))
+            for header, value in response.items()
+        ]
+        for cookie in response.cookies.values():
+            headers.append((b'Set-Cookie', cookie.output(header='').encode('ascii').strip()))
+        return headers
+
+
+def get_asgi_application():
+    """Set up Django and return a PooledASGIHandler"""
+    django.setup(set_prefix=False)
+    return PooledASGIHandler()
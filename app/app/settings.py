@@ -46,6 +46,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'django.middleware.gzip.GZipMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',
+    'core.middleware.ReplicaReadMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -74,20 +77,93 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'app.wsgi.application'
 
+# Number of threads running the views of an ASGI process, which is also the
+# number of database connections it opens
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 20))
+
+# Number of threads of an ASGI process reading streaming responses, e.g. the
+# exports, while they are sent; each also keeps a database connection
+ASGI_STREAM_THREADS = int(os.environ.get('ASGI_STREAM_THREADS', 10))
+
 
 # Database
 # https://docs.djangoproject.com/en/3.0/ref/settings/#databases
 
+# With DB_POOL=true the connections are borrowed from a pool of at most
+# MAX_SIZE per process, kept open and pinged before reuse after PING_AFTER
+# idle seconds, see core.backends.postgresql_pool. Pool counters are served
+# at /api/metrics/db/.
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': (
+            'core.backends.postgresql_pool' if os.environ.get('DB_POOL', '').lower() == 'true'
+            else 'django.db.backends.postgresql'
+        ),
         'HOST': os.environ.get('DB_HOST'),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
+        'POOL': {
+            'MAX_SIZE': int(os.environ.get('DB_POOL_SIZE', 20)),
+            'TIMEOUT': 10,
+            'PING_AFTER': 30,
+        },
     }
 }
 
+# Read replicas of the primary, as a comma separated DB_REPLICA_HOSTS. The
+# companies, people, foods and tags read by safe API requests are spread
+# over them, see core.routers.ReplicaRouter; tests read from the primary.
+DATABASE_REPLICAS = []
+for number, host in enumerate(filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(',')), 1):
+    alias = 'replica{}'.format(number)
+    DATABASES[alias] = dict(DATABASES['default'], HOST=host, TEST={'MIRROR': 'default'})
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+# Seconds a replica failing to connect is skipped for
+REPLICA_RETRY_SECONDS = 30
+
+# Seconds between two pings of the open connection to a replica
+REPLICA_CHECK_SECONDS = 1
+
+# Seconds the reads of a client go to the primary after it wrote
+REPLICA_PIN_SECONDS = 5
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+#
+# responses holds the rendered API responses, keyed by the dataset version,
+# and evicts the least recently used ones past MAX_ENTRIES. Point both caches
+# at a shared backend, e.g. memcached, so every process shares the version
+# and the responses; with the local memory backend a write made by another
+# process, e.g. load_paranuara, is seen once the responses expire.
+#
+# tokens holds the token to user lookups of CachedTokenAuthentication; with
+# the local memory backend a token deleted by another process keeps
+# authenticating until its entry expires.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'responses',
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+    'tokens': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tokens',
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
@@ -127,4 +203,23 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
-AUTH_USER_MODEL = 'core.User'
\ No newline at end of file
+AUTH_USER_MODEL = 'core.User'
+
+# Seconds before the in-memory friend graph is rebuilt to pick up friends
+# written by other processes, e.g. load_paranuara
+FRIEND_GRAPH_MAX_AGE = 300
+
+# Number of people whose friend suggestions rankings are kept in memory
+FRIEND_SUGGESTIONS_CACHE_SIZE = 1024
+
+# Seconds after which the in-memory company name index, used by the company
+# search on backends without pg_trgm, is rebuilt
+COMPANY_SEARCH_MAX_AGE = 300
+
+# Seconds after which the in-memory copies of the food, tag and company
+# tables are reloaded to pick up writes made by other processes
+DIMENSIONS_MAX_AGE = 300
+
+# Minimum seconds between two reloads of a dimension table caused by a lookup
+# of a missing row, other misses read the missing rows only
+DIMENSIONS_MISS_RELOAD_SECONDS = 1
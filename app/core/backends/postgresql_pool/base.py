@@ -0,0 +1,69 @@
+from django.db.backends.postgresql import base, creation
+from psycopg2 import extensions
+
+from core.pool import ConnectionPool, close_pool, get_pool
+
+
+def ping(connection):
+    """Check a connection answers, leaving it outside any transaction"""
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+    reset(connection)
+
+
+def reset(connection):
+    """Roll back whatever transaction a returned connection is left in"""
+    if connection.closed:
+        raise base.Database.InterfaceError('connection already closed')
+    if connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+        connection.rollback()
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Connections still checked out, e.g. by the threads of a test server, would keep the database in use
+        close_pool(self.connection.alias, test_database_name, checked_out=True)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL backend borrowing its connections from a ConnectionPool
+
+    Closing the connection, e.g. at the end of a request, returns it to
+    the pool of the process instead. The pool is configured by the POOL
+    setting of the database: MAX_SIZE (20), TIMEOUT (10 seconds) and
+    PING_AFTER (30 seconds).
+    """
+    creation_class = DatabaseCreation
+
+    def get_pool(self, conn_params):
+        options = self.settings_dict.get('POOL', {})
+        return get_pool(self.alias, conn_params.get('database'), lambda: ConnectionPool(
+            lambda: base.Database.connect(**conn_params),
+            max_size=options.get('MAX_SIZE', 20),
+            timeout=options.get('TIMEOUT', 10),
+            ping_after=options.get('PING_AFTER', 30),
+            ping=ping,
+            reset=reset,
+        ))
+
+    def get_new_connection(self, conn_params):
+        self.pool = self.get_pool(conn_params)
+        connection = self.pool.checkout()
+
+        options = self.settings_dict['OPTIONS']
+        try:
+            self.isolation_level = options['isolation_level']
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            # A connection closed within an atomic block stays attached to
+            # this wrapper until the block exits, so it cannot be shared.
+            self.pool.checkin(self.connection, broken=self.in_atomic_block)
@@ -0,0 +1,76 @@
+import time
+
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import Company, Food, Tag, People
+
+
+DATASET_VERSION_KEY = 'dataset-version'
+
+
+class DatasetVersion:
+    """Counter bumped whenever companies, people, foods or tags change
+
+    The counter is kept in the default cache so processes sharing a cache
+    backend agree on it. It starts from the current time in milliseconds,
+    so a counter evicted from the cache or restarted with the process
+    never goes back to a value an older response was cached under.
+    """
+
+    @property
+    def cache(self):
+        return caches['default']
+
+    def get(self):
+        """Return the current version"""
+        version = self.cache.get(DATASET_VERSION_KEY)
+        if version is None:
+            self.cache.add(DATASET_VERSION_KEY, time.time_ns() // 1000000, timeout=None)
+            version = self.cache.get(DATASET_VERSION_KEY)
+        return version
+
+    def bump(self):
+        """Move to a new version, making the responses cached so far stale"""
+        try:
+            return self.cache.incr(DATASET_VERSION_KEY)
+        except ValueError:
+            self.get()
+            return self.cache.incr(DATASET_VERSION_KEY)
+
+
+dataset_version = DatasetVersion()
+
+
+def now_and_on_commit(func, using=None):
+    """Call func now and, within a transaction, again once it commits
+
+    Calling it now keeps the reads that follow in the transaction
+    consistent. Calling it again after the commit drops whatever another
+    thread cached from the data as it was before the commit. func is
+    registered once per transaction however often it is called.
+    """
+    func()
+    connection = transaction.get_connection(using)
+    if connection.in_atomic_block and all(callback != func for _, callback in connection.run_on_commit):
+        transaction.on_commit(func, using)
+
+
+@receiver(m2m_changed, sender=People.friends.through)
+@receiver(m2m_changed, sender=People.foods.through)
+@receiver(m2m_changed, sender=People.tags.through)
+@receiver(post_save, sender=Company)
+@receiver(post_delete, sender=Company)
+@receiver(post_save, sender=People)
+@receiver(post_delete, sender=People)
+@receiver(post_save, sender=Food)
+@receiver(post_delete, sender=Food)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def bump_dataset_version(sender, **kwargs):
+    """Make the cached responses stale after the dataset changes"""
+    action = kwargs.get('action')
+    if action is None or action.startswith('post_'):
+        now_and_on_commit(dataset_version.bump)
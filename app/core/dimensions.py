@@ -0,0 +1,235 @@
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.dataset import now_and_on_commit
+from core.models import Company, Food, Tag
+
+
+FoodTable = namedtuple('FoodTable', ('names', 'ids', 'categories'))
+TagTable = namedtuple('TagTable', ('names', 'ids'))
+CompanyTable = namedtuple('CompanyTable', ('by_id', 'by_index'))
+
+
+class Dimension:
+    """Process-local copy of a small, nearly static table
+
+    The table is read in one query on first use into dicts answering
+    lookups without the database. It is dropped when its rows change in
+    this process and reloaded after DIMENSIONS_MAX_AGE seconds to pick
+    up writes made by other processes, such as load_paranuara. A lookup
+    of a missing row reloads it at most once per
+    DIMENSIONS_MISS_RELOAD_SECONDS, later misses read the missing rows
+    alone. Tables are loaded from the primary, never from a replica
+    behind it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._table = None
+        self._built_at = 0
+        self._generation = 0
+        self._miss_reloaded_at = None
+
+    @property
+    def max_age(self):
+        return getattr(settings, 'DIMENSIONS_MAX_AGE', 300)
+
+    @property
+    def miss_reload_seconds(self):
+        return getattr(settings, 'DIMENSIONS_MISS_RELOAD_SECONDS', 1)
+
+    def invalidate(self):
+        """Drop the table so the next lookup reloads it, and any load already running"""
+        self._generation += 1
+        self._table = None
+
+    def table(self):
+        """Return the loaded table, loading it if needed"""
+        table = self._table
+        if table is None or time.monotonic() - self._built_at > self.max_age:
+            with self._lock:
+                table = self._table
+                if table is None or time.monotonic() - self._built_at > self.max_age:
+                    generation = self._generation
+                    table = self.load()
+                    if generation == self._generation:
+                        self._table = table
+                        self._built_at = time.monotonic()
+        return table
+
+    def reload_for_miss(self):
+        """Reload the table in place unless a miss reloaded it in the last miss_reload_seconds, return whether it did
+
+        The current table keeps answering other lookups during the reload.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._miss_reloaded_at is not None and now - self._miss_reloaded_at < self.miss_reload_seconds:
+                return False
+            self._miss_reloaded_at = now
+            generation = self._generation
+            table = self.load()
+            if generation == self._generation:
+                self._table = table
+                self._built_at = now
+        return True
+
+    def table_of(self, pks):
+        """Return a table holding every row of pks that exists, e.g. rows another process added
+
+        Missing rows reload the table, or when it was reloaded for a miss
+        too recently, are read alone into a copy of it.
+        """
+        table = self.table()
+        missing = set(pks) - table[0].keys()
+        if missing and self.reload_for_miss():
+            table = self.table()
+        elif missing:
+            rows = self.load(missing)
+            # Existing keys win, like the first pk of a duplicated tag name
+            table = type(table)(*({**new, **current} for current, new in zip(table, rows)))
+        return table
+
+    def load(self, pks=None):
+        """Return the table read from the database, or its rows of pks only, keyed by pk in its first field"""
+        raise NotImplementedError
+
+
+class FoodDimension(Dimension):
+    """Food names, ids and categories"""
+
+    def load(self, pks=None):
+        names, ids, categories = dict(), dict(), dict()
+        foods = Food.objects.using(DEFAULT_DB_ALIAS)
+        if pks is not None:
+            foods = foods.filter(pk__in=pks)
+        for pk, name, category in foods.values_list('id', 'name', 'category'):
+            names[pk] = name
+            ids[name] = pk
+            categories[pk] = category
+        return FoodTable(names, ids, categories)
+
+    def names(self):
+        """Return the {pk: name} of the foods"""
+        return self.table().names
+
+    def ids(self):
+        """Return the {name: pk} of the foods"""
+        return self.table().ids
+
+    def category(self, pk):
+        """Return the category of a food pk"""
+        return self.table().categories[pk]
+
+    def split(self, pks):
+        """Return the (fruit names, vegetable names) of a list of food pks, in order"""
+        names, _, categories = self.table_of(pks)
+        fruits, vegetables = [], []
+        for pk in pks:
+            (fruits if categories[pk] == 'fruit' else vegetables).append(names[pk])
+        return fruits, vegetables
+
+
+class TagDimension(Dimension):
+    """Tag names and ids"""
+
+    def load(self, pks=None):
+        names, ids = dict(), dict()
+        tags = Tag.objects.using(DEFAULT_DB_ALIAS)
+        if pks is not None:
+            tags = tags.filter(pk__in=pks)
+        for pk, name in tags.order_by('id').values_list('id', 'name'):
+            names[pk] = name
+            # Tag names are not unique, the first one wins like in NameMap
+            ids.setdefault(name, pk)
+        return TagTable(names, ids)
+
+    def names(self):
+        """Return the {pk: name} of the tags"""
+        return self.table().names
+
+    def ids(self):
+        """Return the {name: pk} of the tags"""
+        return self.table().ids
+
+
+class CompanyDimension(Dimension):
+    """Company instances by pk and by index
+
+    The instances are shared between threads and must not be modified.
+    """
+
+    def load(self, pks=None):
+        by_id, by_index = dict(), dict()
+        companies = Company.objects.using(DEFAULT_DB_ALIAS)
+        if pks is not None:
+            companies = companies.filter(pk__in=pks)
+        for company in companies.order_by('id'):
+            by_id[company.pk] = company
+            by_index[company.index] = company
+        return CompanyTable(by_id, by_index)
+
+    def all(self):
+        """Return the companies in pk order"""
+        return list(self.table().by_id.values())
+
+    def get(self, pk):
+        """Return the company of a pk, or None"""
+        return self.table().by_id.get(pk)
+
+    def by_index(self, index):
+        """Return the company of an index, or None
+
+        An unknown index reloads the table, like table_of, in case another
+        process added the company, or is looked up alone when a miss
+        reloaded it too recently.
+        """
+        company = self.table().by_index.get(index)
+        if company is None and self.reload_for_miss():
+            company = self.table().by_index.get(index)
+        elif company is None:
+            company = Company.objects.using(DEFAULT_DB_ALIAS).filter(index=index).first()
+        return company
+
+    def ids(self):
+        """Return the {index: pk} of the companies"""
+        return {index: company.pk for index, company in self.table().by_index.items()}
+
+
+food_dimension = FoodDimension()
+tag_dimension = TagDimension()
+company_dimension = CompanyDimension()
+
+
+def invalidate_dimensions():
+    """Drop every dimension table, e.g. after a bulk load, and again once it is committed"""
+    now_and_on_commit(food_dimension.invalidate)
+    now_and_on_commit(tag_dimension.invalidate)
+    now_and_on_commit(company_dimension.invalidate)
+
+
+@receiver(post_save, sender=Food)
+@receiver(post_delete, sender=Food)
+def invalidate_food_dimension(sender, **kwargs):
+    """Reload the foods after they change, and again once they are committed"""
+    now_and_on_commit(food_dimension.invalidate)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tag_dimension(sender, **kwargs):
+    """Reload the tags after they change, and again once they are committed"""
+    now_and_on_commit(tag_dimension.invalidate)
+
+
+@receiver(post_save, sender=Company)
+@receiver(post_delete, sender=Company)
+def invalidate_company_dimension(sender, **kwargs):
+    """Reload the companies after they change, and again once they are committed"""
+    now_and_on_commit(company_dimension.invalidate)
@@ -0,0 +1,286 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Max
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from core.dataset import now_and_on_commit
+from core.models import People
+
+
+def intersect_sorted(a, b):
+    """Return the values present in both sorted sequences a and b"""
+    if len(a) > len(b):
+        a, b = b, a
+    common = []
+    if not a:
+        return common
+
+    if len(b) > 8 * len(a):
+        # Gallop through the longer side when the sizes are lopsided
+        lo = 0
+        for value in a:
+            lo = bisect_left(b, value, lo)
+            if lo == len(b):
+                break
+            if b[lo] == value:
+                common.append(value)
+        return common
+
+    i = j = 0
+    while i < len(a) and j < len(b):
+        if a[i] < b[j]:
+            i += 1
+        elif a[i] > b[j]:
+            j += 1
+        else:
+            common.append(a[i])
+            i += 1
+            j += 1
+    return common
+
+
+class PathSearchTimeout(Exception):
+    """Raised when a shortest path search exceeds its time budget"""
+
+
+class FriendGraph:
+    """Process-local friends graph in compressed sparse row form
+
+    offsets[index] and offsets[index + 1] delimit the sorted neighbour
+    People.index values of the person with that index. The graph is
+    built lazily, dropped when friends change in this process and
+    rebuilt after FRIEND_GRAPH_MAX_AGE seconds to pick up writes made by
+    other processes, such as load_paranuara.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._csr = None
+        self._reverse = (None, None)
+        self._suggestions = OrderedDict()
+        self._built_at = 0
+        self._generation = 0
+
+    @property
+    def max_age(self):
+        return getattr(settings, 'FRIEND_GRAPH_MAX_AGE', 300)
+
+    @property
+    def suggestions_cache_size(self):
+        return getattr(settings, 'FRIEND_SUGGESTIONS_CACHE_SIZE', 1024)
+
+    def invalidate(self):
+        """Drop the graph so the next access rebuilds it
+
+        Moving to a new generation also discards the result of a build
+        already running, which may have read the friends before the change.
+        """
+        self._generation += 1
+        self._csr = None
+        self._reverse = (None, None)
+        self._suggestions.clear()
+
+    def csr(self):
+        """Return the (offsets, neighbours) arrays, building them if needed
+
+        The reversed graph is derived in the same build, so no lookup pays
+        for it later, e.g. within the timeout of a path search.
+        """
+        csr = self._csr
+        if csr is None or time.monotonic() - self._built_at > self.max_age:
+            with self._lock:
+                csr = self._csr
+                if csr is None or time.monotonic() - self._built_at > self.max_age:
+                    generation = self._generation
+                    csr = self.build()
+                    reverse = self.transpose(*csr)
+                    if generation == self._generation:
+                        self._reverse = (csr, reverse)
+                        self._csr = csr
+                        self._built_at = time.monotonic()
+        return csr
+
+    def build(self):
+        """Load every friends edge in two queries and return the CSR arrays
+
+        The edges are read from the primary, as a lagging replica would
+        cache the graph from before the change that invalidated it.
+        """
+        max_index = People.objects.using(DEFAULT_DB_ALIAS).aggregate(max_index=Max('index'))['max_index']
+        size = 0 if max_index is None else max_index + 1
+        offsets = array('l', bytes(array('l').itemsize * (size + 1)))
+        neighbours = array('i')
+
+        edges = People.friends.through.objects.using(DEFAULT_DB_ALIAS).order_by(
+            'from_people__index', 'to_people__index'
+        ).values_list('from_people__index', 'to_people__index')
+        for from_index, to_index in edges.iterator():
+            if from_index < 0:
+                continue
+            offsets[from_index + 1] += 1
+            neighbours.append(to_index)
+
+        for position in range(1, size + 1):
+            offsets[position] += offsets[position - 1]
+        return offsets, neighbours
+
+    def reverse_csr(self):
+        """Return the CSR arrays of the reversed graph, built with the graph"""
+        csr = self.csr()
+        forward, reverse = self._reverse
+        if forward is not csr:
+            # The graph was built by a build overtaken by an invalidation, and not kept
+            reverse = self.transpose(*csr)
+        return reverse
+
+    @staticmethod
+    def transpose(offsets, neighbours):
+        """Return the CSR arrays with every edge reversed, rows still sorted"""
+        size = len(offsets) - 1
+        reverse_offsets = array('l', bytes(array('l').itemsize * (size + 1)))
+        for to_index in neighbours:
+            reverse_offsets[to_index + 1] += 1
+        for position in range(1, size + 1):
+            reverse_offsets[position] += reverse_offsets[position - 1]
+
+        positions = array('l', reverse_offsets)
+        reverse_neighbours = array('i', bytes(array('i').itemsize * len(neighbours)))
+        for from_index in range(size):
+            for to_index in neighbours[offsets[from_index]:offsets[from_index + 1]]:
+                reverse_neighbours[positions[to_index]] = from_index
+                positions[to_index] += 1
+        return reverse_offsets, reverse_neighbours
+
+    @staticmethod
+    def row(csr, index):
+        """Return the sorted neighbours of index in csr"""
+        offsets, neighbours = csr
+        if index < 0 or index + 1 >= len(offsets):
+            return neighbours[0:0]
+        return neighbours[offsets[index]:offsets[index + 1]]
+
+    def friends(self, index):
+        """Return the sorted friend indexes of the person with index"""
+        return self.row(self.csr(), index)
+
+    def befriended_by(self, index):
+        """Return the sorted indexes of the people who list index as a friend"""
+        return self.row(self.reverse_csr(), index)
+
+    def suggestions(self, index):
+        """Return the people index may know, with their mutual friends count
+
+        Candidates are the people who list at least one friend of index as
+        a friend, excluding index and its friends, ranked by the number of
+        friends they share with index and then by index. Rankings are kept
+        in a bounded LRU cache tied to the current graph, so any friends
+        change drops them.
+        """
+        csr = self.csr()
+        with self._lock:
+            cached = self._suggestions.get(index)
+            if cached is not None and cached[0] is csr:
+                self._suggestions.move_to_end(index)
+                return cached[1]
+
+        reverse = self.reverse_csr()
+        friends = self.row(csr, index)
+        counts = Counter()
+        for friend in friends:
+            counts.update(self.row(reverse, friend))
+        counts.pop(index, None)
+        for friend in friends:
+            counts.pop(friend, None)
+        ranking = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+
+        with self._lock:
+            self._suggestions[index] = (csr, ranking)
+            self._suggestions.move_to_end(index)
+            while len(self._suggestions) > self.suggestions_cache_size:
+                self._suggestions.popitem(last=False)
+        return ranking
+
+    def shortest_path(self, source, target, max_depth=6, timeout=None):
+        """Return the shortest friend chain from source to target
+
+        Runs a breadth first search from both ends, following friends
+        forward from source and backward from target and always growing
+        the smaller frontier. Returns None when the people are more than
+        max_depth friends apart, and raises PathSearchTimeout when the
+        search takes longer than timeout seconds.
+        """
+        if source == target:
+            return [source]
+        forward, backward = self.csr(), self.reverse_csr()
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        parents = ({source: None}, {target: None})
+        frontiers = ([source], [target])
+        for _ in range(max_depth):
+            side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+            csr = forward if side == 0 else backward
+            seen, other = parents[side], parents[1 - side]
+            frontier = []
+            for count, index in enumerate(frontiers[side]):
+                if deadline is not None and not count % 256 and time.monotonic() > deadline:
+                    raise PathSearchTimeout()
+                for neighbour in self.row(csr, index):
+                    if neighbour in seen:
+                        continue
+                    seen[neighbour] = index
+                    if neighbour in other:
+                        return self.join_path(parents, neighbour)
+                    frontier.append(neighbour)
+            if not frontier:
+                return None
+            frontiers = (frontier, frontiers[1]) if side == 0 else (frontiers[0], frontier)
+        return None
+
+    @staticmethod
+    def join_path(parents, meeting):
+        """Return the path through meeting from the forward and backward parents"""
+        path = []
+        index = meeting
+        while index is not None:
+            path.append(index)
+            index = parents[0][index]
+        path.reverse()
+        index = parents[1][meeting]
+        while index is not None:
+            path.append(index)
+            index = parents[1][index]
+        return path
+
+    def common_friends(self, *indexes):
+        """Return the sorted indexes of the friends all the people share
+
+        Friend lists are intersected smallest first so the result shrinks
+        as fast as possible, stopping as soon as it is empty.
+        """
+        if not indexes:
+            return []
+        friend_lists = sorted((self.friends(index) for index in indexes), key=len)
+        common = list(friend_lists[0])
+        for friends in friend_lists[1:]:
+            if not common:
+                break
+            common = intersect_sorted(common, friends)
+        return common
+
+
+friend_graph = FriendGraph()
+
+
+@receiver(m2m_changed, sender=People.friends.through)
+@receiver(post_save, sender=People)
+@receiver(post_delete, sender=People)
+def invalidate_friend_graph(sender, **kwargs):
+    """Rebuild the friend graph after friends or people change, and again once they are committed"""
+    now_and_on_commit(friend_graph.invalidate)
@@ -0,0 +1,573 @@
+import io
+import json
+import logging
+import tempfile
+from array import array
+from contextlib import contextmanager
+from datetime import date, datetime
+
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete
+
+from core.dataset import bump_dataset_version, dataset_version, now_and_on_commit
+from core.dimensions import company_dimension, food_dimension, invalidate_dimensions, tag_dimension
+from core.graph import friend_graph, invalidate_friend_graph
+from core.models import Company, Food, Tag, People, food_category
+from core.normalise import normalised_batches
+from core.search import company_search
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 2000
+READ_CHUNK_SIZE = 1 << 16
+NUMBER_CHARS = '0123456789+-.eE'
+
+
+def read_json(path):
+    """Return the records stored in a people.json or companies.json file"""
+    with open(path, encoding='utf-8') as jfile:
+        return json.load(jfile)
+
+
+def iter_json_array(jfile, chunk_size=READ_CHUNK_SIZE):
+    """Yield the items of a top level JSON array one at a time
+
+    Only the item being decoded is held in memory, so arbitrarily large
+    exports can be read with a flat memory profile. Items must be
+    separated by exactly one comma and only whitespace may follow the
+    array, anything else raises ValueError.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+    # What comes next: the opening bracket, the first item or the closing
+    # bracket, an item after a comma, a comma or the closing bracket, or
+    # nothing but whitespace
+    expected = 'array'
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+            pos += 1
+
+        if pos < len(buffer):
+            char = buffer[pos]
+            if expected == 'end':
+                raise ValueError('Unexpected data after the JSON array')
+            if expected == 'array':
+                if char != '[':
+                    raise ValueError('Expected a JSON array')
+                expected = 'first'
+                pos += 1
+                continue
+            if expected == 'separator':
+                if char not in ',]':
+                    raise ValueError('Expected , or ] after an array item')
+                expected = 'item' if char == ',' else 'end'
+                pos += 1
+                continue
+            if char == ']' and expected == 'first':
+                expected = 'end'
+                pos += 1
+                continue
+            if char in ',]':
+                raise ValueError('Expected an array item')
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                # A number running to the end of the buffer may go on in the next chunk
+                if eof or char not in NUMBER_CHARS or (end < len(buffer) and buffer[end] not in NUMBER_CHARS):
+                    yield item
+                    pos = end
+                    expected = 'separator'
+                    continue
+        elif eof:
+            if expected == 'end':
+                return
+            raise ValueError('Unterminated JSON array')
+
+        chunk = jfile.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+
+def iter_ndjson(jfile):
+    """Yield the JSON documents of a newline delimited JSON file one at a time"""
+    for line in jfile:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_people(path):
+    """Yield the raw people records of a people.json or NDJSON export one at a time"""
+    with open(path, encoding='utf-8') as pfile:
+        first = pfile.read(1)
+        while first.isspace():
+            first = pfile.read(1)
+        pfile.seek(0)
+        if first == '{':
+            yield from iter_ndjson(pfile)
+        else:
+            yield from iter_json_array(pfile)
+
+
+def chunked(iterable, size):
+    """Yield lists of at most size items from iterable"""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class NameMap:
+    """Name to primary key map for the Food and Tag dimension tables, seeded from their Dimension"""
+
+    def __init__(self, model, dimension):
+        self.model = model
+        self.ids = dict(dimension.ids())
+
+    def resolve(self, names):
+        """Create any unknown names in one statement and return the map"""
+        missing = set(names) - set(self.ids)
+        if missing:
+            self.model.objects.bulk_create(
+                [self.build(name) for name in missing],
+                ignore_conflicts=True
+            )
+            self.ids.update(
+                self.model.objects.filter(name__in=missing).values_list('name', 'id')
+            )
+        return self.ids
+
+    def build(self, name):
+        """Return an unsaved instance for a new name"""
+        return self.model(name=name)
+
+
+class FoodMap(NameMap):
+    """NameMap for foods, categorising the new ones as bulk_create skips Food.save"""
+
+    def __init__(self):
+        super().__init__(Food, food_dimension)
+
+    def build(self, name):
+        """Return an unsaved food with its category"""
+        return Food(name=name, category=food_category(name))
+
+
+class CompanyMap:
+    """Company index to primary key map, creating placeholder companies"""
+
+    def __init__(self):
+        self.ids = company_dimension.ids()
+
+    def load(self, companies):
+        """Create the companies of a companies.json file missing from the table"""
+        missing = [
+            Company(index=int(company['index']), name=company['company'])
+            for company in companies if int(company['index']) not in self.ids
+        ]
+        Company.objects.bulk_create(missing, ignore_conflicts=True)
+        company_dimension.invalidate()
+        self.ids = company_dimension.ids()
+        return len(missing)
+
+    def resolve(self, indexes):
+        """Create any unknown companies in one statement and return the map"""
+        missing = set(indexes) - set(self.ids)
+        if missing:
+            Company.objects.bulk_create(
+                [Company(index=index) for index in missing],
+                ignore_conflicts=True
+            )
+            self.ids.update(
+                Company.objects.filter(index__in=missing).values_list('index', 'id')
+            )
+        return self.ids
+
+
+class EdgeSpool:
+    """Append-only (people id, friend index) pairs spooled to a temporary file"""
+
+    def __init__(self):
+        self.file = tempfile.TemporaryFile()
+        self.size = 0
+
+    def extend(self, pairs):
+        """Append an iterable of (people id, friend index) pairs"""
+        values = array('q')
+        for pair in pairs:
+            values.extend(pair)
+        values.tofile(self.file)
+        self.size += len(values) // 2
+
+    def chunks(self, size):
+        """Yield lists of at most size pairs in insertion order"""
+        self.file.seek(0)
+        remaining = self.size
+        while remaining:
+            count = min(size, remaining)
+            values = array('q')
+            values.fromfile(self.file, count * 2)
+            yield list(zip(values[::2], values[1::2]))
+            remaining -= count
+
+    def close(self):
+        self.file.close()
+
+
+class BulkLoader:
+    """Load people.json records with a fixed number of queries per batch"""
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, workers=1):
+        self.batch_size = batch_size
+        self.workers = workers
+        # Reload the dimension tables, the ids written as foreign keys must not be stale
+        invalidate_dimensions()
+        self.foods = FoodMap()
+        self.tags = NameMap(Tag, tag_dimension)
+        self.companies = CompanyMap()
+        self.friend_edges = EdgeSpool()
+        self.people_count = 0
+        self.edge_count = 0
+
+    def load(self, records):
+        """Load an iterable of raw records, friends last, and return the row count"""
+        self.load_people(records)
+        self.load_friends()
+        return self.people_count + self.edge_count
+
+    def load_people(self, records):
+        """Load the people of an iterable of raw records with their foods and tags, spooling their friends"""
+        for rows in normalised_batches(chunked(records, self.batch_size), self.workers):
+            self.load_batch(self.resolve_companies(rows))
+
+    def insert(self, model, objs):
+        """Insert objs, skipping rows that already exist"""
+        model.objects.bulk_create(objs, ignore_conflicts=True)
+
+    def resolve_companies(self, rows):
+        """Replace the company index of normalised rows by its primary key"""
+        company_ids = self.companies.resolve(row[0]['company'] for row in rows)
+        for details, _, _, _ in rows:
+            details['company_id'] = company_ids[details.pop('company')]
+        return rows
+
+    def load_batch(self, rows):
+        """Insert one batch of normalised people with their foods and tags"""
+        self.insert(People, [People(**row[0]) for row in rows])
+        self.people_count += len(rows)
+        self.write_links(rows)
+
+    def write_links(self, rows):
+        """Insert the foods and tags through rows of rows, matched by pid, and spool their friends"""
+        food_ids = self.foods.resolve(name for row in rows for name in row[1])
+        tag_ids = self.tags.resolve(name for row in rows for name in row[2])
+        # By pid, as a reload skips the insert of a known pid even when its index changed
+        people_ids = dict(
+            People.objects.filter(
+                pid__in=[row[0]['pid'] for row in rows]
+            ).values_list('pid', 'id')
+        )
+        missing = [row[0]['pid'] for row in rows if row[0]['pid'] not in people_ids]
+        if missing:
+            raise CommandError(
+                'People {} could not be loaded as their index belongs to another pid, '
+                'reload with --delta to move indexes between pids.'.format(', '.join(missing[:10]))
+            )
+
+        FoodLink = People.foods.through
+        TagLink = People.tags.through
+        food_links = []
+        tag_links = []
+        friend_edges = []
+        for details, foods, tags, friends in rows:
+            pk = people_ids[details['pid']]
+            food_links.extend(FoodLink(people_id=pk, food_id=food_ids[name]) for name in dict.fromkeys(foods))
+            tag_links.extend(TagLink(people_id=pk, tag_id=tag_ids[name]) for name in dict.fromkeys(tags))
+            friend_edges.extend((pk, index) for index in friends)
+        self.friend_edges.extend(friend_edges)
+
+        self.insert(FoodLink, food_links)
+        self.insert(TagLink, tag_links)
+        self.edge_count += len(food_links) + len(tag_links)
+        return people_ids
+
+    def load_friends(self):
+        """Insert the spooled friends through rows once every person exists"""
+        FriendLink = People.friends.through
+        for edges in self.friend_edges.chunks(self.batch_size):
+            people_ids = dict(
+                People.objects.filter(
+                    index__in={index for _, index in edges}
+                ).values_list('index', 'id')
+            )
+            links = []
+            for from_id, index in edges:
+                to_id = people_ids.get(index)
+                if to_id is None:
+                    logger.info("People with index of {} doesn't exist.".format(index))
+                    continue
+                links.append(FriendLink(from_people_id=from_id, to_people_id=to_id))
+
+            self.insert(FriendLink, links)
+            self.edge_count += len(links)
+        self.friend_edges.close()
+        now_and_on_commit(friend_graph.invalidate)
+        now_and_on_commit(company_search.invalidate)
+        invalidate_dimensions()
+        now_and_on_commit(dataset_version.bump)
+
+
+@contextmanager
+def people_delete_receivers_disconnected():
+    """Disconnect the post_delete receivers of People, for a bulk delete followed by one invalidation"""
+    receivers = (bump_dataset_version, invalidate_friend_graph)
+    for func in receivers:
+        post_delete.disconnect(func, sender=People)
+    try:
+        yield
+    finally:
+        for func in receivers:
+            post_delete.connect(func, sender=People)
+
+
+class DeltaLoader(BulkLoader):
+    """Synchronise the People table with a new export keyed by pid
+
+    Records whose fingerprint matches the stored one are skipped, new
+    pids are inserted, changed ones are updated with their foods, tags
+    and friends rewritten, and people missing from the export are
+    deleted before the friends are linked. An index taken over by
+    another pid is released from its previous holder first, and the
+    friends of unchanged people naming an index whose holder changed
+    are linked again.
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, workers=1):
+        super().__init__(batch_size=batch_size, workers=workers)
+        self.seen_ids = set()
+        self.new_indexes = set()
+        self.reindexed_ids = []
+        self.unchanged_edges = EdgeSpool()
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.deleted = 0
+
+    def load_batch(self, rows):
+        existing = {
+            pid: (pk, index, fingerprint)
+            for pid, pk, index, fingerprint in People.objects.filter(
+                pid__in=[row[0]['pid'] for row in rows]
+            ).values_list('pid', 'id', 'index', 'fingerprint')
+        }
+
+        new_rows = []
+        changed = []
+        changed_rows = []
+        unchanged_edges = []
+        for row in rows:
+            details = row[0]
+            if details['pid'] not in existing:
+                new_rows.append(row)
+                self.new_indexes.add(details['index'])
+                continue
+            pk, index, fingerprint = existing[details['pid']]
+            self.seen_ids.add(pk)
+            if fingerprint == details['fingerprint']:
+                unchanged_edges.extend((pk, friend) for friend in row[3])
+                continue
+            changed.append(People(id=pk, **details))
+            changed_rows.append(row)
+            if index != details['index']:
+                self.reindexed_ids.append(pk)
+                self.new_indexes.add(details['index'])
+        self.unchanged_edges.extend(unchanged_edges)
+
+        self.release_indexes(new_rows + changed_rows)
+        self.insert(People, [People(**row[0]) for row in new_rows])
+        if changed:
+            fields = [field.name for field in People._meta.concrete_fields if not field.primary_key]
+            People.objects.bulk_update(changed, fields)
+            changed_ids = [person.id for person in changed]
+            People.foods.through.objects.filter(people_id__in=changed_ids).delete()
+            People.tags.through.objects.filter(people_id__in=changed_ids).delete()
+            People.friends.through.objects.filter(from_people_id__in=changed_ids).delete()
+
+        people_ids = self.write_links(new_rows + changed_rows)
+        self.seen_ids.update(people_ids.values())
+
+        self.created += len(new_rows)
+        self.updated += len(changed_rows)
+        self.unchanged += len(rows) - len(new_rows) - len(changed_rows)
+        self.people_count += len(new_rows) + len(changed_rows)
+
+    def release_indexes(self, rows):
+        """Move the people holding an index rows give another pid to the negative index -id
+
+        A released person is given its new index by a later batch, or is
+        deleted as missing from the export.
+        """
+        if not rows:
+            return
+        claims = {row[0]['index']: row[0]['pid'] for row in rows}
+        released = [
+            pk for pk, index, pid in People.objects.filter(index__in=claims).values_list('id', 'index', 'pid')
+            if claims[index] != pid
+        ]
+        if released:
+            People.objects.filter(id__in=released).update(index=-F('id'))
+
+    def load_friends(self):
+        """Delete the missing people and relink the friends of unchanged people before linking the friends"""
+        self.delete_missing()
+        self.relink_unchanged()
+        super().load_friends()
+
+    def delete_missing(self):
+        """Delete the people that were not part of the export, in bulk
+
+        Their post_delete receivers are disconnected, load_friends
+        invalidates the friend graph and bumps the dataset version once.
+        """
+        missing = [
+            pk for pk in People.objects.values_list('id', flat=True).iterator()
+            if pk not in self.seen_ids
+        ]
+        with people_delete_receivers_disconnected():
+            for chunk in chunked(missing, self.batch_size):
+                People.objects.filter(id__in=chunk).delete()
+        self.deleted = len(missing)
+
+    def relink_unchanged(self):
+        """Spool the friends of unchanged people whose index changed holder, dropping their links to a previous one"""
+        FriendLink = People.friends.through
+        for chunk in chunked(self.reindexed_ids, self.batch_size):
+            FriendLink.objects.filter(to_people_id__in=chunk).delete()
+        if self.new_indexes:
+            for edges in self.unchanged_edges.chunks(self.batch_size):
+                self.friend_edges.extend(edge for edge in edges if edge[1] in self.new_indexes)
+        self.unchanged_edges.close()
+
+
+def copy_text_value(value):
+    """Render one value in the PostgreSQL COPY text format"""
+    if value is None:
+        return '\\N'
+    if value is True:
+        return 't'
+    if value is False:
+        return 'f'
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('\t', '\\t')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r')
+    )
+
+
+class CopyLoader(BulkLoader):
+    """PostgreSQL loader streaming every batch through COPY FROM STDIN
+
+    Rows are copied into an unindexed temporary staging table and moved
+    with INSERT ... SELECT ... ON CONFLICT DO NOTHING, which keeps reloads
+    idempotent. Secondary indexes of tables that start out empty are
+    dropped for the load and rebuilt once at the end; unique indexes stay
+    in place for the conflict checks, and Django creates foreign keys as
+    DEFERRABLE INITIALLY DEFERRED so they are only checked at commit.
+    A load runs in a transaction, as the staging tables are dropped on
+    commit and a failed load must bring the dropped indexes back.
+    """
+
+    def load(self, records):
+        with transaction.atomic():
+            deferred = []
+            for model in (People, People.foods.through, People.tags.through, People.friends.through):
+                if not model.objects.exists():
+                    deferred.extend(self.drop_indexes(model._meta.db_table))
+
+            rows = super().load(records)
+
+            with connection.cursor() as cursor:
+                for sql in deferred:
+                    cursor.execute(sql)
+        return rows
+
+    def drop_indexes(self, table):
+        """Drop the non-unique indexes of table and return their definitions"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT i.relname, pg_get_indexdef(i.oid)
+                FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid
+                WHERE x.indrelid = %s::regclass
+                    AND NOT x.indisprimary AND NOT x.indisunique
+                    AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = x.indexrelid)
+                """,
+                [table]
+            )
+            indexes = cursor.fetchall()
+            for name, _ in indexes:
+                cursor.execute('DROP INDEX {}'.format(connection.ops.quote_name(name)))
+        return [definition for _, definition in indexes]
+
+    def insert(self, model, objs):
+        if not objs:
+            return
+        quote = connection.ops.quote_name
+        fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+        table = quote(model._meta.db_table)
+        staging = quote('staging_{}'.format(model._meta.db_table))
+        columns = ', '.join(quote(field.column) for field in fields)
+
+        buffer = io.StringIO()
+        for obj in objs:
+            buffer.write('\t'.join(
+                copy_text_value(field.get_db_prep_save(getattr(obj, field.attname), connection))
+                for field in fields
+            ))
+            buffer.write('\n')
+        buffer.seek(0)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMPORARY TABLE IF NOT EXISTS {} ON COMMIT DROP '
+                'AS SELECT {} FROM {} WITH NO DATA'.format(staging, columns, table)
+            )
+            cursor.execute('TRUNCATE {}'.format(staging))
+            cursor.copy_expert('COPY {} ({}) FROM STDIN'.format(staging, columns), buffer)
+            cursor.execute(
+                'INSERT INTO {0} ({1}) SELECT {1} FROM {2} ON CONFLICT DO NOTHING'.format(
+                    table, columns, staging
+                )
+            )
+
+
+class CopyDeltaLoader(DeltaLoader, CopyLoader):
+    """DeltaLoader inserting the new rows through COPY"""
+
+
+def get_loader(strategy='auto', batch_size=DEFAULT_BATCH_SIZE, workers=1, delta=False):
+    """Return the loader, or delta loader, for strategy, picking COPY on PostgreSQL for auto"""
+    if strategy == 'auto':
+        strategy = 'copy' if connection.vendor == 'postgresql' else 'insert'
+    if strategy == 'copy':
+        loader = CopyDeltaLoader if delta else CopyLoader
+    else:
+        loader = DeltaLoader if delta else BulkLoader
+    return loader(batch_size=batch_size, workers=workers)
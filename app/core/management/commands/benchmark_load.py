@@ -0,0 +1,91 @@
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core import ingest, synthetic
+
+
+STRATEGIES = ('copy', 'insert')
+
+
+class Command(BaseCommand):
+    """Django management command to compare the load strategies on a synthetic dataset"""
+    help = 'Load the same synthetic dataset with each strategy into a throwaway database and compare the timings'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'strategies', nargs='*',
+            help='Strategies to compare among copy and insert, both on PostgreSQL and insert elsewhere by default'
+        )
+        parser.add_argument('--people', type=int, default=20000, help='Number of people to generate')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic dataset')
+        parser.add_argument('--repeat', type=int, default=1, help='Number of loads per strategy')
+        parser.add_argument(
+            '--batch-size', type=int, default=ingest.DEFAULT_BATCH_SIZE,
+            help='Number of people inserted per batch'
+        )
+
+    def handle(self, *args, **options):
+        strategies = options['strategies'] or (STRATEGIES if connection.vendor == 'postgresql' else ('insert',))
+        unknown = set(strategies) - set(STRATEGIES)
+        if unknown:
+            raise CommandError('Unknown strategies: {}.'.format(', '.join(sorted(unknown))))
+        if 'copy' in strategies and connection.vendor != 'postgresql':
+            raise CommandError('The copy strategy needs PostgreSQL.')
+        if options['people'] < 1 or options['repeat'] < 1:
+            raise CommandError('People and repeat must be positive.')
+        spec = synthetic.DatasetSpec(
+            people=options['people'], companies=max(options['people'] // 10, 1), seed=options['seed'],
+            friend_degree='powerlaw', mean_friends=10, max_friends=1000, company_skew=1.0
+        )
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            companies_path = os.path.join(tmpdir, 'companies.json')
+            people_path = os.path.join(tmpdir, 'people.json')
+            synthetic.write_companies(companies_path, spec)
+            synthetic.write_people(people_path, spec)
+
+            # Every strategy starts from the same empty tables, as on a first load
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                timings = {
+                    strategy: [
+                        self.load(strategy, companies_path, people_path, options['batch_size'])
+                        for _ in range(options['repeat'])
+                    ]
+                    for strategy in strategies
+                }
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        for strategy, loads in timings.items():
+            elapsed, rows = min(loads)
+            self.stdout.write('{:<6} {:>8.2f}s {:>10.0f} rows/s (best of {})'.format(
+                strategy, elapsed, rows / elapsed if elapsed else 0, len(loads)
+            ))
+        if len(timings) == len(STRATEGIES):
+            copy, insert = min(timings['copy'])[0], min(timings['insert'])[0]
+            self.stdout.write(self.style.SUCCESS(
+                'copy loads {} people {:.1f}x as fast as insert'.format(spec.people, insert / copy if copy else 0)
+            ))
+
+    def load(self, strategy, companies_path, people_path, batch_size):
+        """Load the files with strategy in a transaction rolled back afterwards and return the time and row count
+
+        The time includes the constraint checks deferred to the end of the
+        transaction, not the commit itself.
+        """
+        with transaction.atomic():
+            started = time.perf_counter()
+            loader = ingest.get_loader(strategy, batch_size=batch_size)
+            loader.companies.load(ingest.read_json(companies_path))
+            rows = loader.load(ingest.read_people(people_path))
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+            elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+        return elapsed, rows
@@ -0,0 +1,66 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import synthetic
+
+
+class Command(BaseCommand):
+    """Django management command to generate a synthetic Paranuara dataset"""
+    help = 'Write a deterministic people.json and companies.json of any size for load_paranuara'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--people', type=int, default=100000, help='Number of people to generate')
+        parser.add_argument(
+            '--companies', type=int,
+            help='Number of companies, one per 10 people by default like resources/'
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Seed, the same seed writes the same files')
+        parser.add_argument(
+            '--friend-degree', choices=synthetic.FRIEND_DEGREES, default='powerlaw',
+            help='Distribution of the number of friends per people'
+        )
+        parser.add_argument('--mean-friends', type=int, default=10, help='Mean number of friends per people')
+        parser.add_argument('--max-friends', type=int, default=1000, help='Maximum number of friends per people')
+        parser.add_argument(
+            '--company-skew', type=float, default=1.0,
+            help='Zipf exponent of the company sizes, 0 gives every company the same size'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Number of processes generating people, 0 uses every core'
+        )
+        parser.add_argument('--output', default='.', help='Directory the files are written to')
+        parser.add_argument(
+            '--ndjson', action='store_true',
+            help='Write people.ndjson, one record per line, instead of people.json'
+        )
+
+    def handle(self, *args, **options):
+        spec = synthetic.DatasetSpec(
+            people=options['people'],
+            companies=options['companies'] or max(options['people'] // 10, 1),
+            seed=options['seed'],
+            friend_degree=options['friend_degree'],
+            mean_friends=options['mean_friends'],
+            max_friends=options['max_friends'],
+            company_skew=options['company_skew'],
+        )
+        if spec.people < 0 or spec.companies < 1 or spec.mean_friends < 0 or spec.max_friends < 0:
+            raise CommandError('People, friends and companies must be positive.')
+        workers = options['workers'] or os.cpu_count()
+        os.makedirs(options['output'], exist_ok=True)
+        started = time.perf_counter()
+
+        companies_path = os.path.join(options['output'], 'companies.json')
+        synthetic.write_companies(companies_path, spec)
+        people_path = os.path.join(options['output'], 'people.ndjson' if options['ndjson'] else 'people.json')
+        count = synthetic.write_people(people_path, spec, workers=workers, ndjson=options['ndjson'])
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            'Generated {} people and {} companies to {} with {} workers in {:.2f}s ({:.0f} records/s)'.format(
+                count, spec.companies, people_path, workers, elapsed, count / elapsed if elapsed else 0
+            )
+        ))
@@ -0,0 +1,93 @@
+import os
+import resource
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core import ingest
+from core.normalise import normalised_batches
+
+
+RESOURCES_DIR = os.path.join(settings.BASE_DIR, 'resources')
+
+
+class Command(BaseCommand):
+    """Django management command to bulk load the Paranuara dataset"""
+    help = 'Load companies.json and people.json with set-based batched inserts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--people', default=os.path.join(RESOURCES_DIR, 'people.json'),
+            help='Path of the people.json file'
+        )
+        parser.add_argument(
+            '--companies', default=os.path.join(RESOURCES_DIR, 'companies.json'),
+            help='Path of the companies.json file, skipped when empty'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=ingest.DEFAULT_BATCH_SIZE,
+            help='Number of people inserted per batch'
+        )
+        parser.add_argument(
+            '--strategy', choices=('auto', 'copy', 'insert'), default='auto',
+            help='copy streams rows with PostgreSQL COPY, insert uses batched INSERTs, '
+                 'auto picks copy on PostgreSQL'
+        )
+        parser.add_argument(
+            '--delta', action='store_true',
+            help='Synchronise with the export: insert new, update changed and delete missing people'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Number of processes normalising records, 0 uses every core'
+        )
+        parser.add_argument(
+            '--parse-only', action='store_true',
+            help='Only read and normalise the people file and report the parse throughput'
+        )
+
+    def handle(self, *args, **options):
+        workers = options['workers'] or os.cpu_count()
+        if options['parse_only']:
+            return self.parse_only(options['people'], options['batch_size'], workers)
+
+        started = time.perf_counter()
+
+        with transaction.atomic():
+            loader = ingest.get_loader(
+                options['strategy'], batch_size=options['batch_size'], workers=workers, delta=options['delta']
+            )
+            if options['companies']:
+                created = loader.companies.load(ingest.read_json(options['companies']))
+                self.stdout.write('Loaded {} companies'.format(created))
+            rows = loader.load(ingest.read_people(options['people']))
+            if options['delta']:
+                self.stdout.write('Created {}, updated {}, unchanged {} and deleted {} people'.format(
+                    loader.created, loader.updated, loader.unchanged, loader.deleted
+                ))
+
+        elapsed = time.perf_counter() - started
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self.stdout.write(self.style.SUCCESS(
+            'Loaded {} people and {} links with {} in {:.2f}s ({:.0f} rows/s, peak RSS {:.1f} MB)'.format(
+                loader.people_count, loader.edge_count, type(loader).__name__, elapsed,
+                rows / elapsed if elapsed else 0, peak_rss / 1024
+            )
+        ))
+
+    def parse_only(self, path, batch_size, workers):
+        """Normalise every record of path without touching the database"""
+        started = time.perf_counter()
+        records = 0
+        batches = ingest.chunked(ingest.read_people(path), batch_size)
+        for rows in normalised_batches(batches, workers):
+            records += len(rows)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            'Normalised {} records with {} workers in {:.2f}s ({:.0f} records/s)'.format(
+                records, workers, elapsed, records / elapsed if elapsed else 0
+            )
+        ))
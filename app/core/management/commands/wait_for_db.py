@@ -2,20 +2,41 @@ import time
 
 from django.db import connections
 from django.db.utils import OperationalError
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
 
 class Command(BaseCommand):
     """Django management command to wait for db ready"""
+    help = 'Connect to the database, retrying with an exponential backoff until it accepts connections'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default='default',
+            help='Alias of the database to wait for'
+        )
+        parser.add_argument(
+            '--timeout', type=float, default=60,
+            help='Seconds to wait before giving up'
+        )
+        parser.add_argument(
+            '--max-delay', type=float, default=5,
+            help='Maximum seconds between 2 attempts, the delay doubling from 0.1 second'
+        )
 
     def handle(self, *args, **options):
         self.stdout.write('Waiting for database...')
-        db_conn = None
-        while not db_conn:
+        connection = connections[options['database']]
+        deadline = time.monotonic() + options['timeout']
+        delay = 0.1
+        while True:
             try:
-                db_conn = connections['default']
-            except OperationalError:
-                self.stdout.write('Database unavailable, waiting 1 second...')
-                time.sleep(1)
+                connection.ensure_connection()
+                break
+            except OperationalError as error:
+                if time.monotonic() + delay > deadline:
+                    raise CommandError('Database unavailable after {} seconds: {}'.format(options['timeout'], error))
+                self.stdout.write('Database unavailable, waiting {:g} seconds...'.format(delay))
+                time.sleep(delay)
+                delay = min(delay * 2, options['max_delay'])
 
         self.stdout.write(self.style.SUCCESS('Database available'))
@@ -0,0 +1,28 @@
+from django.conf import settings
+
+from core.routers import replica_reads
+
+
+PIN_COOKIE = 'read_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaReadMiddleware:
+    """Read safe requests from the replicas, except after a write
+
+    Reads following a write in the same request go to the primary, and
+    the response carries a cookie sending the reads of the client to the
+    primary for REPLICA_PIN_SECONDS, while the replicas catch up.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        primary = request.method not in SAFE_METHODS or PIN_COOKIE in request.COOKIES
+        with replica_reads(primary=primary) as state:
+            response = self.get_response(request)
+
+        if state['wrote']:
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True)
+        return response
@@ -9,6 +9,8 @@ from dateutil.parser import parse
 
 logger = logging.getLogger(__name__)
 
+NUMBER_CHARS = '0123456789+-.eE'
+
 
 def people_details_preprocessing(**people_details):
     people_dict = dict()
@@ -20,8 +22,8 @@ def people_details_preprocessing(**people_details):
         logger.info(people_details)
 
     people_dict['guid'] = people_details.get('guid')
-    has_died_str = people_details.get('has_died')
-    people_dict['has_died'] = True if "True"==has_died_str else False
+    has_died = people_details.get('has_died')
+    people_dict['has_died'] = has_died is True or "True" == has_died
 
     try:
         people_dict['balance'] = float(
@@ -82,6 +84,72 @@ def get_people_friends_list(**people_details):
     return friends_list
 
 
+def iter_json_array(jfile, chunk_size=1 << 16):
+    """Yield the items of a top level JSON array one at a time
+
+    A copy of core.ingest.iter_json_array, as migrations must not import
+    app code that may change after they are applied. Items must be
+    separated by exactly one comma and only whitespace may follow the
+    array, anything else raises ValueError.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+    # What comes next: the opening bracket, the first item or the closing
+    # bracket, an item after a comma, a comma or the closing bracket, or
+    # nothing but whitespace
+    expected = 'array'
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+            pos += 1
+
+        if pos < len(buffer):
+            char = buffer[pos]
+            if expected == 'end':
+                raise ValueError('Unexpected data after the JSON array')
+            if expected == 'array':
+                if char != '[':
+                    raise ValueError('Expected a JSON array')
+                expected = 'first'
+                pos += 1
+                continue
+            if expected == 'separator':
+                if char not in ',]':
+                    raise ValueError('Expected , or ] after an array item')
+                expected = 'item' if char == ',' else 'end'
+                pos += 1
+                continue
+            if char == ']' and expected == 'first':
+                expected = 'end'
+                pos += 1
+                continue
+            if char in ',]':
+                raise ValueError('Expected an array item')
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                # A number running to the end of the buffer may go on in the next chunk
+                if eof or char not in NUMBER_CHARS or (end < len(buffer) and buffer[end] not in NUMBER_CHARS):
+                    yield item
+                    pos = end
+                    expected = 'separator'
+                    continue
+        elif eof:
+            if expected == 'end':
+                return
+            raise ValueError('Unterminated JSON array')
+
+        chunk = jfile.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+
 def load_food_tag_people_data(apps, schema_editor):
     Food = apps.get_model("core", "Food")
     Tag = apps.get_model("core", "Tag")
@@ -94,11 +162,7 @@ def load_food_tag_people_data(apps, schema_editor):
     friends = dict()
 
     with open(fullpath, encoding='utf-8') as pfile:
-        peoples_str = pfile.read()
-        peoples_str = peoples_str.replace("true", '"True"').replace("false", '"False"')
-        peoples = json.loads(peoples_str)
-
-        for people in peoples:
+        for people in iter_json_array(pfile):
             foods_objs = []
             tags_objs = []
 
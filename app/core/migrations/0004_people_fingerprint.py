@@ -0,0 +1,18 @@
+# Generated by Django 3.0.14 on 2026-10-18 15:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_load_people_data'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='people',
+            name='fingerprint',
+            field=models.CharField(blank=True, default='', max_length=40),
+        ),
+    ]
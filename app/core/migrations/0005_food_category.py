@@ -0,0 +1,42 @@
+# Generated by Django 3.0.14 on 2026-10-18 16:03
+
+from django.db import migrations, models
+
+
+# core.models.COMMON_FRUIT_LIST when this migration was written
+FRUITS = frozenset([
+    'apple', 'watermelon', 'orange', 'pear', 'cherry', 'strawberry', 'nectarine',
+    'grape', 'mango', 'blueberry', 'pomegranate', 'carambola', 'starfruit', 'plum',
+    'banana', 'raspberry', 'mandarin', 'jackfruit', 'papaya', 'kiwi', 'pineapple',
+    'lime', 'lemon', 'apricot', 'grapefruit', 'melon', 'coconut', 'avocado', 'peach'
+])
+
+
+def food_category(name):
+    """Return the category of a food name"""
+    if name.lower() in FRUITS:
+        return 'fruit'
+    return 'vegetable'
+
+
+def categorise_foods(apps, schema_editor):
+    """Store the category of the foods already loaded"""
+    Food = apps.get_model("core", "Food")
+    fruits = [food.id for food in Food.objects.all() if food_category(food.name) == 'fruit']
+    Food.objects.filter(id__in=fruits).update(category='fruit')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_people_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='food',
+            name='category',
+            field=models.CharField(choices=[('fruit', 'Fruit'), ('vegetable', 'Vegetable')], default='vegetable', max_length=10),
+        ),
+        migrations.RunPython(categorise_foods, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.0.14 on 2026-10-18 16:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_company_name_trgm'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='people',
+            index=models.Index(fields=['company', 'index'], name='core_people_company_index_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='people',
+            index=models.Index(
+                condition=models.Q(has_died=False), fields=['eye_color'], name='core_people_alive_eye_idx'
+            ),
+        ),
+        migrations.AlterField(
+            model_name='people',
+            name='company',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='core.Company'),
+        ),
+    ]
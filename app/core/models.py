@@ -9,6 +9,15 @@ COMMON_FRUIT_LIST = [
     'banana', 'raspberry', 'mandarin', 'jackfruit', 'papaya', 'kiwi', 'pineapple',
     'lime', 'lemon', 'apricot', 'grapefruit', 'melon', 'coconut', 'avocado', 'peach'
 ]
+COMMON_FRUITS = frozenset(COMMON_FRUIT_LIST)
+FOOD_CATEGORIES = (('fruit', 'Fruit'), ('vegetable', 'Vegetable'))
+
+
+def food_category(name):
+    """Return the category of a food name"""
+    if name.lower() in COMMON_FRUITS:
+        return 'fruit'
+    return 'vegetable'
 
 
 class UserManager(BaseUserManager):
@@ -56,22 +65,21 @@ class Company(models.Model):
 
     @property
     def employees(self):
-        all_employees = People.objects.filter(company__index=self.index)
+        all_employees = list(People.objects.filter(company_id=self.pk).order_by('index').values('index', 'name'))
         if not all_employees:
             return "No employees in this company."
-        return [{"index": el.index, "name": el.name} for el in all_employees]
+        return all_employees
 
 
 class Food(models.Model):
     """Model class for favorite foods"""
     name = models.CharField(max_length=255, unique=True)
+    category = models.CharField(max_length=10, choices=FOOD_CATEGORIES, default='vegetable')
 
-    @property
-    def category(self):
-        if self.name.lower() in COMMON_FRUIT_LIST:
-            return 'fruit'
-        else:
-            return 'vegetable'
+    def save(self, *args, **kwargs):
+        """Categorise the food by its name before saving it"""
+        self.category = food_category(self.name)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         """Return string representation of object"""
@@ -104,7 +112,7 @@ class People(models.Model):
         choices=(('male', 'Male'), ('female', 'Female')),
         default='female'
     )
-    company = models.ForeignKey("Company", on_delete=models.CASCADE)
+    company = models.ForeignKey("Company", on_delete=models.CASCADE, db_index=False)
     email = models.EmailField(max_length=254, null=True, blank=True)
     phone = models.CharField(max_length=50, null=True, blank=True)
     street_name = models.CharField(max_length=255, null=True, blank=True)
@@ -117,6 +125,16 @@ class People(models.Model):
     friends = models.ManyToManyField("self", symmetrical=False, blank=True)
     greeting = models.CharField(max_length=255, null=True, blank=True)
     foods = models.ManyToManyField("Food", verbose_name=_("Foods"), blank=True)
+    fingerprint = models.CharField(max_length=40, blank=True, default='')
+
+    class Meta:
+        indexes = [
+            # Employees of a company in index order, also serving their
+            # cursor pagination; replaces the index of the foreign key
+            models.Index(fields=['company', 'index'], name='core_people_company_index_idx'),
+            # The living people by eye color, the default friend filters
+            models.Index(fields=['eye_color'], condition=models.Q(has_died=False), name='core_people_alive_eye_idx'),
+        ]
 
     def __str__(self):
         """String representation of People object"""
@@ -124,36 +142,34 @@ class People(models.Model):
 
     @property
     def fruits(self):
-        return self.foods.filter(
-            name__in=COMMON_FRUIT_LIST
-        ).values_list('name', flat=True)
+        return [food.name for food in self.foods.all() if food.category == 'fruit']
 
     @property
     def vegetables(self):
-        return self.foods.exclude(
-            name__in=COMMON_FRUIT_LIST
-        ).values_list('name', flat=True)
+        return [food.name for food in self.foods.all() if food.category == 'vegetable']
 
     @property
     def address(self):
+        return self.compose_address(self.street_name, self.suburb, self.state, self.postcode)
+
+    @staticmethod
+    def compose_address(street_name, suburb, state, postcode):
+        """Join the address columns of a People row"""
         return ', '.join([
-            self.street_name,
-            self.suburb,
-            self.state,
-            str(self.postcode)
+            street_name,
+            suburb,
+            state,
+            str(postcode)
         ])
 
-    def get_common_friends(self, other, **options):
-        """Get the friends in common for 2 people"""
-
-        seta = set(self.friends.values_list('index', flat=True))
-        setb = set(other.friends.values_list('index', flat=True))
+    def get_common_friends(self, *others, **options):
+        """Get the friends in common for 2 or more people
 
-        common_friends = People.objects.filter(
-            index__in=list(seta & setb)
-        ).filter(
-            eye_color=options['eye_color'],
-            has_died=options['has_died']
-        )
+        Each person adds a join on the friends through table, so the
+        intersection and the attribute filters run as a single query.
+        """
+        common_friends = People.objects.filter(people=self)
+        for other in others:
+            common_friends = common_friends.filter(people=other)
 
-        return common_friends
+        return common_friends.filter(**options)
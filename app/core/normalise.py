@@ -0,0 +1,166 @@
+import hashlib
+import json
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from multiprocessing import get_context
+
+from dateutil.parser import parse
+
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def utc_offset(sign, hours, minutes):
+    """Return the tzinfo of a +HH:MM or -HH:MM offset"""
+    delta = timedelta(hours=hours, minutes=minutes)
+    return timezone(-delta if sign == '-' else delta)
+
+
+def parse_registered(value):
+    """Parse a registered date such as '2016-07-13T12:29:07 -10:00'
+
+    The fixed export format is sliced directly; anything else goes
+    through dateutil.
+    """
+    if (len(value) == 26 and value[4] == '-' and value[7] == '-' and value[10] == 'T'
+            and value[19] == ' ' and value[20] in '+-' and value[23] == ':'):
+        try:
+            return datetime(
+                int(value[0:4]), int(value[5:7]), int(value[8:10]),
+                int(value[11:13]), int(value[14:16]), int(value[17:19]),
+                tzinfo=utc_offset(value[20], int(value[21:23]), int(value[24:26]))
+            )
+        except ValueError:
+            pass
+    return parse(value)
+
+
+def parse_balance(value):
+    """Parse a balance such as '$2,418.59'"""
+    if value[:1] == '$':
+        value = value[1:]
+    return float(value.replace(',', ''))
+
+
+def people_details_preprocessing(**people_details):
+    """Normalise one raw people.json record into People field values"""
+    people_dict = dict()
+    people_dict['pid'] = people_details.get('_id')
+
+    people_dict['index'] = people_details.get('index', -1)
+    if people_dict['index'] < 0:
+        logger.info("pid: {} without an index.".format(people_dict['pid']))
+
+    people_dict['guid'] = people_details.get('guid')
+    has_died = people_details.get('has_died')
+    people_dict['has_died'] = has_died is True or has_died == "True"
+
+    try:
+        people_dict['balance'] = parse_balance(people_details.get('balance'))
+    except (AttributeError, TypeError, ValueError):
+        people_dict['balance'] = 0
+
+    people_dict['picture'] = people_details.get('picture')
+
+    try:
+        people_dict['age'] = int(people_details.get('age'))
+    except (TypeError, ValueError):
+        people_dict['age'] = None
+
+    people_dict['eye_color'] = people_details.get('eyeColor')
+    people_dict['name'] = people_details.get('name')
+    people_dict['gender'] = people_details.get('gender', 'female')
+
+    try:
+        people_dict['company'] = int(people_details.get('company_id'))
+    except (TypeError, ValueError):
+        logger.info("People: {} without a company.".format(people_dict['index']))
+
+    people_dict['email'] = people_details.get('email')
+    people_dict['phone'] = people_details.get('phone')
+
+    try:
+        address_list = [seg.strip() for seg in people_details.get('address').strip().split(',')]
+        people_dict['street_name'] = address_list[0]
+        people_dict['suburb'] = address_list[1]
+        people_dict['state'] = address_list[2]
+        people_dict['postcode'] = int(address_list[3])
+    except (AttributeError, IndexError, ValueError):
+        pass
+
+    people_dict['about'] = people_details.get('about')
+
+    try:
+        people_dict['registered'] = parse_registered(people_details.get('registered'))
+    except (TypeError, ValueError, OverflowError):
+        logger.info("Index: {} has no registered date".format(people_dict['index']))
+
+    people_dict['greeting'] = people_details.get('greeting')
+
+    return people_dict
+
+
+def get_people_friends_list(**people_details):
+    """Return the friend indexes of one raw people.json record"""
+    return [friend['index'] for friend in people_details.get('friends') or []]
+
+
+def record_fingerprint(record):
+    """Return a content hash of a raw people.json record"""
+    canonical = json.dumps(record, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
+def normalise_record(record):
+    """Return the (details, foods, tags, friends) row of a raw record
+
+    Records without an index or a company cannot be loaded and return
+    None. The company is the 0-based Company.index.
+    """
+    details = people_details_preprocessing(**record)
+    if 'company' not in details or details['index'] < 0:
+        return None
+    details['company'] -= 1
+    details['fingerprint'] = record_fingerprint(record)
+    return (
+        details,
+        record.get('favouriteFood') or [],
+        record.get('tags') or [],
+        get_people_friends_list(**record),
+    )
+
+
+def normalise_batch(records):
+    """Return the loadable rows of a list of raw records"""
+    rows = []
+    for record in records:
+        row = normalise_record(record)
+        if row is not None:
+            rows.append(row)
+    return rows
+
+
+def normalised_batches(batches, workers=1):
+    """Yield normalise_batch of every batch, in order
+
+    With several workers the batches are normalised in a process pool
+    while the caller consumes earlier results, keeping at most two
+    batches per worker in flight.
+    """
+    if workers <= 1:
+        for batch in batches:
+            yield normalise_batch(batch)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn')) as pool:
+        pending = deque()
+        for batch in batches:
+            pending.append(pool.submit(normalise_batch, batch))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
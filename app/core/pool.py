@@ -0,0 +1,177 @@
+import threading
+import time
+
+from django.db.utils import OperationalError
+
+
+class ConnectionPool:
+    """Bounded pool of database connections shared by the threads of a process
+
+    At most max_size connections are checked out at once; checkout waits
+    up to timeout seconds for one to be returned. Idle connections are
+    reused last in first out, after a ping when they have been idle for
+    ping_after seconds or more. Connections failing their ping or
+    returned broken are closed and replaced, which counts a reconnect.
+    """
+
+    def __init__(self, connect, max_size=20, timeout=10, ping_after=30, ping=None, reset=None):
+        self.connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self.ping = ping
+        self.reset = reset
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._idle = []
+        self._checked_out = set()
+        self.closed = False
+        self.active = 0
+        self.checkouts = 0
+        self.connects = 0
+        self.reconnects = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def checkout(self):
+        """Return a connection, waiting for one when max_size are checked out"""
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self.timeouts += 1
+            raise OperationalError('No database connection available within {} seconds.'.format(self.timeout))
+        waited = time.monotonic() - started
+
+        try:
+            connection = self.reuse()
+            if connection is None:
+                connection = self.connect()
+                with self._lock:
+                    self.connects += 1
+        except BaseException:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._checked_out.add(connection)
+            self.active += 1
+            self.checkouts += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        return connection
+
+    def reuse(self):
+        """Return an idle connection answering its ping, or None"""
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                connection, returned_at = self._idle.pop()
+            if self.ping is None or time.monotonic() - returned_at < self.ping_after:
+                return connection
+            try:
+                self.ping(connection)
+            except Exception:
+                self.discard(connection)
+            else:
+                return connection
+
+    def checkin(self, connection, broken=False):
+        """Take back a checked out connection, closing it when broken or the pool is closed"""
+        try:
+            if self.closed:
+                connection.close()
+                return
+            if not broken and self.reset is not None:
+                try:
+                    self.reset(connection)
+                except Exception:
+                    broken = True
+            if broken:
+                self.discard(connection)
+            else:
+                with self._lock:
+                    self._idle.append((connection, time.monotonic()))
+        finally:
+            with self._lock:
+                self._checked_out.discard(connection)
+                self.active -= 1
+            self._slots.release()
+
+    def discard(self, connection):
+        """Close a broken connection, counting it as a reconnect"""
+        with self._lock:
+            self.reconnects += 1
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def close(self, checked_out=False):
+        """Close the idle connections, and the checked out ones too when checked_out is true
+
+        Connections returned to a closed pool are closed.
+        """
+        with self._lock:
+            self.closed = True
+            connections = [connection for connection, _ in self._idle]
+            self._idle = []
+            if checked_out:
+                connections.extend(self._checked_out)
+        for connection in connections:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def stats(self):
+        """Return the counters of the pool"""
+        with self._lock:
+            return {
+                'max_size': self.max_size,
+                'active': self.active,
+                'idle': len(self._idle),
+                'checkouts': self.checkouts,
+                'connects': self.connects,
+                'reconnects': self.reconnects,
+                'timeouts': self.timeouts,
+                'wait_ms_total': round(self.wait_seconds * 1000, 3),
+                'wait_ms_max': round(self.max_wait_seconds * 1000, 3),
+            }
+
+
+_pools_lock = threading.Lock()
+pools = dict()
+
+
+def get_pool(alias, database, factory):
+    """Return the pool of a database alias and name, creating it with factory()
+
+    The name is part of the key so the test databases, created under the
+    same aliases, get pools of their own.
+    """
+    key = (alias, database)
+    pool = pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = pools.get(key)
+            if pool is None:
+                pool = pools[key] = factory()
+    return pool
+
+
+def close_pool(alias, database, checked_out=False):
+    """Close the connections of a pool and forget it, e.g. before dropping its database"""
+    with _pools_lock:
+        pool = pools.pop((alias, database), None)
+    if pool is not None:
+        pool.close(checked_out)
+
+
+def pool_stats():
+    """Return the counters of the pools of this process"""
+    return [
+        dict(alias=alias, database=database, **pool.stats())
+        for (alias, database), pool in sorted(pools.items(), key=lambda item: tuple(map(str, item[0])))
+    ]
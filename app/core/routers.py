@@ -0,0 +1,133 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+
+READ_MODELS = {'core.company', 'core.people', 'core.food', 'core.tag'}
+
+_replica_reads = contextvars.ContextVar('replica_reads', default=None)
+
+
+@contextmanager
+def replica_reads(primary=False):
+    """Let the read models be read from the replicas until the first write
+
+    Yields the state of the block, whose 'wrote' is set by the first
+    write; the reads that follow it go to the primary, like every read
+    of the block when primary is true.
+    """
+    state = {'primary': primary, 'wrote': False}
+    token = _replica_reads.set(state)
+    try:
+        yield state
+    finally:
+        _replica_reads.reset(token)
+
+
+def reads_primary():
+    """Return whether the read models are read from the primary in this block
+
+    They are outside replica_reads(), in a block reading the primary and
+    after a write.
+    """
+    state = _replica_reads.get()
+    return state is None or state['primary'] or state['wrote']
+
+
+class ReplicaRouter:
+    """Route the reads of the companies, people, foods and tags to replicas
+
+    Only reads made within replica_reads(), i.e. the safe API requests,
+    go to the DATABASE_REPLICAS aliases, in turn. The connection of a
+    replica is pinged every REPLICA_CHECK_SECONDS; a replica failing to
+    connect is skipped for REPLICA_RETRY_SECONDS and the primary answers
+    when no replica is available. Everything else, writes, migrations,
+    management commands and the reads following a write, uses the primary.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._turn = 0
+        self._down_until = dict()
+        # Connections are per thread, and so is the time their next ping is due
+        self._local = threading.local()
+
+    @property
+    def replicas(self):
+        return getattr(settings, 'DATABASE_REPLICAS', ())
+
+    @property
+    def retry_seconds(self):
+        return getattr(settings, 'REPLICA_RETRY_SECONDS', 30)
+
+    @property
+    def check_seconds(self):
+        return getattr(settings, 'REPLICA_CHECK_SECONDS', 1)
+
+    def is_read_model(self, model):
+        """Return whether model, or the model it is an m2m through table of, is read from replicas"""
+        model = model._meta.auto_created or model
+        return model._meta.label_lower in READ_MODELS
+
+    def is_healthy(self, alias):
+        """Return whether alias accepts connections, skipping it for a while when it does not
+
+        An open connection is pinged, at most every check_seconds, as
+        ensure_connection() does not notice a replica gone since it opened.
+        """
+        now = time.monotonic()
+        if self._down_until.get(alias, 0) > now:
+            return False
+        checked_until = getattr(self._local, 'checked_until', None)
+        if checked_until is None:
+            checked_until = self._local.checked_until = dict()
+        if checked_until.get(alias, 0) > now:
+            return True
+        connection = connections[alias]
+        try:
+            if connection.connection is not None and not connection.is_usable():
+                connection.close()
+            connection.ensure_connection()
+        except DatabaseError:
+            self._down_until[alias] = now + self.retry_seconds
+            return False
+        checked_until[alias] = now + self.check_seconds
+        return True
+
+    def next_replica(self):
+        """Return the next healthy replica in turn, or None when none is"""
+        replicas = self.replicas
+        with self._lock:
+            start = self._turn
+            self._turn += 1
+        for offset in range(len(replicas)):
+            alias = replicas[(start + offset) % len(replicas)]
+            if self.is_healthy(alias):
+                return alias
+        return None
+
+    def db_for_read(self, model, **hints):
+        if reads_primary() or not self.replicas or not self.is_read_model(model):
+            return None
+        return self.next_replica()
+
+    def db_for_write(self, model, **hints):
+        state = _replica_reads.get()
+        if state is not None:
+            state['wrote'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *self.replicas}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in self.replicas:
+            return False
+        return None
@@ -0,0 +1,157 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, IntegerField, Value, When
+from django.db.models.functions import Length
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.dataset import now_and_on_commit
+from core.dimensions import company_dimension
+from core.models import Company
+
+
+MATCH_EXACT, MATCH_PREFIX, MATCH_CONTAINS = range(3)
+
+
+class CompanyIndex:
+    """N-gram index of lowercased company names
+
+    Each name is posted under its distinct substrings of up to GRAM
+    characters, at most GRAM postings per character. A query of up to
+    GRAM characters reads its posting list; a longer one intersects the
+    lists of its grams, rarest first, and checks the candidates left.
+    """
+    GRAM = 3
+
+    def __init__(self, companies):
+        self.names = dict()
+        self.keys = dict()
+        postings = dict()
+        for pk, name in companies:
+            if not name:
+                continue
+            self.names[pk] = name
+            key = self.keys[pk] = name.lower()
+            grams = {key[start:start + size] for size in range(1, self.GRAM + 1) for start in range(len(key))}
+            for gram in grams:
+                postings.setdefault(gram, []).append(pk)
+        self.postings = postings
+
+    def candidates(self, key):
+        """Return the pks of the names which may contain key"""
+        if not key:
+            return self.keys
+        if len(key) <= self.GRAM:
+            return self.postings.get(key, ())
+        grams = sorted(
+            {key[start:start + self.GRAM] for start in range(len(key) - self.GRAM + 1)},
+            key=lambda gram: len(self.postings.get(gram, ()))
+        )
+        pks = set(self.postings.get(grams[0], ()))
+        for gram in grams[1:]:
+            if not pks:
+                break
+            pks.intersection_update(self.postings.get(gram, ()))
+        return pks
+
+    def matches(self, query):
+        """Return the {pk: match kind} of the names containing query"""
+        key = query.lower()
+        matches = dict()
+        for pk in self.candidates(key):
+            start = self.keys[pk].find(key)
+            if start > 0:
+                matches[pk] = MATCH_CONTAINS
+            elif start == 0:
+                matches[pk] = MATCH_EXACT if len(self.keys[pk]) == len(key) else MATCH_PREFIX
+        return matches
+
+    def search(self, query, limit):
+        """Return the pks of the best limit names containing query"""
+        matches = self.matches(query)
+        ranked = sorted(matches, key=lambda pk: (matches[pk], len(self.names[pk]), self.names[pk], pk))
+        return ranked[:limit]
+
+
+class CompanySearch:
+    """Ranked company name search
+
+    Matches are the names containing the query, case insensitively,
+    exact matches first, then prefixes, then shorter names. PostgreSQL
+    answers from the pg_trgm index on UPPER(name); other backends use a
+    process-local CompanyIndex built lazily and rebuilt when companies
+    change or after COMPANY_SEARCH_MAX_AGE seconds.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+        self._built_at = 0
+        self._generation = 0
+
+    @property
+    def max_age(self):
+        return getattr(settings, 'COMPANY_SEARCH_MAX_AGE', 300)
+
+    def invalidate(self):
+        """Drop the index so the next search rebuilds it, and any build already running"""
+        self._generation += 1
+        self._index = None
+
+    def index(self):
+        """Return the CompanyIndex, building it if needed"""
+        index = self._index
+        if index is None or time.monotonic() - self._built_at > self.max_age:
+            with self._lock:
+                index = self._index
+                if index is None or time.monotonic() - self._built_at > self.max_age:
+                    generation = self._generation
+                    index = CompanyIndex((company.pk, company.name) for company in company_dimension.all())
+                    if generation == self._generation:
+                        self._index = index
+                        self._built_at = time.monotonic()
+        return index
+
+    def search(self, query, limit=10):
+        """Return the best limit companies whose name contains query"""
+        if connection.vendor == 'postgresql':
+            return list(
+                Company.objects.filter(name__icontains=query).annotate(
+                    match=Case(
+                        When(name__iexact=query, then=Value(MATCH_EXACT)),
+                        When(name__istartswith=query, then=Value(MATCH_PREFIX)),
+                        default=Value(MATCH_CONTAINS),
+                        output_field=IntegerField(),
+                    )
+                ).order_by('match', Length('name'), 'name', 'id')[:limit]
+            )
+
+        pks = self.index().search(query, limit)
+        companies = [company_dimension.get(pk) for pk in pks]
+        return [company for company in companies if company is not None]
+
+    def resolve(self, query):
+        """Return the company query names, or None when it is ambiguous
+
+        An exact name wins over the names merely containing query.
+        """
+        companies = self.search(query, limit=2)
+        if not companies:
+            return None
+        exact = [company.name.lower() == query.lower() for company in companies]
+        if len(companies) == 1 or exact == [True, False]:
+            return companies[0]
+        return None
+
+
+company_search = CompanySearch()
+
+
+@receiver(post_save, sender=Company)
+@receiver(post_delete, sender=Company)
+def invalidate_company_search(sender, **kwargs):
+    """Rebuild the company search index after companies change, and again once they are committed"""
+    now_and_on_commit(company_search.invalidate)
@@ -0,0 +1,218 @@
+import json
+import math
+import uuid
+from bisect import bisect
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import accumulate
+from multiprocessing import get_context
+from random import Random
+
+from faker import Faker
+
+
+CHUNK_SIZE = 10000
+POOL_SIZE = 500
+
+FRUITS = ('apple', 'banana', 'orange', 'strawberry')
+VEGETABLES = ('beetroot', 'carrot', 'celery', 'cucumber')
+EYE_COLORS = ('blue', 'brown', 'green')
+TAG_COUNT = 62
+TAGS_PER_PEOPLE = 7
+FOODS_PER_PEOPLE = 4
+FRIEND_DEGREES = ('uniform', 'poisson', 'powerlaw')
+
+
+DatasetSpec = namedtuple('DatasetSpec', (
+    'people', 'companies', 'seed', 'friend_degree', 'mean_friends', 'max_friends', 'company_skew',
+))
+
+
+def chunk_seed(seed, chunk):
+    """Return the seed of one chunk, independent of how chunks are spread over workers"""
+    return seed * 1000003 + chunk
+
+
+def company_weights(companies, skew):
+    """Return the cumulative weights of the companies, for a bisect of random() * total
+
+    The company of rank r weighs 1 / (r + 1) ** skew, so 0 gives every
+    company the same size and 1 a Zipf distribution, company 0 largest.
+    """
+    return list(accumulate(1 / (rank + 1) ** skew for rank in range(companies)))
+
+
+def friend_degree(rng, spec):
+    """Return a number of friends drawn from the spec degree distribution"""
+    mean = spec.mean_friends
+    if spec.friend_degree == 'uniform':
+        degree = rng.randint(0, 2 * mean)
+    elif spec.friend_degree == 'poisson':
+        # Count the unit rate arrivals within mean
+        degree, elapsed = 0, rng.expovariate(1)
+        while elapsed < mean:
+            degree += 1
+            elapsed += rng.expovariate(1)
+    else:
+        # Pareto with shape 2 and scale mean / 2 has the requested mean and a long tail
+        degree = int(rng.paretovariate(2) * mean / 2)
+    return min(degree, spec.max_friends, spec.people)
+
+
+def format_registered(rng):
+    """Return a random registered date formatted like people.json"""
+    year, month, day = rng.randint(2014, 2017), rng.randint(1, 12), rng.randint(1, 28)
+    hour, minute, second = rng.randint(0, 23), rng.randint(0, 59), rng.randint(0, 59)
+    offset = rng.randint(-11, 12)
+    return '{:04d}-{:02d}-{:02d}T{:02d}:{:02d}:{:02d} {}{:02d}:00'.format(
+        year, month, day, hour, minute, second, '-' if offset < 0 else '+', abs(offset)
+    )
+
+
+def dataset_tags(seed):
+    """Return the TAG_COUNT distinct lorem words used as tags"""
+    fake = Faker()
+    fake.seed_instance(seed)
+    return fake.words(nb=TAG_COUNT, unique=True)
+
+
+def company_names(spec):
+    """Return the distinct, uppercase names of the spec companies"""
+    fake = Faker()
+    fake.seed_instance(spec.seed)
+    names = []
+    seen = set()
+    for index in range(spec.companies):
+        name = (fake.word() + fake.word()).upper()
+        if name in seen:
+            name = '{}{}'.format(name, index)
+        seen.add(name)
+        names.append(name)
+    return names
+
+
+class ValuePools:
+    """size Faker values per field, drawn once per chunk
+
+    Faker costs tens of microseconds per value, so each record picks its
+    names, streets and texts from these pools with the chunk's Random.
+    """
+
+    def __init__(self, seed, size=POOL_SIZE):
+        fake = Faker()
+        fake.seed_instance(seed)
+        self.female_names = [fake.first_name_female() for _ in range(size)]
+        self.male_names = [fake.first_name_male() for _ in range(size)]
+        self.last_names = [fake.last_name() for _ in range(size)]
+        self.streets = [fake.street_name() for _ in range(size)]
+        self.cities = [fake.city() for _ in range(size)]
+        self.states = [fake.state() for _ in range(size)]
+        self.phones = ['+1 ({}) {}-{}'.format(
+            fake.numerify('9##'), fake.numerify('###'), fake.numerify('####')
+        ) for _ in range(size)]
+        # Paragraphs are the slowest values and need less variety
+        self.abouts = [fake.paragraph(nb_sentences=6) + '\r\n' for _ in range(size // 5 + 1)]
+
+
+def generate_chunk(spec, chunk, companies, tags, chunk_size=CHUNK_SIZE):
+    """Return the people.json records of one chunk as a list of JSON strings
+
+    Everything is drawn from a Random seeded with chunk_seed, so a chunk
+    is the same whichever process generates it.
+    """
+    seed = chunk_seed(spec.seed, chunk)
+    rng = Random(seed)
+    pools = ValuePools(seed, min(POOL_SIZE, chunk_size))
+    weights = company_weights(len(companies), spec.company_skew)
+    total_weight = weights[-1]
+    foods = FRUITS + VEGETABLES
+    random = rng.random
+
+    lines = []
+    for index in range(chunk * chunk_size, min((chunk + 1) * chunk_size, spec.people)):
+        gender = rng.choice(('female', 'male'))
+        first_name = rng.choice(pools.female_names if gender == 'female' else pools.male_names)
+        last_name = rng.choice(pools.last_names)
+        name = '{} {}'.format(first_name, last_name)
+        company = bisect(weights, random() * total_weight)
+        company = min(company, len(companies) - 1)
+        # int(random() * n) is several times faster than randrange(n) for the many friend draws
+        friends = dict.fromkeys(int(random() * spec.people) for _ in range(friend_degree(rng, spec)))
+
+        lines.append(json.dumps({
+            '_id': '{:024x}'.format(rng.getrandbits(96)),
+            'index': index,
+            'guid': str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            'has_died': random() < 0.5,
+            'balance': '${:,.2f}'.format(rng.randint(100000, 400000) / 100),
+            'picture': 'http://placehold.it/32x32',
+            'age': rng.randint(10, 70),
+            'eyeColor': rng.choice(EYE_COLORS),
+            'name': name,
+            'gender': gender,
+            'company_id': company + 1,
+            'email': '{}{}@{}.com'.format(first_name, last_name, companies[company]).lower(),
+            'phone': rng.choice(pools.phones),
+            'address': '{} {}, {}, {}, {}'.format(
+                rng.randint(100, 999), rng.choice(pools.streets), rng.choice(pools.cities),
+                rng.choice(pools.states), rng.randint(1000, 9999)
+            ),
+            'about': rng.choice(pools.abouts),
+            'registered': format_registered(rng),
+            'tags': rng.sample(tags, TAGS_PER_PEOPLE),
+            'friends': [{'index': friend} for friend in friends],
+            'greeting': 'Hello, {}! You have {} unread messages.'.format(first_name, rng.randint(1, 10)),
+            'favouriteFood': rng.sample(foods, FOODS_PER_PEOPLE),
+        }))
+    return lines
+
+
+def generate_people(spec, workers=1, chunk_size=CHUNK_SIZE):
+    """Yield the people.json records of spec as JSON strings, a chunk at a time, in index order
+
+    With several workers the chunks are generated in a process pool while
+    the caller writes earlier ones, keeping at most two chunks per worker
+    in flight. The output depends on the spec and chunk_size only.
+    """
+    companies = company_names(spec)
+    tags = dataset_tags(spec.seed)
+    chunks = range(math.ceil(spec.people / chunk_size))
+    if workers <= 1:
+        for chunk in chunks:
+            yield generate_chunk(spec, chunk, companies, tags, chunk_size)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn')) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(generate_chunk, spec, chunk, companies, tags, chunk_size))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def write_companies(path, spec):
+    """Write the companies.json of spec"""
+    with open(path, 'w', encoding='utf-8') as cfile:
+        json.dump(
+            [{'index': index, 'company': name} for index, name in enumerate(company_names(spec))],
+            cfile, indent=2
+        )
+
+
+def write_people(path, spec, workers=1, ndjson=False):
+    """Stream the people of spec to path as a JSON array, or NDJSON, and return their number"""
+    count = 0
+    with open(path, 'w', encoding='utf-8') as pfile:
+        if not ndjson:
+            pfile.write('[')
+        for lines in generate_people(spec, workers):
+            if ndjson:
+                pfile.write('\n'.join(lines) + '\n')
+            else:
+                pfile.write(('\n' if not count else ',\n') + ',\n'.join(lines))
+            count += len(lines)
+        if not ndjson:
+            pfile.write('\n]\n')
+    return count
@@ -1,22 +1,39 @@
-from unittest.mock import patch
+from unittest.mock import call, patch
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError
 from django.test import TestCase
 
 
+ENSURE_CONNECTION = 'django.db.backends.base.base.BaseDatabaseWrapper.ensure_connection'
+
+
 class CommandTests(TestCase):
 
     def test_wait_for_db_ready(self):
         """Test waiting for db ready"""
-        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.return_value = True
+        with patch(ENSURE_CONNECTION) as ec:
             call_command('wait_for_db')
-            self.assertEqual(gi.call_count, 1)
+            self.assertEqual(ec.call_count, 1)
 
     @patch('time.sleep', return_value=True)
     def test_wait_for_db(self, ts):
         """Testing waiting for db"""
-        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.side_effect = [OperationalError] * 5 + [True]
+        with patch(ENSURE_CONNECTION) as ec:
+            ec.side_effect = [OperationalError] * 5 + [None]
             call_command('wait_for_db')
-            self.assertEqual(gi.call_count, 6)
+            self.assertEqual(ec.call_count, 6)
+        self.assertEqual(ts.call_args_list, [call(0.1), call(0.2), call(0.4), call(0.8), call(1.6)])
+
+    @patch('time.sleep', return_value=True)
+    def test_wait_for_db_backoff_is_capped(self, ts):
+        """Test the delay between attempts stops doubling at max_delay"""
+        with patch(ENSURE_CONNECTION) as ec:
+            ec.side_effect = [OperationalError] * 4 + [None]
+            call_command('wait_for_db', max_delay=0.3)
+        self.assertEqual(ts.call_args_list, [call(0.1), call(0.2), call(0.3), call(0.3)])
+
+    def test_wait_for_db_timeout(self):
+        """Test waiting gives up once the timeout is spent"""
+        with patch(ENSURE_CONNECTION, side_effect=OperationalError), self.assertRaises(CommandError):
+            call_command('wait_for_db', timeout=0)
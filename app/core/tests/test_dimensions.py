@@ -0,0 +1,156 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from core.dimensions import company_dimension, food_dimension, invalidate_dimensions, tag_dimension
+from core.models import Company, Food, Tag, food_category
+from core.tests.test_ingest import sample_record
+
+
+class DimensionTests(TestCase):
+
+    def setUp(self):
+        invalidate_dimensions()
+        self.apple = Food.objects.create(name='apple')
+        self.kale = Food.objects.create(name='kale')
+        self.company = Company.objects.create(index=1000, name='NETBOOK')
+
+    def write_people(self):
+        """Write a people.json file of one record and return its path"""
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as pfile:
+            json.dump([sample_record(0, company_id=1000, foods=('durian',))], pfile)
+        self.addCleanup(os.remove, pfile.name)
+        return pfile.name
+
+    def test_food_lookups(self):
+        """Test foods are looked up by pk, name and category"""
+        self.assertEqual(food_dimension.names()[self.apple.pk], 'apple')
+        self.assertEqual(food_dimension.ids()['kale'], self.kale.pk)
+        self.assertEqual(food_dimension.category(self.apple.pk), 'fruit')
+        self.assertEqual(
+            food_dimension.split([self.kale.pk, self.apple.pk, self.kale.pk]),
+            (['apple'], ['kale', 'kale'])
+        )
+
+    def test_loaded_once(self):
+        """Test lookups after the first one run no query"""
+        food_dimension.table()
+        company_dimension.table()
+
+        with self.assertNumQueries(0):
+            food_dimension.ids()
+            company_dimension.by_index(1000)
+
+    def test_invalidated_on_change(self):
+        """Test saving or deleting a row reloads its table"""
+        food_dimension.table()
+        company_dimension.table()
+
+        banana = Food.objects.create(name='banana')
+        self.company.name = 'PERMADYNE'
+        self.company.save()
+        self.kale.delete()
+
+        self.assertEqual(food_dimension.names()[banana.pk], 'banana')
+        self.assertNotIn('kale', food_dimension.ids())
+        self.assertEqual(company_dimension.by_index(1000).name, 'PERMADYNE')
+
+    def test_table_of_reloads_missing_rows(self):
+        """Test rows written without signals, e.g. by another process, are picked up when needed"""
+        food_dimension.table()
+        Food.objects.bulk_create([Food(name='carrot', category='vegetable')])
+        carrot = Food.objects.get(name='carrot')
+
+        self.assertEqual(food_dimension.split([carrot.pk]), ([], ['carrot']))
+
+    def test_by_index_reloads_missing_company(self):
+        """Test a company index added without signals is picked up"""
+        company_dimension.table()
+        Company.objects.bulk_create([Company(index=1001, name='ZENTIA')])
+
+        self.assertEqual(company_dimension.by_index(1001).name, 'ZENTIA')
+
+    def test_unknown_lookups_reload_once(self):
+        """Test repeated lookups of missing rows reload the table once, then read the missing row alone"""
+        company_dimension.table()
+        table = food_dimension.table()
+        company_dimension._miss_reloaded_at = food_dimension._miss_reloaded_at = None
+
+        with CaptureQueriesContext(connection) as ctx:
+            for _ in range(3):
+                self.assertIsNone(company_dimension.by_index(-1))
+        queries = [query['sql'] for query in ctx.captured_queries]
+        self.assertEqual(len(queries), 3)
+        self.assertNotIn('WHERE', queries[0])
+        self.assertTrue(all('WHERE' in sql for sql in queries[1:]))
+        self.assertIsNotNone(company_dimension._table)
+
+        with self.assertNumQueries(3):
+            for _ in range(3):
+                self.assertNotIn(-1, food_dimension.table_of([self.apple.pk, -1]).names)
+        self.assertIsNot(food_dimension.table(), table)
+        table = food_dimension.table()
+
+        Food.objects.bulk_create([Food(name='banana', category='fruit')])
+        banana = Food.objects.get(name='banana')
+        self.assertEqual(food_dimension.split([banana.pk, self.apple.pk]), (['banana', 'apple'], []))
+        self.assertIs(food_dimension.table(), table)
+
+    def test_stale_load_discarded(self):
+        """Test a table loaded while its rows change is not kept, and reloaded once they commit"""
+        load = food_dimension.load
+
+        def load_then_change():
+            table = load()
+            food_dimension.invalidate()
+            return table
+
+        with patch.object(food_dimension, 'load', load_then_change):
+            food_dimension.table()
+        self.assertIsNone(food_dimension._table)
+
+        with transaction.atomic():
+            Food.objects.create(name='banana')
+            callbacks = [callback for _, callback in connection.run_on_commit]
+        self.assertIn(food_dimension.invalidate, callbacks)
+
+    def test_tag_first_pk_wins(self):
+        """Test a duplicated tag name maps to its first pk"""
+        first = Tag.objects.create(name='dup')
+        second = Tag.objects.create(name='dup')
+
+        self.assertEqual(tag_dimension.ids()['dup'], first.pk)
+        self.assertEqual(tag_dimension.names()[second.pk], 'dup')
+
+    def test_company_lookups(self):
+        """Test companies are looked up by pk and index"""
+        self.assertEqual(company_dimension.get(self.company.pk), self.company)
+        self.assertEqual(company_dimension.by_index(1000), self.company)
+        self.assertIsNone(company_dimension.by_index(-1))
+        self.assertEqual(company_dimension.ids()[1000], self.company.pk)
+        self.assertIn(self.company, company_dimension.all())
+
+    def test_reloaded_after_load(self):
+        """Test load_paranuara, which bulk inserts without signals, reloads the tables"""
+        food_dimension.table()
+        tag_dimension.table()
+
+        call_command(
+            'load_paranuara', people=self.write_people(), companies='', stdout=StringIO()
+        )
+
+        self.assertIn('durian', food_dimension.ids())
+        self.assertIn('quis', tag_dimension.ids())
+        self.assertEqual(food_dimension.category(food_dimension.ids()['durian']), 'vegetable')
+
+    def test_food_category(self):
+        """Test foods are categorised by name, case insensitively"""
+        self.assertEqual(food_category('Apple'), 'fruit')
+        self.assertEqual(food_category('celery'), 'vegetable')
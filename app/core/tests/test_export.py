@@ -0,0 +1,79 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from core.export import export_people, format_registered
+from core.models import People
+from core.normalise import parse_registered
+from core.tests.test_ingest import sample_record
+
+
+class ExportTests(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.records = [
+            sample_record(index, company_id=index % 3 + 1, friends=[(index + 1) % 7, (index + 3) % 7])
+            for index in range(7)
+        ]
+        self.load(self.write_ndjson('people.ndjson', [json.dumps(record) for record in self.records]))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write_ndjson(self, name, lines):
+        """Write lines to a file in the temporary directory"""
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w', encoding='utf-8') as nfile:
+            nfile.write('\n'.join(lines) + '\n')
+        return path
+
+    def load(self, path):
+        """Load an export with load_paranuara, skipping companies"""
+        call_command('load_paranuara', people=path, companies='', stdout=StringIO())
+
+    def export(self, batch_size=3):
+        """Return the lines of the NDJSON export"""
+        return ''.join(export_people(batch_size=batch_size)).splitlines()
+
+    def test_format_registered(self):
+        """Test registered dates are formatted like people.json"""
+        registered = parse_registered('2016-07-13T12:29:07 -10:00')
+
+        self.assertEqual(format_registered(registered), '2016-07-13T12:29:07 -10:00')
+        self.assertIsNone(format_registered(None))
+
+    def test_export_people(self):
+        """Test every people is exported as the record it was loaded from"""
+        lines = self.export()
+
+        self.assertEqual(len(lines), 7)
+        for line, record in zip(lines, self.records):
+            exported = json.loads(line)
+            self.assertEqual(exported['registered'], '2016-07-13T22:29:07 +00:00')
+            self.assertEqual(
+                exported.pop('friends'),
+                sorted(record.pop('friends'), key=lambda friend: friend['index'])
+            )
+            record.pop('registered')
+            exported.pop('registered')
+            self.assertEqual(exported, record)
+
+    def test_export_round_trip(self):
+        """Test load_paranuara reads the export back into the same people"""
+        lines = self.export()
+        People.objects.all().delete()
+
+        self.load(self.write_ndjson('export.ndjson', lines))
+
+        self.assertEqual(People.objects.count(), 7)
+        self.assertEqual(self.export(batch_size=100), lines)
+
+    def test_export_query_count(self):
+        """Test the export runs a fixed number of queries per batch"""
+        with self.assertNumQueries(3 + 1 + 3 * 3):
+            self.export(batch_size=3)
@@ -0,0 +1,151 @@
+from unittest.mock import patch
+
+from django.db import connection, transaction
+from django.test import TestCase
+
+from core.graph import FriendGraph, PathSearchTimeout, friend_graph, intersect_sorted
+from core.models import Company, People
+
+
+def sample_people(index, company):
+    """Create and return a sample people"""
+    return People.objects.create(
+        pid='pid-{}'.format(index), index=index, guid='guid-{}'.format(index),
+        name='Person {}'.format(index), company=company
+    )
+
+
+class FriendGraphTests(TestCase):
+
+    def setUp(self):
+        company = Company.objects.create(index=0, name='NETBOOK')
+        self.people = [sample_people(index, company) for index in (0, 1, 2, 3, 5)]
+        self.people[0].friends.add(self.people[1], self.people[2], self.people[4])
+        self.people[3].friends.add(self.people[2], self.people[4], self.people[0])
+
+    def test_intersect_sorted(self):
+        """Test merging and galloping intersections of sorted sequences"""
+        self.assertEqual(intersect_sorted([1, 3, 5, 7], [2, 3, 4, 7]), [3, 7])
+        self.assertEqual(intersect_sorted([], [1, 2]), [])
+        self.assertEqual(intersect_sorted([4, 90], list(range(100))), [4, 90])
+        self.assertEqual(intersect_sorted(list(range(0, 100, 2)), [1, 99]), [])
+
+    def test_friends(self):
+        """Test the CSR arrays hold each person's sorted friend indexes"""
+        graph = FriendGraph()
+
+        self.assertEqual(list(graph.friends(0)), [1, 2, 5])
+        self.assertEqual(list(graph.friends(3)), [0, 2, 5])
+        self.assertEqual(list(graph.friends(4)), [])
+        self.assertEqual(list(graph.friends(100)), [])
+        self.assertEqual(graph.common_friends(0, 3), [2, 5])
+
+    def test_common_friends_of_many(self):
+        """Test the friends shared by any number of people"""
+        graph = FriendGraph()
+        self.people[1].friends.add(self.people[4])
+
+        self.assertEqual(graph.common_friends(0, 3, 1), [5])
+        self.assertEqual(graph.common_friends(0, 3, 4), [])
+        self.assertEqual(graph.common_friends(0), [1, 2, 5])
+        self.assertEqual(graph.common_friends(), [])
+
+    def test_befriended_by(self):
+        """Test the reversed graph lists who befriends each person"""
+        graph = FriendGraph()
+
+        self.assertEqual(list(graph.befriended_by(2)), [0, 3])
+        self.assertEqual(list(graph.befriended_by(0)), [3])
+        self.assertEqual(list(graph.befriended_by(3)), [])
+
+    def test_shortest_path(self):
+        """Test the shortest friend chain follows friends in their direction"""
+        graph = FriendGraph()
+        self.people[1].friends.add(self.people[3])
+
+        self.assertEqual(graph.shortest_path(0, 0), [0])
+        self.assertEqual(graph.shortest_path(0, 5), [0, 5])
+        self.assertEqual(graph.shortest_path(3, 1), [3, 0, 1])
+        self.assertEqual(graph.shortest_path(1, 2), [1, 3, 2])
+        self.assertIsNone(graph.shortest_path(5, 0))
+        self.assertIsNone(graph.shortest_path(3, 1, max_depth=1))
+
+    def test_shortest_path_timeout(self):
+        """Test the path search gives up once its time budget is spent"""
+        with self.assertRaises(PathSearchTimeout):
+            FriendGraph().shortest_path(3, 1, timeout=-1)
+
+    def test_suggestions(self):
+        """Test non-friends are ranked by the number of mutual friends"""
+        graph = FriendGraph()
+        self.people[2].friends.add(self.people[1], self.people[4])
+        self.people[4].friends.add(self.people[2])
+
+        self.assertEqual(graph.suggestions(0), [(3, 2)])
+        self.assertEqual(graph.suggestions(2), [(0, 2), (3, 1)])
+        self.assertEqual(graph.suggestions(3), [])
+
+    def test_suggestions_cache(self):
+        """Test rankings are cached until the friends graph changes"""
+        self.assertEqual(friend_graph.suggestions(0), [(3, 2)])
+        with self.assertNumQueries(0):
+            self.assertIs(friend_graph.suggestions(0), friend_graph.suggestions(0))
+
+        self.people[3].friends.add(self.people[1])
+        self.assertEqual(friend_graph.suggestions(0), [(3, 3)])
+
+    def test_graph_is_built_once(self):
+        """Test lookups after the first build do not query the database"""
+        graph = FriendGraph()
+        graph.friends(0)
+
+        with self.assertNumQueries(0):
+            graph.common_friends(0, 3)
+
+    def test_reverse_built_with_graph(self):
+        """Test the reversed graph is derived by the build, not by the lookups"""
+        graph = FriendGraph()
+        graph.csr()
+
+        with patch.object(FriendGraph, 'transpose') as transpose, self.assertNumQueries(0):
+            self.assertEqual(list(graph.befriended_by(2)), [0, 3])
+            graph.shortest_path(1, 5)
+
+        transpose.assert_not_called()
+
+    def test_invalidated_on_friends_change(self):
+        """Test the shared graph is rebuilt when the friends table changes"""
+        self.assertEqual(friend_graph.common_friends(0, 3), [2, 5])
+
+        self.people[3].friends.add(self.people[1])
+        self.assertEqual(friend_graph.common_friends(0, 3), [1, 2, 5])
+
+        self.people[0].friends.remove(self.people[2])
+        self.assertEqual(friend_graph.common_friends(0, 3), [1, 5])
+
+    def test_stale_build_discarded(self):
+        """Test a build overtaken by an invalidation is not kept"""
+        graph = FriendGraph()
+        build = graph.build
+
+        def build_then_change():
+            csr = build()
+            graph.invalidate()
+            return csr
+
+        graph.build = build_then_change
+        graph.csr()
+        del graph.build
+
+        self.assertIsNone(graph._csr)
+        self.assertIsNotNone(graph.csr())
+        self.assertIsNotNone(graph._csr)
+
+    def test_invalidated_again_on_commit(self):
+        """Test a change in a transaction invalidates the shared graph again once it commits"""
+        with transaction.atomic():
+            self.people[3].friends.add(self.people[1])
+            self.people[0].friends.remove(self.people[2])
+            callbacks = [callback for _, callback in connection.run_on_commit]
+
+        self.assertEqual(callbacks.count(friend_graph.invalidate), 1)
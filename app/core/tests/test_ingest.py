@@ -0,0 +1,479 @@
+import io
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import skipUnless
+from unittest.mock import patch
+
+from dateutil.parser import parse
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from core import ingest, normalise
+from core.dataset import dataset_version
+from core.models import Company, Food, Tag, People
+
+
+def sample_record(index, company_id=1, friends=(), foods=('apple', 'carrot'), tags=('id', 'quis')):
+    """Create and return a raw people.json record"""
+    return {
+        "_id": "595eeb9b96d80a5bc7af{:04d}".format(index),
+        "index": index,
+        "guid": "5e71dc5d-61c0-4f3b-8b92-{:012d}".format(index),
+        "has_died": index % 2 == 0,
+        "balance": "$2,418.59",
+        "picture": "http://placehold.it/32x32",
+        "age": 61,
+        "eyeColor": "brown",
+        "name": "Person {}".format(index),
+        "gender": "female",
+        "company_id": company_id,
+        "email": "person{}@earthmark.com".format(index),
+        "phone": "+1 (910) 567-3630",
+        "address": "628 Sumner Place, Sperryville, American Samoa, 9819",
+        "about": "It is true that this about text mentions false things.",
+        "registered": "2016-07-13T12:29:07 -10:00",
+        "tags": list(tags),
+        "friends": [{"index": friend} for friend in friends],
+        "greeting": "Hello, Person {}!".format(index),
+        "favouriteFood": list(foods),
+    }
+
+
+class IngestTests(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write_json(self, name, data):
+        """Write data to a json file in the temporary directory"""
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w', encoding='utf-8') as jfile:
+            json.dump(data, jfile)
+        return path
+
+    def sample_people(self, size):
+        """Create a people.json file where everybody befriends the next person"""
+        return self.write_json('people.json', [
+            sample_record(index, company_id=index % 3 + 1, friends=[(index + 1) % size])
+            for index in range(size)
+        ])
+
+    def test_people_details_preprocessing(self):
+        """Test a raw record is normalised into People fields"""
+        details = normalise.people_details_preprocessing(**sample_record(4, company_id=7))
+
+        self.assertEqual(details['pid'], '595eeb9b96d80a5bc7af0004')
+        self.assertTrue(details['has_died'])
+        self.assertEqual(details['balance'], 2418.59)
+        self.assertEqual(details['company'], 7)
+        self.assertEqual(details['street_name'], '628 Sumner Place')
+        self.assertEqual(details['postcode'], 9819)
+        self.assertEqual(details['about'], 'It is true that this about text mentions false things.')
+
+    def test_load_paranuara(self):
+        """Test the load command creates people and every through row"""
+        companies = self.write_json('companies.json', [
+            {"index": 0, "company": "NETBOOK"},
+            {"index": 1, "company": "PERMADYNE"},
+        ])
+        people = self.sample_people(5)
+        out = StringIO()
+
+        call_command('load_paranuara', people=people, companies=companies, stdout=out)
+
+        self.assertEqual(People.objects.count(), 5)
+        self.assertEqual(Company.objects.get(index=0).name, 'NETBOOK')
+        self.assertEqual(Company.objects.count(), 3)
+        self.assertEqual(dict(Food.objects.values_list('name', 'category')), {'apple': 'fruit', 'carrot': 'vegetable'})
+        self.assertEqual(Tag.objects.count(), 2)
+        person = People.objects.get(index=4)
+        self.assertEqual(person.company.index, 1)
+        self.assertEqual(list(person.friends.values_list('index', flat=True)), [0])
+        self.assertEqual(person.foods.count(), 2)
+        self.assertEqual(person.tags.count(), 2)
+        self.assertTrue(person.has_died)
+        self.assertEqual(person.about, 'It is true that this about text mentions false things.')
+        self.assertIn('rows/s', out.getvalue())
+
+    def test_load_paranuara_twice(self):
+        """Test loading the same file twice does not duplicate rows"""
+        people = self.sample_people(4)
+
+        call_command('load_paranuara', people=people, companies='', stdout=StringIO())
+        call_command('load_paranuara', people=people, companies='', stdout=StringIO())
+
+        self.assertEqual(People.objects.count(), 4)
+        self.assertEqual(Tag.objects.count(), 2)
+        self.assertEqual(People.friends.through.objects.count(), 4)
+
+    def test_reload_shifted_indexes(self):
+        """Test reloading known pids under new indexes links them by pid and keeps their index"""
+        call_command('load_paranuara', people=self.sample_people(3), companies='', stdout=StringIO())
+        records = [dict(sample_record(index, foods=('kale',), tags=('new',)), index=index + 10) for index in range(3)]
+        # The last record repeats a pid of the file
+        shifted = self.write_json('shifted.json', records + [sample_record(0)])
+
+        call_command('load_paranuara', people=shifted, companies='', stdout=StringIO())
+
+        self.assertEqual(People.objects.count(), 3)
+        person = People.objects.get(pid=records[0]['_id'])
+        self.assertEqual(person.index, 0)
+        self.assertEqual(sorted(person.foods.values_list('name', flat=True)), ['apple', 'carrot', 'kale'])
+        self.assertIn('new', person.tags.values_list('name', flat=True))
+
+    def test_reload_index_of_another_pid(self):
+        """Test a new pid whose index another pid holds asks for a delta load"""
+        call_command('load_paranuara', people=self.sample_people(2), companies='', stdout=StringIO())
+        record = dict(sample_record(1), _id='595eeb9b96d80a5bc7af9999')
+
+        with self.assertRaisesRegex(CommandError, '--delta'):
+            call_command(
+                'load_paranuara', people=self.write_json('taken.json', [record]), companies='', stdout=StringIO()
+            )
+
+    def test_load_bumps_dataset_version(self):
+        """Test loading people makes the cached API responses stale"""
+        version = dataset_version.get()
+
+        call_command('load_paranuara', people=self.sample_people(3), companies='', stdout=StringIO())
+
+        self.assertGreater(dataset_version.get(), version)
+
+    def test_load_query_count_is_bounded(self):
+        """Test the number of queries does not grow with the number of people"""
+        def count_queries(size):
+            Company.objects.all().delete()
+            Food.objects.all().delete()
+            Tag.objects.all().delete()
+            with CaptureQueriesContext(connection) as ctx:
+                call_command(
+                    'load_paranuara', people=self.sample_people(size),
+                    companies='', batch_size=1000, stdout=StringIO()
+                )
+            return len(ctx.captured_queries)
+
+        self.assertEqual(count_queries(10), count_queries(40))
+
+    def test_iter_json_array(self):
+        """Test records are streamed one at a time across read chunks"""
+        records = [sample_record(index) for index in range(20)]
+        path = self.write_json('people.json', records)
+
+        with open(path, encoding='utf-8') as pfile:
+            streamed = list(ingest.iter_json_array(pfile, chunk_size=7))
+
+        self.assertEqual(streamed, records)
+        self.assertIs(streamed[0]['has_died'], True)
+        self.assertIs(streamed[1]['has_died'], False)
+
+    def test_iter_json_array_empty(self):
+        """Test an empty array yields nothing"""
+        path = self.write_json('people.json', [])
+
+        self.assertEqual(list(ingest.read_people(path)), [])
+
+    def test_iter_json_array_invalid(self):
+        """Test a document that is not an array is rejected"""
+        path = self.write_json('people.json', {"index": 0})
+
+        with open(path, encoding='utf-8') as pfile, self.assertRaises(ValueError):
+            list(ingest.iter_json_array(pfile))
+        with self.assertRaises(ValueError):
+            list(ingest.read_people(self.write_json('people.json', "people")))
+
+    def test_iter_json_array_commas(self):
+        """Test items must be separated by exactly one comma, whatever the chunk size"""
+        valid = (
+            '[1, 2 ,3]', '[ 1 ]', '[\n]', '[{"a": [1, 2]},\n{"b": ","}]', '[-2500.0, 1]', '[1.5e3]',
+            '[12345, -0.5E-2, true, null, "x"]', '[1] \n',
+        )
+        invalid = ('[,,1]', '[,1]', '[1 2]', '[1,,2]', '[1,]', '[1, 2,]', '[{} {}]', ',[1]', '[1]x', '[] []', '[1.]')
+        for chunk_size in (1, 2, 3, 7, 64):
+            for document in valid:
+                self.assertEqual(
+                    list(ingest.iter_json_array(io.StringIO(document), chunk_size=chunk_size)),
+                    json.loads(document), msg=(document, chunk_size)
+                )
+            for document in invalid:
+                with self.assertRaises(ValueError, msg=(document, chunk_size)):
+                    list(ingest.iter_json_array(io.StringIO(document), chunk_size=chunk_size))
+
+    def test_read_people_ndjson(self):
+        """Test NDJSON exports are read one record per line"""
+        records = [sample_record(index) for index in range(3)]
+        path = os.path.join(self.tmpdir.name, 'people.ndjson')
+        with open(path, 'w', encoding='utf-8') as pfile:
+            pfile.write('\n  ' + '\n'.join(json.dumps(record) for record in records) + '\n\n')
+
+        self.assertEqual(list(ingest.read_people(path)), records)
+
+    def test_iter_json_array_truncated(self):
+        """Test a truncated array is rejected"""
+        path = os.path.join(self.tmpdir.name, 'people.json')
+        with open(path, 'w', encoding='utf-8') as pfile:
+            pfile.write(json.dumps([sample_record(0), sample_record(1)])[:-30])
+
+        with self.assertRaises(ValueError):
+            list(ingest.read_people(path))
+
+    def test_get_loader(self):
+        """Test the auto strategy falls back to batched inserts off PostgreSQL"""
+        self.assertIs(type(ingest.get_loader('auto')), ingest.BulkLoader)
+        self.assertIs(type(ingest.get_loader('insert')), ingest.BulkLoader)
+        self.assertIs(type(ingest.get_loader('copy')), ingest.CopyLoader)
+        self.assertIs(type(ingest.get_loader('auto', delta=True)), ingest.DeltaLoader)
+        self.assertIs(type(ingest.get_loader('copy', delta=True)), ingest.CopyDeltaLoader)
+
+    @skipUnless(connection.vendor == 'postgresql', 'COPY needs PostgreSQL')
+    def test_copy_loader(self):
+        """Test CopyLoader writes the rows BulkLoader does and rebuilds the indexes it dropped"""
+        records = [
+            sample_record(index, company_id=index % 3 + 1, friends=[(index + 1) % 5, (index + 2) % 5])
+            for index in range(5)
+        ]
+
+        def load(loader):
+            loader.load(iter(records))
+            return [
+                (
+                    person.pid, person.name, person.company.index, person.about, person.has_died,
+                    sorted(person.foods.values_list('name', flat=True)),
+                    sorted(person.tags.values_list('name', flat=True)),
+                    sorted(person.friends.values_list('index', flat=True)),
+                )
+                for person in People.objects.order_by('index')
+            ]
+
+        def indexes():
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT indexdef FROM pg_indexes WHERE tablename LIKE %s', ['core_people%'])
+                return sorted(row[0] for row in cursor.fetchall())
+
+        before = indexes()
+        copied = load(ingest.CopyLoader())
+        self.assertEqual(indexes(), before)
+        self.assertEqual(load(ingest.CopyLoader()), copied)
+
+        People.objects.all().delete()
+        self.assertEqual(load(ingest.BulkLoader()), copied)
+        self.assertEqual(len(copied), 5)
+
+    def test_benchmark_load(self):
+        """Test the benchmark loads a synthetic dataset per strategy in a throwaway database, leaving it empty"""
+        out = StringIO()
+        with patch.object(connection.creation, 'create_test_db', return_value='paranuara') as create, \
+                patch.object(connection.creation, 'destroy_test_db') as destroy:
+            call_command('benchmark_load', 'insert', people=200, repeat=2, stdout=out)
+
+        create.assert_called_once()
+        destroy.assert_called_once_with('paranuara', verbosity=0)
+        self.assertIn('rows/s (best of 2)', out.getvalue())
+        self.assertFalse(People.objects.exists())
+
+        if connection.vendor != 'postgresql':
+            with self.assertRaises(CommandError):
+                call_command('benchmark_load', 'copy', people=200, stdout=StringIO())
+
+    def test_copy_text_value(self):
+        """Test values are escaped for the COPY text format"""
+        self.assertEqual(ingest.copy_text_value(None), '\\N')
+        self.assertEqual(ingest.copy_text_value(True), 't')
+        self.assertEqual(ingest.copy_text_value(False), 'f')
+        self.assertEqual(ingest.copy_text_value(12), '12')
+        self.assertEqual(
+            ingest.copy_text_value('a\tb\r\nc\\d'),
+            'a\\tb\\r\\nc\\\\d'
+        )
+
+    def test_load_paranuara_delta(self):
+        """Test a delta load only touches new, changed and missing people"""
+        records = [sample_record(index, friends=[(index + 1) % 4]) for index in range(4)]
+        call_command(
+            'load_paranuara', people=self.write_json('people.json', records),
+            companies='', stdout=StringIO()
+        )
+        untouched = People.objects.get(index=1)
+
+        records[0]['name'] = 'Renamed Person'
+        records[0]['favouriteFood'] = ['banana']
+        del records[3]
+        records.append(sample_record(4, friends=[0]))
+        out = StringIO()
+        call_command(
+            'load_paranuara', people=self.write_json('people.json', records),
+            companies='', delta=True, stdout=out
+        )
+
+        self.assertIn('Created 1, updated 1, unchanged 2 and deleted 1 people', out.getvalue())
+        self.assertFalse(People.objects.filter(index=3).exists())
+        changed = People.objects.get(index=0)
+        self.assertEqual(changed.name, 'Renamed Person')
+        self.assertEqual(list(changed.foods.values_list('name', flat=True)), ['banana'])
+        self.assertEqual(list(changed.friends.values_list('index', flat=True)), [1])
+        self.assertEqual(
+            list(People.objects.get(index=4).friends.values_list('index', flat=True)), [0]
+        )
+        self.assertEqual(People.objects.get(index=1).id, untouched.id)
+        self.assertEqual(People.objects.get(index=1).fingerprint, untouched.fingerprint)
+
+    def delta_load(self, records):
+        """Load records, as a delta when people are already loaded, and return the output"""
+        out = StringIO()
+        call_command(
+            'load_paranuara', people=self.write_json('people.json', records), companies='',
+            delta=People.objects.exists(), stdout=out
+        )
+        return out.getvalue()
+
+    def friend_indexes(self, index):
+        """Return the friend indexes of the person with index"""
+        return sorted(People.objects.get(index=index).friends.values_list('index', flat=True))
+
+    def test_delta_index_taken_over(self):
+        """Test a new pid taking the index of a missing one gets the links, and the friends naming the index"""
+        records = [sample_record(0, friends=[1]), sample_record(1, friends=[0]), sample_record(2, friends=[1])]
+        self.delta_load(records)
+        removed = People.objects.get(index=1)
+
+        newcomer = sample_record(1, friends=[2], foods=('banana',))
+        newcomer['_id'] = 'newcomer'
+        out = self.delta_load([records[0], newcomer, records[2]])
+
+        self.assertIn('Created 1, updated 0, unchanged 2 and deleted 1 people', out)
+        person = People.objects.get(index=1)
+        self.assertEqual(person.pid, 'newcomer')
+        self.assertFalse(People.objects.filter(id=removed.id).exists())
+        self.assertEqual(list(person.foods.values_list('name', flat=True)), ['banana'])
+        self.assertEqual(self.friend_indexes(1), [2])
+        self.assertEqual(self.friend_indexes(0), [1])
+        self.assertEqual(list(People.objects.get(index=0).friends.values_list('pid', flat=True)), ['newcomer'])
+        self.assertEqual(self.friend_indexes(2), [1])
+
+    def test_delta_indexes_swapped(self):
+        """Test people exchanging their indexes keep their links and the friends naming them follow"""
+        records = [sample_record(0, friends=[1]), sample_record(1), sample_record(2), sample_record(3, friends=[2])]
+        self.delta_load(records)
+        pids = {index: People.objects.get(index=index).pid for index in range(4)}
+
+        records[1]['index'], records[2]['index'] = 2, 1
+        out = self.delta_load(records)
+
+        self.assertIn('Created 0, updated 2, unchanged 2 and deleted 0 people', out)
+        self.assertEqual(People.objects.get(index=1).pid, pids[2])
+        self.assertEqual(People.objects.get(index=2).pid, pids[1])
+        self.assertEqual(list(People.objects.get(index=0).friends.values_list('pid', flat=True)), [pids[2]])
+        self.assertEqual(list(People.objects.get(index=3).friends.values_list('pid', flat=True)), [pids[1]])
+
+    def test_delta_links_unchanged_people_to_new_ones(self):
+        """Test an unchanged record naming an index that did not exist is linked once it is added"""
+        records = [sample_record(0, friends=[1, 5])]
+        self.delta_load(records)
+        self.assertEqual(self.friend_indexes(0), [])
+
+        out = self.delta_load(records + [sample_record(1), sample_record(5)])
+
+        self.assertIn('Created 2, updated 0, unchanged 1 and deleted 0 people', out)
+        self.assertEqual(self.friend_indexes(0), [1, 5])
+
+    def test_delta_deletes_in_bulk(self):
+        """Test missing people are deleted without a signal each, and the version bumped once"""
+        records = [sample_record(index, friends=[(index + 1) % 6]) for index in range(6)]
+        self.delta_load(records)
+
+        with patch.object(dataset_version, 'bump') as bump:
+            out = self.delta_load(records[:2])
+
+        self.assertIn('deleted 4 people', out)
+        self.assertEqual(People.objects.count(), 2)
+        self.assertEqual(bump.call_count, 1)
+        self.assertEqual(self.friend_indexes(1), [])
+
+    def test_delta_unchanged_export_writes_nothing(self):
+        """Test a delta load of an unchanged export issues no writes"""
+        people = self.sample_people(6)
+        call_command('load_paranuara', people=people, companies='', stdout=StringIO())
+
+        with CaptureQueriesContext(connection) as ctx:
+            call_command('load_paranuara', people=people, companies='', delta=True, stdout=StringIO())
+
+        writes = [
+            query['sql'] for query in ctx.captured_queries
+            if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+        ]
+        self.assertEqual(writes, [])
+
+    def test_parse_registered(self):
+        """Test the fast registered date parser agrees with dateutil"""
+        for value in ('2016-07-13T12:29:07 -10:00', '2014-01-02T03:04:05 +05:30'):
+            self.assertEqual(normalise.parse_registered(value), parse(value))
+            self.assertEqual(normalise.parse_registered(value).utcoffset(), parse(value).utcoffset())
+        self.assertEqual(
+            normalise.parse_registered('2016-07-13 12:29:07'),
+            parse('2016-07-13 12:29:07')
+        )
+
+    def test_parse_balance(self):
+        """Test balances are parsed with or without currency and separators"""
+        self.assertEqual(normalise.parse_balance('$2,418.59'), 2418.59)
+        self.assertEqual(normalise.parse_balance('$1,002,418.59'), 1002418.59)
+        self.assertEqual(normalise.parse_balance('18.5'), 18.5)
+
+    def test_normalised_batches_workers(self):
+        """Test a process pool normalises batches like the inline path, in order"""
+        batches = [[sample_record(index) for index in range(start, start + 5)] for start in (0, 5, 10)]
+
+        inline = list(normalise.normalised_batches(batches))
+        pooled = list(normalise.normalised_batches(batches, workers=2))
+
+        self.assertEqual(pooled, inline)
+        self.assertEqual([row[0]['index'] for row in pooled[2]], list(range(10, 15)))
+
+    def test_load_paranuara_parse_only(self):
+        """Test the parse only mode reports throughput without writing"""
+        out = StringIO()
+
+        call_command('load_paranuara', people=self.sample_people(3), parse_only=True, stdout=out)
+
+        self.assertIn('Normalised 3 records with 1 workers', out.getvalue())
+        self.assertFalse(People.objects.exists())
+
+
+class CopyLoaderTransactionTests(TransactionTestCase):
+
+    def test_load_in_transaction(self):
+        """Test CopyLoader writes in a transaction of its own when called outside one"""
+        in_atomic_block = []
+
+        def insert(loader, model, objs):
+            in_atomic_block.append(connection.in_atomic_block)
+            ingest.BulkLoader.insert(loader, model, objs)
+
+        with patch.object(ingest.CopyLoader, 'insert', insert), \
+                patch.object(ingest.CopyLoader, 'drop_indexes', return_value=[]):
+            ingest.CopyLoader().load(iter([sample_record(0, friends=[1]), sample_record(1)]))
+
+        self.assertTrue(in_atomic_block)
+        self.assertTrue(all(in_atomic_block))
+        self.assertEqual(People.objects.count(), 2)
+
+    @skipUnless(connection.vendor == 'postgresql', 'COPY needs PostgreSQL')
+    def test_copy_outside_transaction(self):
+        """Test CopyLoader copies through its staging tables outside a transaction and keeps the indexes"""
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM pg_indexes WHERE tablename LIKE %s', ['core_people%'])
+            indexes = cursor.fetchone()[0]
+
+            ingest.CopyLoader().load(iter([sample_record(0, friends=[1]), sample_record(1)]))
+
+            cursor.execute('SELECT count(*) FROM pg_indexes WHERE tablename LIKE %s', ['core_people%'])
+            self.assertEqual(cursor.fetchone()[0], indexes)
+        self.assertEqual(People.objects.count(), 2)
+        self.assertEqual(People.friends.through.objects.count(), 1)
@@ -1,5 +1,7 @@
 from dateutil.parser import parse
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 
 from core import models
@@ -67,6 +69,16 @@ class ModelTests(TestCase):
         self.assertEqual(str(food), food.name)
         self.assertEqual(food.category, 'fruit')
 
+    def test_food_category_stored(self):
+        """Test the food category is stored when the food is saved"""
+        models.Food.objects.create(name='Kiwi')
+        models.Food.objects.create(name='celery')
+
+        self.assertEqual(
+            dict(models.Food.objects.values_list('name', 'category')),
+            {'Kiwi': 'fruit', 'celery': 'vegetable'}
+        )
+
     def test_tag_str(self):
         """Test tag string representation"""
 
@@ -116,3 +128,31 @@ class ModelTests(TestCase):
         people.tags.add(tag.id)
 
         self.assertEqual(str(people), '{}-{}'.format(people.index, people.name))
+
+    def test_get_common_friends_single_query(self):
+        """Test common friends of people with thousands of friends take one query"""
+        company = models.Company.objects.create(index=200, name='SuPerStar')
+        models.People.objects.bulk_create([
+            models.People(
+                pid=str(index), index=index, guid=str(index), name='Person {}'.format(index),
+                eye_color='brown' if index % 2 else 'blue', company=company
+            )
+            for index in range(3003)
+        ])
+        people = list(models.People.objects.order_by('index'))
+        Friends = models.People.friends.through
+        Friends.objects.bulk_create(
+            [Friends(from_people=people[0], to_people=friend) for friend in people[3:]] +
+            [Friends(from_people=people[1], to_people=friend) for friend in people[3:2003]] +
+            [Friends(from_people=people[2], to_people=friend) for friend in people[1003:]]
+        )
+
+        with CaptureQueriesContext(connection) as ctx:
+            common = list(people[0].get_common_friends(people[1], eye_color='brown', has_died=False))
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertNotIn(' IN (', ctx.captured_queries[0]['sql'])
+        self.assertEqual(len(common), 1000)
+        self.assertTrue(all(person.eye_color == 'brown' for person in common))
+
+        with self.assertNumQueries(1):
+            self.assertEqual(people[0].get_common_friends(people[1], people[2]).count(), 1000)
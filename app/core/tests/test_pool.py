@@ -0,0 +1,162 @@
+import threading
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db.utils import OperationalError
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.pool import ConnectionPool, get_pool, pools
+
+
+DB_METRICS_URL = reverse('api:db-metrics')
+
+
+class FakeConnection:
+    """Connection recording whether it was closed"""
+
+    def __init__(self, number):
+        self.number = number
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+
+    def setUp(self):
+        self.opened = []
+
+    def connect(self):
+        """Open and return a FakeConnection"""
+        connection = FakeConnection(len(self.opened))
+        self.opened.append(connection)
+        return connection
+
+    def test_reuse(self):
+        """Test returned connections are reused instead of reconnecting"""
+        pool = ConnectionPool(self.connect, max_size=2)
+
+        first = pool.checkout()
+        pool.checkin(first)
+        again = pool.checkout()
+
+        self.assertIs(again, first)
+        self.assertEqual(len(self.opened), 1)
+        self.assertEqual(pool.stats()['active'], 1)
+        self.assertEqual(pool.stats()['checkouts'], 2)
+
+    def test_bounded(self):
+        """Test checkout waits for a returned connection and times out"""
+        pool = ConnectionPool(self.connect, max_size=1, timeout=0.01)
+        connection = pool.checkout()
+
+        with self.assertRaises(OperationalError):
+            pool.checkout()
+
+        threading.Timer(0.05, pool.checkin, [connection]).start()
+        pool.timeout = 5
+        self.assertIs(pool.checkout(), connection)
+        stats = pool.stats()
+        self.assertEqual(stats['timeouts'], 1)
+        self.assertGreater(stats['wait_ms_max'], 0)
+        self.assertEqual(len(self.opened), 1)
+
+    def test_ping_after_idle(self):
+        """Test idle connections are pinged and replaced when they fail"""
+        pinged = []
+
+        def ping(connection):
+            pinged.append(connection)
+            raise OperationalError('server closed the connection')
+
+        pool = ConnectionPool(self.connect, ping_after=30, ping=ping)
+        connection = pool.checkout()
+        pool.checkin(connection)
+        self.assertIs(pool.checkout(), connection)
+        pool.checkin(connection)
+
+        with patch('core.pool.time.monotonic', return_value=10 ** 9):
+            replacement = pool.checkout()
+
+        self.assertEqual(pinged, [connection])
+        self.assertTrue(connection.closed)
+        self.assertIsNot(replacement, connection)
+        self.assertEqual(pool.stats()['reconnects'], 1)
+
+    def test_broken_checkin(self):
+        """Test connections failing their reset are closed"""
+        def reset(connection):
+            raise OperationalError('connection already closed')
+
+        pool = ConnectionPool(self.connect, reset=reset)
+        connection = pool.checkout()
+        pool.checkin(connection)
+
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.stats()['idle'], 0)
+        self.assertEqual(pool.stats()['active'], 0)
+        self.assertEqual(pool.stats()['reconnects'], 1)
+
+    def test_failed_connect_frees_slot(self):
+        """Test a connection that cannot be opened does not use up the pool"""
+        def connect():
+            raise OperationalError('could not connect to server')
+
+        pool = ConnectionPool(connect, max_size=1, timeout=0.01)
+        for _ in range(2):
+            with self.assertRaises(OperationalError):
+                pool.checkout()
+
+        self.assertEqual(pool.stats()['timeouts'], 0)
+
+    def test_close(self):
+        """Test closing a pool closes its idle connections, and the checked out ones when asked"""
+        pool = ConnectionPool(self.connect)
+        idle, kept, returned = pool.checkout(), pool.checkout(), pool.checkout()
+        pool.checkin(idle)
+        pool.close()
+
+        self.assertTrue(idle.closed)
+        self.assertFalse(kept.closed)
+        pool.checkin(returned)
+        self.assertTrue(returned.closed)
+        self.assertEqual(pool.stats()['idle'], 0)
+
+        pool.close(checked_out=True)
+        self.assertTrue(kept.closed)
+
+
+class DatabasePoolApiTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        pool = get_pool('test', 'metrics', lambda: ConnectionPool(lambda: FakeConnection(0)))
+        pool.checkin(pool.checkout())
+
+    def tearDown(self):
+        del pools[('test', 'metrics')]
+
+    def test_metrics(self):
+        """Test admins get the counters of the pools"""
+        self.client.force_authenticate(get_user_model().objects.create_superuser('admin@gmail.com', 'pass'))
+
+        res = self.client.get(DB_METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        metrics = [pool for pool in res.data if pool['alias'] == 'test']
+        self.assertEqual(metrics[0]['database'], 'metrics')
+        self.assertEqual(metrics[0]['idle'], 1)
+        self.assertEqual(metrics[0]['connects'], 1)
+
+    def test_metrics_admin_only(self):
+        """Test other users cannot read the metrics"""
+        self.client.force_authenticate(get_user_model().objects.create_user('user@gmail.com', 'pass'))
+
+        res = self.client.get(DB_METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,149 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import OperationalError, connections, router
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.dimensions import company_dimension
+from core.graph import friend_graph
+from core.middleware import PIN_COOKIE
+from core.models import Company, Food, Tag, People
+from core.routers import replica_reads
+
+
+COMPANIES_URL = reverse('api:company-list')
+EMPLOYEES_URL = reverse('api:employees')
+CREATE_USER_URL = reverse('user:create')
+
+
+def add_database(alias, name=':memory:'):
+    """Add a SQLite database to the connections"""
+    connections.databases[alias] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': name}
+    connections.ensure_defaults(alias)
+    connections.prepare_test_settings(alias)
+
+
+def remove_database(alias):
+    """Close and remove a database added with add_database"""
+    connections[alias].close()
+    del connections.databases[alias]
+    delattr(connections._connections, alias)
+
+
+@override_settings(DATABASE_REPLICAS=['replica', 'replica2'])
+class ReplicaRouterTests(TestCase):
+    """Test reads are spread over replicas, each an in-memory SQLite database"""
+    databases = {'default', 'replica', 'replica2'}
+
+    @classmethod
+    def setUpClass(cls):
+        add_database('replica')
+        add_database('replica2')
+        for alias in ('replica', 'replica2'):
+            with connections[alias].schema_editor() as editor:
+                for model in (Company, Food, Tag, People):
+                    editor.create_model(model)
+        super().setUpClass()
+        # Added after the test case guarded the connections, as it cannot connect
+        add_database('down', '/nonexistent/replica.sqlite3')
+
+    @classmethod
+    def tearDownClass(cls):
+        remove_database('down')
+        super().tearDownClass()
+        remove_database('replica')
+        remove_database('replica2')
+
+    def setUp(self):
+        caches['responses'].clear()
+        self.router = router.routers[0]
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user(email='test@gmail.com', password='pass'))
+        company = Company.objects.create(index=0, name='PRIMARY')
+        People.objects.create(pid='pid-0', index=0, guid='guid-0', name='PRIMARY', company=company)
+        for alias in ('replica', 'replica2'):
+            Company(pk=company.pk, index=0, name=alias.upper()).save(using=alias)
+            People(pid='pid-0', index=0, guid='guid-0', name=alias.upper(), company_id=company.pk).save(using=alias)
+        company_dimension.invalidate()
+
+    def test_reads_primary_by_default(self):
+        """Test reads outside requests, e.g. of the loaders, use the primary"""
+        self.assertEqual(Company.objects.get().name, 'PRIMARY')
+        self.assertIsNone(self.router.db_for_read(People))
+
+    def test_round_robin(self):
+        """Test replica reads go to each replica in turn"""
+        with replica_reads():
+            names = {Company.objects.get().name for _ in range(4)}
+            self.assertIn(self.router.db_for_read(People.foods.through), ('replica', 'replica2'))
+            self.assertIsNone(self.router.db_for_read(get_user_model()))
+
+        self.assertEqual(names, {'REPLICA', 'REPLICA2'})
+
+    def test_failover(self):
+        """Test a replica failing to connect is skipped, then the primary is used"""
+        with self.settings(DATABASE_REPLICAS=['down', 'replica']), replica_reads():
+            self.assertEqual({self.router.db_for_read(Company) for _ in range(4)}, {'replica'})
+        with self.settings(DATABASE_REPLICAS=['down']), replica_reads():
+            self.assertIsNone(self.router.db_for_read(Company))
+
+    def test_reads_own_writes(self):
+        """Test reads following a write go to the primary"""
+        with replica_reads() as state:
+            Company.objects.create(index=1, name='NEWCOMP')
+
+            self.assertTrue(state['wrote'])
+            self.assertEqual(Company.objects.get(index=1).name, 'NEWCOMP')
+
+    def test_api_reads_replicas(self):
+        """Test safe API requests read the replicas"""
+        res = self.client.get(EMPLOYEES_URL, {'company': 0})
+
+        self.assertIn(res.json()[0]['employees'][0]['name'], ('REPLICA', 'REPLICA2'))
+        self.assertNotIn(PIN_COOKIE, res.cookies)
+
+    def test_writes_pin_client_to_primary(self):
+        """Test a client reads the primary after a request that wrote, rather than the responses of replicas"""
+        res = self.client.get(EMPLOYEES_URL, {'company': 0})
+        self.assertIn(res.json()[0]['employees'][0]['name'], ('REPLICA', 'REPLICA2'))
+
+        res = self.client.post(CREATE_USER_URL, {'email': 'new@gmail.com', 'password': 'testpass', 'name': 'New'})
+        self.assertIn(PIN_COOKIE, res.cookies)
+
+        res = self.client.get(EMPLOYEES_URL, {'company': 0})
+
+        self.assertEqual(res.json()[0]['employees'][0]['name'], 'PRIMARY')
+
+    def test_caches_read_primary(self):
+        """Test the process-wide tables and graph are loaded from the primary, even within a request"""
+        with replica_reads():
+            self.assertEqual([company.name for company in company_dimension.all()], ['PRIMARY'])
+            friend_graph.invalidate()
+            with self.assertNumQueries(2, using='default'):
+                friend_graph.csr()
+
+        res = self.client.get(COMPANIES_URL)
+        self.assertEqual(res.json()[0]['name'], 'PRIMARY')
+
+    @override_settings(REPLICA_CHECK_SECONDS=0)
+    def test_lost_replica_skipped(self):
+        """Test an open connection to a replica that went away is noticed"""
+        self.router._local.checked_until = dict()
+        self.addCleanup(self.router._down_until.clear)
+        self.assertTrue(self.router.is_healthy('replica'))
+
+        replica = connections['replica']
+        with patch.object(replica, 'is_usable', return_value=False), \
+                patch.object(replica, 'ensure_connection', side_effect=OperationalError):
+            self.assertFalse(self.router.is_healthy('replica'))
+        with replica_reads():
+            self.assertEqual({self.router.db_for_read(Company) for _ in range(4)}, {'replica2'})
+
+    def test_allow_migrate(self):
+        """Test migrations are applied to the primary only"""
+        self.assertFalse(self.router.allow_migrate('replica', 'core'))
+        self.assertIsNone(self.router.allow_migrate('default', 'core'))
@@ -0,0 +1,91 @@
+from unittest.mock import patch
+
+from django.db import connection, transaction
+from django.test import TestCase
+
+from core.dimensions import company_dimension
+from core.models import Company
+from core.search import MATCH_CONTAINS, MATCH_EXACT, MATCH_PREFIX, CompanySearch, CompanyIndex, company_search
+
+
+class CompanySearchTests(TestCase):
+
+    def setUp(self):
+        names = ['PERMADYNE', 'PERMA', 'SUPERMART', 'LINGOAGE', 'ZILLAPERM', None]
+        self.companies = [Company.objects.create(index=index, name=name) for index, name in enumerate(names)]
+
+    def test_index_matches(self):
+        """Test the index finds the names containing a query with their match kind"""
+        index = CompanyIndex((company.pk, company.name) for company in self.companies)
+        perma, permadyne, supermart, zillaperm = (self.companies[i].pk for i in (1, 0, 2, 4))
+
+        self.assertEqual(
+            index.matches('Perma'),
+            {perma: MATCH_EXACT, permadyne: MATCH_PREFIX, supermart: MATCH_CONTAINS}
+        )
+        self.assertEqual(
+            index.matches('erm'),
+            {perma: MATCH_CONTAINS, permadyne: MATCH_CONTAINS, supermart: MATCH_CONTAINS, zillaperm: MATCH_CONTAINS}
+        )
+        self.assertEqual(index.matches('permx'), {})
+        self.assertEqual(index.matches('madyne'), {permadyne: MATCH_CONTAINS})
+        self.assertEqual(index.matches('lingoagex'), {})
+        self.assertEqual(index.matches('p'), index.matches('P'))
+
+    def test_index_finds_every_substring(self):
+        """Test every substring of a name, short or long, finds the names containing it"""
+        index = CompanyIndex((company.pk, company.name) for company in self.companies)
+        names = {company.pk: company.name.lower() for company in self.companies if company.name}
+
+        for name in names.values():
+            for start in range(len(name)):
+                for end in range(start + 1, len(name) + 1):
+                    query = name[start:end]
+                    self.assertEqual(set(index.matches(query)), {pk for pk in names if query in names[pk]})
+
+    def test_search_ranking(self):
+        """Test exact matches rank first, then prefixes, then shorter names"""
+        search = CompanySearch()
+
+        self.assertEqual(
+            [company.name for company in search.search('perm')],
+            ['PERMA', 'PERMADYNE', 'SUPERMART', 'ZILLAPERM']
+        )
+        self.assertEqual([company.name for company in search.search('perm', limit=1)], ['PERMA'])
+        self.assertEqual(search.search('nothing'), [])
+
+    def test_resolve(self):
+        """Test resolving a name to a single company, preferring exact names"""
+        search = CompanySearch()
+
+        self.assertEqual(search.resolve('perma'), self.companies[1])
+        self.assertEqual(search.resolve('lingo'), self.companies[3])
+        self.assertIsNone(search.resolve('perm'))
+        self.assertIsNone(search.resolve('nothing'))
+
+    def test_search_invalidated(self):
+        """Test saving a company rebuilds the index on the next search"""
+        self.assertEqual(company_search.search('netbook'), [])
+
+        Company.objects.create(index=10, name='NETBOOK')
+
+        self.assertEqual([company.index for company in company_search.search('netbook')], [10])
+
+    def test_stale_index_discarded(self):
+        """Test an index built while companies change is not kept, and rebuilt once they commit"""
+        search = CompanySearch()
+        all_companies = company_dimension.all
+
+        def all_then_change():
+            companies = all_companies()
+            search.invalidate()
+            return companies
+
+        with patch.object(company_dimension, 'all', all_then_change):
+            search.index()
+        self.assertIsNone(search._index)
+
+        with transaction.atomic():
+            Company.objects.create(index=11, name='ZENTIA')
+            callbacks = [callback for _, callback in connection.run_on_commit]
+        self.assertIn(company_search.invalidate, callbacks)
@@ -0,0 +1,116 @@
+import json
+import os
+import tempfile
+from collections import Counter
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase
+
+from core import synthetic
+from core.models import Company, People
+from core.normalise import normalise_record
+
+
+def sample_spec(**options):
+    """Return a small DatasetSpec"""
+    spec = synthetic.DatasetSpec(
+        people=300, companies=20, seed=7, friend_degree='powerlaw',
+        mean_friends=10, max_friends=1000, company_skew=1.0
+    )
+    return spec._replace(**options)
+
+
+def generate(spec, **options):
+    """Return the generated people of spec as records"""
+    return [json.loads(line) for lines in synthetic.generate_people(spec, **options) for line in lines]
+
+
+class SyntheticDatasetTests(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_schema_matches_people_json(self):
+        """Test records have the people.json keys and normalise into People fields"""
+        with open(os.path.join(settings.BASE_DIR, 'resources', 'people.json'), encoding='utf-8') as pfile:
+            keys = set(json.load(pfile)[0])
+        records = generate(sample_spec())
+
+        self.assertEqual([record['index'] for record in records], list(range(300)))
+        for record in records:
+            self.assertEqual(set(record), keys)
+            details, foods, tags, friends = normalise_record(record)
+            self.assertIn(details['company'], range(20))
+            self.assertIsInstance(details['postcode'], int)
+            self.assertLessEqual(len(details['name']), 50)
+            self.assertEqual(len(foods), synthetic.FOODS_PER_PEOPLE)
+            self.assertEqual(len(tags), synthetic.TAGS_PER_PEOPLE)
+            self.assertTrue(all(0 <= friend < 300 for friend in friends))
+
+    def test_deterministic_per_seed(self):
+        """Test a seed always generates the same people, whatever the worker count"""
+        records = generate(sample_spec(), chunk_size=100)
+
+        self.assertEqual(generate(sample_spec(), chunk_size=100), records)
+        self.assertEqual(generate(sample_spec(), workers=2, chunk_size=100), records)
+        self.assertNotEqual(generate(sample_spec(seed=8), chunk_size=100), records)
+
+    def test_friend_degrees(self):
+        """Test each degree distribution keeps the mean and the power law a long tail"""
+        degrees = {
+            name: [len(record['friends']) for record in generate(sample_spec(people=1000, friend_degree=name))]
+            for name in synthetic.FRIEND_DEGREES
+        }
+
+        for name, values in degrees.items():
+            self.assertAlmostEqual(sum(values) / len(values), 10, delta=1.5, msg=name)
+        self.assertLessEqual(max(degrees['uniform']), 20)
+        self.assertGreater(max(degrees['powerlaw']), 50)
+
+        capped = generate(sample_spec(people=500, max_friends=3))
+        self.assertTrue(all(len(record['friends']) <= 3 for record in capped))
+
+    def test_company_skew(self):
+        """Test a skew of 0 spreads people evenly and a larger one favours the first companies"""
+        even = Counter(record['company_id'] for record in generate(sample_spec(people=1000, company_skew=0)))
+        skewed = Counter(record['company_id'] for record in generate(sample_spec(people=1000, company_skew=2)))
+
+        self.assertLess(max(even.values()), 100)
+        self.assertGreater(skewed[1], 500)
+        self.assertGreater(skewed[1], skewed[2])
+        self.assertGreater(skewed[2], skewed[5])
+
+    def test_generate_and_load(self):
+        """Test the command writes files load_paranuara loads"""
+        out = StringIO()
+        call_command(
+            'generate_paranuara', people=250, companies=5, seed=1, output=self.tmpdir.name, stdout=out
+        )
+        self.assertIn('Generated 250 people and 5 companies', out.getvalue())
+        call_command('generate_paranuara', people=250, companies=5, seed=1, output=self.tmpdir.name,
+                     ndjson=True, stdout=StringIO())
+
+        with open(os.path.join(self.tmpdir.name, 'people.json'), encoding='utf-8') as pfile:
+            records = json.load(pfile)
+        with open(os.path.join(self.tmpdir.name, 'people.ndjson'), encoding='utf-8') as pfile:
+            self.assertEqual([json.loads(line) for line in pfile], records)
+
+        call_command(
+            'load_paranuara', people=os.path.join(self.tmpdir.name, 'people.json'),
+            companies=os.path.join(self.tmpdir.name, 'companies.json'), stdout=StringIO()
+        )
+
+        self.assertEqual(People.objects.count(), 250)
+        person = People.objects.get(index=0)
+        self.assertEqual(person.name, records[0]['name'])
+        self.assertEqual(person.company.index, records[0]['company_id'] - 1)
+        self.assertEqual(
+            sorted(person.friends.values_list('index', flat=True)),
+            sorted({friend['index'] for friend in records[0]['friends']})
+        )
+        self.assertTrue(Company.objects.filter(index=4).exclude(name=None).exists())
@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class UserConfig(AppConfig):
+    name = 'user'
+
+    def ready(self):
+        from user import authentication  # noqa: F401
@@ -0,0 +1,56 @@
+import hashlib
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+TOKEN_CACHE_ALIAS = 'tokens'
+# The user fields kept in the cache, which leave out the password hash
+USER_FIELDS = ('id', 'email', 'name', 'is_active', 'is_staff', 'is_superuser')
+
+
+def token_cache_key(key):
+    """Return the cache key of a token, which does not reveal the token"""
+    return 'token:{}'.format(hashlib.sha256(key.encode()).hexdigest())
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication keeping the token to user lookups in the tokens cache
+
+    A cached token authenticates without a query. The cache keeps the
+    USER_FIELDS of the user only, so the user of a cached token is built
+    from them and must be read again before being saved. Entries expire
+    after the cache TIMEOUT and are deleted when their token is deleted
+    or their user is saved, e.g. deactivated, or deleted.
+    """
+
+    def authenticate_credentials(self, key):
+        cache = caches[TOKEN_CACHE_ALIAS]
+        fields = cache.get(token_cache_key(key))
+        if fields is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set(token_cache_key(key), {name: getattr(user, name) for name in USER_FIELDS})
+            return user, token
+
+        user = get_user_model()(**fields)
+        user._state.adding = False
+        user._state.db = DEFAULT_DB_ALIAS
+        return user, Token(key=key, user=user)
+
+
+@receiver(post_delete, sender=Token)
+def forget_token(sender, instance, **kwargs):
+    """Stop authenticating a deleted token from the cache"""
+    caches[TOKEN_CACHE_ALIAS].delete(token_cache_key(instance.key))
+
+
+@receiver(post_save, sender=get_user_model())
+def forget_user_tokens(sender, instance, **kwargs):
+    """Authenticate the tokens of a changed user, e.g. deactivated, afresh"""
+    keys = Token.objects.filter(user_id=instance.pk).values_list('key', flat=True)
+    caches[TOKEN_CACHE_ALIAS].delete_many([token_cache_key(key) for key in keys])
@@ -1,10 +1,14 @@
 from django.test import TestCase
 from django.contrib.auth import get_user_model
+from django.core.cache import caches
 from django.urls import reverse
 
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 from rest_framework import status
 
+from user.authentication import TOKEN_CACHE_ALIAS, token_cache_key
+
 
 CREATE_USER_URL = reverse('user:create')
 TOKEN_URL = reverse('user:token')
@@ -140,3 +144,86 @@ class PrivateUserApiTests(TestCase):
         self.assertEqual(self.user.name, payload['name'])
         self.assertTrue(self.user.check_password(payload['password']))
         self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Test token authentication served from the tokens cache"""
+
+    def setUp(self):
+        self.user = create_user(
+            email='test@mysecrettestdomain.com',
+            password='testpass',
+            name='Test User'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token {}'.format(self.token.key))
+
+    def test_token_cached(self):
+        """Test a token authenticates without a query once cached"""
+        with self.assertNumQueries(1):
+            self.client.get(ME_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], self.user.email)
+
+    def test_invalid_token(self):
+        """Test an unknown token is rejected"""
+        self.client.credentials(HTTP_AUTHORIZATION='Token unknown')
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_token(self):
+        """Test a deleted token stops authenticating"""
+        self.client.get(ME_URL)
+
+        self.token.delete()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user(self):
+        """Test the token of a deactivated user stops authenticating"""
+        self.client.get(ME_URL)
+
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_updated_user(self):
+        """Test the cached user is refreshed after the user changes"""
+        self.client.get(ME_URL)
+
+        self.client.patch(ME_URL, {'name': 'new name'})
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['name'], 'new name')
+
+    def test_password_not_cached(self):
+        """Test the cache keeps no password hash"""
+        self.client.get(ME_URL)
+
+        fields = caches[TOKEN_CACHE_ALIAS].get(token_cache_key(self.token.key))
+
+        self.assertEqual(fields['email'], self.user.email)
+        self.assertNotIn('password', fields)
+        self.assertNotIn(self.user.password, fields.values())
+
+    def test_update_reads_user_afresh(self):
+        """Test an update through a cached token keeps the columns changed since it was cached"""
+        self.client.get(ME_URL)
+        get_user_model().objects.filter(pk=self.user.pk).update(name='Newer Name')
+
+        res = self.client.patch(ME_URL, {'password': 'newpassword'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.name, 'Newer Name')
+        self.assertTrue(self.user.check_password('newpassword'))